@@ -1,11 +1,10 @@
 import eventlet
 eventlet.monkey_patch()
+from eventlet import tpool
 
-from flask import Flask, render_template, Response, send_from_directory
+from flask import Flask, render_template, Response, send_from_directory, request, jsonify
 from flask_socketio import SocketIO, emit
 import cv2
-from ultralytics import YOLO
-import yt_dlp
 import numpy as np
 import math
 from collections import defaultdict, deque, Counter
@@ -15,6 +14,14 @@ import time
 import os
 
 from config import *
+from classifier import BatchClassifier
+from models import ModelLoader
+from native import GreenBridge
+from resolver import StreamResolver
+from capture import open_capture
+import metrics
+from telemetry import VERSION as TELEMETRY_VERSION
+from pipeline import SourceManager, CLASS_HEX
 
 
 app = Flask(__name__, static_folder='static')
@@ -22,276 +29,39 @@ socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet")
 
 
 
-def compute_ancestors_map(m):
-    anc = {k: set() for k in m}
-    for k in m:
-        stack = list(m[k])
-        while stack:
-            p = stack.pop()
-            if p not in anc[k]:
-                anc[k].add(p)
-                stack.extend(m.get(p, []))
-    return anc
-
-ANCESTORS = compute_ancestors_map(ANALOGY_MAP)
-
-# === UTIL ===
-def iou(a, b):
-    x1 = max(a[0], b[0]); y1 = max(a[1], b[1])
-    x2 = min(a[2], b[2]); y2 = min(a[3], b[3])
-    inter = max(0, x2-x1) * max(0, y2-y1)
-    area_a = max(1, a[2]-a[0]) * max(1, a[3]-a[1])
-    area_b = max(1, b[2]-b[0]) * max(1, b[3]-b[1])
-    return inter / (area_a + area_b - inter) if (area_a + area_b - inter) > 0 else 0
-
-def filter_detections_by_analogy(dets, thresh=0.5):
-    if not dets: return dets
-    items = [{"box": d[:4], "cid": d[5], "keep": True, "orig": d} for d in dets]
-    for i in range(len(items)):
-        for j in range(i+1, len(items)):
-            if not items[i]["keep"] or not items[j]["keep"]: continue
-            if iou(items[i]["box"], items[j]["box"]) < thresh: continue
-            ci, cj = items[i]["cid"], items[j]["cid"]
-            if ci in ANCESTORS.get(cj, set()): items[i]["keep"] = False
-            elif cj in ANCESTORS.get(ci, set()): items[j]["keep"] = False
-    return [it["orig"] for it in items if it["keep"]]
-
-
-
-def try_load_model(pt_path, engine_path=None, name="model"):
-    if engine_path and os.path.exists(engine_path):
-        try: return YOLO(engine_path)
-        except: pass
-    try: return YOLO(pt_path)
-    except: return None
-
-
-
-def load_models_once():
-    global modelA, modelB, modelC
-    if modelA is None: modelA = try_load_model(MODEL_A_PATH, ENGINE_A_PATH, "ModelA")
-    if modelB is None: modelB = try_load_model(MODEL_B_PATH, ENGINE_B_PATH, "ModelB")
-    if modelC is None: modelC = try_load_model(MODEL_C_PATH, ENGINE_C_PATH, "ModelC")
-
-def classify_crop(model, crop_img, model_names, conf_thr):
-    if model is None: return None
-    try:
-        h, w = crop_img.shape[:2]
-        crop_small = crop_img
-        scale = 1.0
-        if max(h,w) > MAX_CROP_SIDE:
-            scale = MAX_CROP_SIDE / max(h,w)
-            crop_small = cv2.resize(crop_img, (0,0), fx=scale, fy=scale)
-        kwargs = {"conf": conf_thr, "verbose": False}
-        if use_cuda: kwargs["device"] = 0
-        res = model(crop_small, **kwargs)[0]
-        if not res.boxes: return None
-        confs = res.boxes.conf.cpu().numpy()
-        idx = int(np.argmax(confs))
-        if confs[idx] < conf_thr: return None
-        cls = int(res.boxes.cls.cpu().numpy()[idx])
-        name = model_names[cls] if cls < len(model_names) else str(cls)
-        bbox = res.boxes.xyxy.cpu().numpy()[idx]
-        if scale != 1.0: bbox = bbox / scale
-        return {"name": name, "conf": float(confs[idx]), "box": bbox}
-    except Exception: return None
-
-
-def submit_classification(tid, crop_img, crop_origin):
-    def job():
-        load_models_once()
-        resB = classify_crop(modelB, crop_img, modelB_names, CONF_THRESHOLD_B)
-        resC = classify_crop(modelC, crop_img, modelC_names, CONF_THRESHOLD_C) if resB else None
-        return {"tid": tid, "resB": resB, "resC": resC}
-    return executor.submit(job)
-
-def get_video_source(url):
-    if url.startswith("http"):
-        try:
-            with yt_dlp.YoutubeDL({"format": "bestvideo[ext=mp4]/best", "quiet": True}) as ydl:
-                return ydl.extract_info(url, download=False).get("url")
-        except: pass
-    return url
-
-def scale_for_processing(frame, max_w=PROC_MAX_WIDTH):
-    h, w = frame.shape[:2]
-    if w <= max_w: return frame, 1.0
-    scale = max_w / w
-    return cv2.resize(frame, (int(w*scale), int(h*scale))), scale
-
-def bgr_to_hex(bgr):
-    # Convertit un tuple (B, G, R) en string hex '#RRGGBB'
-    return "#{:02x}{:02x}{:02x}".format(bgr[2], bgr[1], bgr[0])
-
-def process_frame_worker():
-    global current_frame, target_id, running
-    load_models_once()
-    prev_time = time.time()
-
-    while running:
-        if not cap or not cap.isOpened():
-            time.sleep(0.1); continue
-        
-        ret, frame = cap.read()
-        if not ret: time.sleep(0.05); continue
-
-        # Mesure FPS
-        now = time.time()
-        dt = now - prev_time
-        prev_time = now
-        fps = 1.0 / dt if dt > 0 else 0
-
-        proc_frame, scale = scale_for_processing(frame)
-        fh_orig, fw_orig = frame.shape[:2]
-        
-        # Async Classification
-        done = []
-        for tid, fut in list(pending_futures.items()):
-            if fut.done():
-                try: done.append(fut.result())
-                except: pass
-                del pending_futures[tid]
-        
-        for res in done:
-            tid = res['tid']
-            st = track_state.get(tid, {'votes': deque(maxlen=CLASS_VOTE_WINDOW)})
-            chosen = res['resC'] if res['resC'] else res['resB']
-            if chosen:
-                st['votes'].append(chosen['name'])
-                most, num = Counter(st['votes']).most_common(1)[0]
-                if num >= VOTE_MIN_CONFIRM:
-                    st['confirmed_name'] = most
-                    st['confirmed_conf'] = chosen['conf']
-            track_state[tid] = st
-
-        # Tracking
-        try:
-            res_all = modelA.track(proc_frame, persist=True, conf=CONF_THRESHOLD_A, verbose=False)[0]
-        except: time.sleep(0.1); continue
-
-        active.clear()
-        
-        if res_all and getattr(res_all.boxes, "id", None) is not None:
-            boxes = res_all.boxes.xyxy.cpu().numpy()
-            cls = res_all.boxes.cls.int().cpu().numpy()
-            ids = res_all.boxes.id.int().cpu().numpy()
-            confs = res_all.boxes.conf.cpu().numpy()
-            
-            raw = []
-            for b, c, cf, tid in zip(boxes, cls, confs, ids):
-                if scale != 1.0: b = b / scale
-                nameA = modelA_names[c] if c < len(modelA_names) else "Inconnu"
-                raw.append([b[0], b[1], b[2], b[3], nameA, float(cf), c, int(tid)])
-            
-            filtered = filter_detections_by_analogy(raw)
-            frame_idx = int(time.time()*30)
-
-            for d in filtered:
-                x1, y1, x2, y2 = map(int, d[:4])
-                tid = int(d[7])
-                nameA = d[4]
-                conf_val = d[5]
-                
-                active.add(tid)
-                ages[tid] = 0
-
-                # Mise à jour des coordonnées pour le clic (normalisé 0-1)
-                box_locations[tid] = (x1/fw_orig, y1/fh_orig, x2/fw_orig, y2/fh_orig)
-                
-                # Logic Classif
-                st = track_state.get(tid, {'stage':'A', 'name':nameA, 'votes': deque(maxlen=CLASS_VOTE_WINDOW)})
-                final_name = st.get('confirmed_name', st.get('name', nameA))
-                final_conf = st.get('confirmed_conf', conf_val)
-
-                if nameA in ["Bateau", "bateau"]:
-                    if (frame_idx - st.get('last_cl', -999) > CLASSIFY_INTERVAL) and tid not in pending_futures:
-                        pad = 10
-                        cx1, cy1 = max(0, x1-pad), max(0, y1-pad)
-                        cx2, cy2 = min(fw_orig, x2+pad), min(fh_orig, y2+pad)
-                        pending_futures[tid] = submit_classification(tid, frame[cy1:cy2, cx1:cx2].copy(), (cx1,cy1))
-                        st['last_cl'] = frame_idx
-                
-                track_state[tid] = st
-
-                # Physics
-                h_box = max(1, y2-y1)
-                raw_dist = (boat_heights.get(final_name, REAL_BOAT_HEIGHT) * 800) / h_box
-                dist = 0.7 * dist_f.get(tid, raw_dist) + 0.3 * raw_dist
-                dist_f[tid] = dist
-                
-                cx, cy = (x1+x2)//2, (y1+y2)//2
-                history[tid].append((cx, cy, dist))
-                
-                speed = 0.0; heading = 0.0
-                if len(history[tid]) > 1:
-                    dx = history[tid][-1][0] - history[tid][-2][0]
-                    dy = history[tid][-1][1] - history[tid][-2][1]
-                    if math.hypot(dx, dy) > 1:
-                        speed = (math.hypot(dx,dy) * dist / 800) * 30 * 1.94
-                        heading = (math.degrees(math.atan2(dx, -dy)) + 360) % 360
-                
-                azimuth_factor = (cx - (fw_orig/2)) / (fw_orig/2)
-                
-                # Récupération couleur + conversion Hex pour le HTML
-                col_bgr = class_colors.get(final_name, (0,200,200))
-                col_hex = bgr_to_hex(col_bgr)
-                
-                info[tid] = {
-                    'name': final_name, 
-                    'distance': dist, 
-                    'speed': speed, 
-                    'heading': heading, 
-                    'azimuth_factor': azimuth_factor,
-                    'color_hex': col_hex # Pour le radar
-                }
-
-                # === DESSIN SUR IMAGE ===
-                # Épaissir la boîte UNIQUEMENT si c'est la cible
-                # 6 = Gras (Sélectionné)
-                # 2 = Normal/Fin (Non sélectionné)
-                thick = 6 if tid == target_id else 2
-                
-                cv2.rectangle(frame, (x1, y1), (x2, y2), col_bgr, thick)
-
-                # Construction du texte
-                txt = ""
-                if overlay_options["ID"]: txt += f"ID:{tid} "
-                if overlay_options["Classe"]: txt += f"{final_name} "
-                if overlay_options["Distance"]: txt += f"{dist:.0f}m "
-                if overlay_options["Vitesse"]: txt += f"{speed:.1f}kt "
-                if overlay_options["Cap"]: txt += f"{heading:.0f}° "
-                if overlay_options["Conf"]: txt += f"{final_conf:.2f}"
-                
-                if txt.strip():
-                    (tw, th), _ = cv2.getTextSize(txt, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
-                    cv2.rectangle(frame, (x1, y1-th-4), (x1+tw+4, y1), col_bgr, -1)
-                    cv2.putText(frame, txt.strip(), (x1+2, y1-3), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
-
-        # Cleanup
-        for tid in list(ages):
-            if tid not in active:
-                ages[tid] += 1
-                if ages[tid] > MAX_TRACK_AGE:
-                    for db in [history, info, dist_f, ages, track_state, box_locations]: db.pop(tid, None)
-            else: ages[tid] = 0
-
-        try:
-            _, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
-            with frame_lock: current_frame = buffer.tobytes()
-        except: pass
-
-        socketio.emit('update', {
-            "tracks": {str(k): v for k, v in info.items() if k in active},
-            "target_id": target_id,
-            "fps": round(fps, 1)
-        })
-        time.sleep(0.01)
-
-def generate_frames():
+# Modèles chargés et préchauffés en arrière-plan dès le démarrage ; l'état est poussé à l'interface
+loader = ModelLoader(on_change=lambda st: socketio.emit('readiness', st), run=tpool.execute)
+
+def get_classification_models():
+    return loader.classifiers()
+
+batcher = BatchClassifier(get_classification_models)
+
+def submit_classification(tid, crop_img, crop_origin, priority=0.0):
+    # Regroupé avec les crops des autres pistes (un seul passage B puis C), par ordre de priorité
+    return batcher.submit(tid, crop_img, crop_origin, priority)
+
+# URL de page -> URL de flux au plus petit format utile (>= PROC_MAX_WIDTH), en cache jusqu'à expiration
+resolver = StreamResolver()
+
+def get_detector():
+    return loader.detector()
+
+# Sources nommées, un seul modelA partagé (détection groupée entre les flux). Le pipeline
+# tourne dans des threads natifs ; émissions et images encodées reviennent au hub par la passerelle
+bridge = GreenBridge()
+sources = SourceManager(get_detector, submit_classification, socketio.emit, bridge=bridge)
+
+def watch_hub(period=0.05):
+    # Retard du hub eventlet (sommeil demandé / obtenu) : doit rester proche de 0 même
+    # quand l'inférence sature un cœur
     while True:
-        with frame_lock:
-            if current_frame: yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + current_frame + b'\r\n')
-        time.sleep(0.04)
+        t0 = time.perf_counter()
+        eventlet.sleep(period)
+        metrics.observe("hub_lag", time.perf_counter() - t0 - period)
+
+def emit_sources():
+    socketio.emit('sources', {"names": sources.names()})
 
 
 #############################################################################################################
@@ -300,75 +70,179 @@ def generate_frames():
   
 # affichage page html
 @app.route('/')
-def index(): return render_template('index.html')
+def index(): return render_template('index.html', overlay_mode=OVERLAY_MODE)
 
-# flux vidéo (JPEG)
+# flux vidéo (JPEG) d'une source : une image n'est envoyée que si elle est nouvelle
 @app.route('/video_feed')
-def video_feed(): return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+@app.route('/video_feed/<name>')
+def video_feed(name=None):
+    src = sources.get(name)
+    if src is None: return "Aucune source", 404
+    # ?overlay=client : image brute (overlays dessinés par le navigateur), sinon image annotée
+    b = src.raw_broadcaster if request.args.get('overlay') == 'client' else src.broadcaster
+    return Response(b.stream(request.remote_addr), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+# compteurs par client du flux vidéo (images envoyées / sautées), par source
+@app.route('/video_stats')
+def video_stats(): return jsonify({n: {"annotated": sources.get(n).broadcaster.stats(),
+                                       "raw": sources.get(n).raw_broadcaster.stats()} for n in sources.names()})
+
+# état du traitement par source (FPS de sortie / de détection, qualité de propagation)
+@app.route('/pipeline_stats')
+def pipeline_stats(): return jsonify({n: sources.get(n).stats() for n in sources.names()})
+
+# passerelle threads natifs -> hub (appels en attente, abandonnés, images remplacées)
+@app.route('/bridge_stats')
+def bridge_stats(): return jsonify(bridge.stats())
+
+# cache des URL de flux résolues (format retenu, expiration)
+@app.route('/stream_cache')
+def stream_cache(): return jsonify(resolver.stats())
+
+# état de chargement des modèles (backend retenu, durées, temps jusqu'à prêt)
+@app.route('/models')
+def models_status(): return jsonify(loader.status())
+
+# file de classification B/C (profondeur, attente, jobs abandonnés / annulés)
+@app.route('/classify_stats')
+def classify_stats(): return jsonify(batcher.stats())
+
+# durées des étapes (p50/p95/p99), compteurs et jauges, format texte Prometheus
+@app.route('/metrics')
+def prometheus_metrics():
+    # Jobs annulés par une source depuis le dernier submit/lot : profondeur relue au scrape
+    metrics.gauge("classify_depth", batcher.depth())
+    return Response(metrics.REGISTRY.prometheus(), mimetype='text/plain; version=0.0.4')
+
+# mêmes mesures en JSON pour le panneau de debug de l'interface
+@app.route('/metrics.json')
+def metrics_json(): return jsonify(metrics.REGISTRY.summary())
 
 # route pour servir les fichiers statiques (JS, CSS)
 @app.route('/static/<path:filename>')
 def serve_static(filename): return send_from_directory('static', filename)
 
 
+# compteurs du canal de télémétrie par client, par source
+@app.route('/telemetry_stats')
+def telemetry_stats(): return jsonify({n: sources.get(n).telemetry.stats() for n in sources.names()})
+
+
+@socketio.on('connect')
+def handle_connect():
+    # Table des classes envoyée une fois : la télémétrie ne transporte que des ids
+    sources.attach(request.sid)
+    emit('telemetry_meta', {"version": TELEMETRY_VERSION, "classes": CLASS_NAMES, "colors": CLASS_HEX})
+    emit('sources', {"names": sources.names()})
+    emit('readiness', loader.status())
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    sources.detach(request.sid)
+
+@socketio.on('telemetry')
+def handle_telemetry(data):
+    # Débit souhaité par ce client (plafonné à TELEMETRY_MAX_HZ)
+    src = sources.source_of(request.sid)
+    if src: src.telemetry.set_rate(request.sid, float(data.get('max_hz', TELEMETRY_MAX_HZ)))
+
 @socketio.on('start')
 def handle_start(data):
-    global cap, running
-    running = True
-    src = get_video_source(data.get('url'))
-    cap = cv2.VideoCapture(src if src else 0)
-    threading.Thread(target=process_frame_worker, daemon=True).start()
+    # Démarre (ou remplace) la source nommée ; les autres sources continuent. Le handler rend
+    # la main tout de suite : résolution et ouverture sont suivies par 'source_status'
+    socketio.start_background_task(start_source, request.sid, data.get('name') or "main", data)
+
+def start_source(sid, name, data):
+    status = lambda state, **info: socketio.emit('source_status', dict(name=name, state=state, **info), to=sid)
+    # Tâche de fond : une exception non remontée laisserait le client sur « ouverture »
+    try: _start_source(sid, name, data, status)
+    except Exception as e:
+        print(f"[SOURCE] {name} : {e!r}")
+        status('error', error=str(e) or repr(e))
+
+def _start_source(sid, name, data, status):
+    url = data.get('url')
+    record = None
+    if data.get('record'):
+        # Détections et votes B/C enregistrés pour un rejeu sans inférence (recording.py)
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        record = os.path.join(RECORD_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.vrec")
+    # Même URL déjà lue : options appliquées en place, capture et pistes conservées
+    src = None if data.get('restart') else \
+        tpool.execute(sources.reuse, name, url, data.get('stride'), data.get('tiling'), record)
+    if src:
+        sources.attach(sid, name)
+        status('running', reused=True)
+        return
+    status('resolving')
+    # yt_dlp (réseau + analyse) et ouverture du flux hors du hub
+    res = tpool.execute(resolver.resolve, url)
+    status('opening', width=res.width, height=res.height, format=res.format_id, cached=res.cached)
+    cap = tpool.execute(open_capture, res.stream_url if res.stream_url else 0)
+    if not cap.isOpened():
+        status('error', error="flux illisible")
+        return
+
+    def reopen():
+        # Appelé par le grabber (thread natif) quand le lien signé expire ou que la lecture échoue
+        bridge.call(status, 'reopening')
+        cap, expires = resolver.open(url, force=True)
+        bridge.call(status, 'running' if cap.isOpened() else 'error')
+        return cap, expires
+
+    # Remplacement à chaud : attente de la première image puis arrêt de l'ancienne source, hors du hub
+    src = tpool.execute(sources.start, name, url, cap, stride=data.get('stride'), tiling=data.get('tiling'),
+                        record=record, reopen=reopen if (url or "").startswith("http") else None, expires=res.expires)
+    if src is None:
+        status('error', error="aucune image reçue, source précédente conservée")
+        return
+    sources.attach(sid, name)
+    status('running', width=res.width, height=res.height)
+    emit_sources()
 
 @socketio.on('stop')
-def handle_stop(d):
-    global running, cap
-    running = False
-    if cap: cap.release()
+def handle_stop(data):
+    name = (data or {}).get('name')
+    src = sources.get(name) if name else sources.source_of(request.sid)
+    if src: tpool.execute(sources.stop, src.name)
+    emit_sources()
+
+@socketio.on('select_source')
+def handle_select_source(data):
+    # Flux affiché par ce client (télémétrie, clics, mode overlay)
+    sources.attach(request.sid, data.get('name'))
 
 @socketio.on('toggle')
 def handle_toggle(data):
+    # Valeur explicite (état de la case du client) ; sans valeur, bascule (anciens clients)
     key = data.get('key')
     if key in overlay_options:
-        overlay_options[key] = not overlay_options[key]
+        overlay_options[key] = bool(data['value']) if 'value' in data else not overlay_options[key]
+
+@socketio.on('overlay_mode')
+def handle_overlay_mode(data):
+    # "server" : overlays incrustés dans le JPEG / "client" : image brute + boîtes dans 'update'.
+    # Choix propre à ce client : il lit ensuite le flux correspondant (/video_feed/<nom>?overlay=...)
+    sources.set_overlay(request.sid, data.get('mode'))
 
 @socketio.on('click')
 def handle_click(data):
     # Réception d'un clic sur l'image (coordonnées normalisées de 0.0 à 1.0)
-    global target_id
     cx = data.get('x')
     cy = data.get('y')
     
     if cx is None or cy is None:
         return
 
-    found = None
-    min_dist = 1000
-    
-    # Chercher la boîte la plus proche ou contenant le clic
-    # On itère sur box_locations rempli par process_frame_worker
-    for tid, (x1, y1, x2, y2) in box_locations.items():
-        # Vérifier si le point est dans la boîte
-        if x1 <= cx <= x2 and y1 <= cy <= y2:
-            # Calcul de la distance au centre de la boîte pour départager
-            center_x = (x1 + x2) / 2
-            center_y = (y1 + y2) / 2
-            dist = (cx - center_x)**2 + (cy - center_y)**2
-            
-            if dist < min_dist:
-                min_dist = dist
-                found = tid
-
-    # Si on a trouvé une cible, on la sélectionne, ou on désélectionne si c'est la même
-    if found is not None:
-        if target_id == found:
-            target_id = None # Désélection
-        else:
-            target_id = found # Sélection
-    else:
-        # Clic hors de tout bateau -> désélection
-        target_id = None
+    # Boîte contenant le clic la plus proche de son centre : sélection,
+    # désélection si c'est la même cible ou si le clic est hors de tout bateau
+    src = sources.source_of(request.sid)
+    if src: src.select(cx, cy)
 
 
 # Démarrage de l'application
 if __name__ == '__main__':
+    loader.start()
+    bridge.start()
+    eventlet.spawn(watch_hub)
     socketio.run(app, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,158 @@
+"""
+backends.py — Choix du backend d'inférence des modèles A/B/C.
+
+Au premier démarrage, chaque modèle est exporté vers les formats candidats
+(ONNX Runtime, OpenVINO, éventuellement quantifiés int8), puis un court
+benchmark sur des images synthétiques désigne le plus rapide sur la machine.
+Les artefacts exportés et la décision (<poids>.backend.json) sont rangés à
+côté des poids ; ils sont réutilisés tant que le .pt n'a pas changé.
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+from config import MODEL_BACKENDS, BACKEND_INT8, BACKEND_INT8_DATA, BACKEND_BENCH_RUNS
+
+
+def _yolo(path, task=None):
+    from ultralytics import YOLO
+    return YOLO(path, task=task) if task else YOLO(path)
+
+
+def artifact_path(pt_path, backend, int8=False, engine_path=None):
+    """Chemin de l'artefact d'un backend (fichier ou dossier, comme l'export Ultralytics)."""
+    stem = os.path.splitext(pt_path)[0]
+    if backend == "pt": return pt_path
+    if backend == "engine": return engine_path
+    if backend == "onnx": return stem + ("-int8.onnx" if int8 else ".onnx")
+    if backend == "openvino": return stem + ("_int8_openvino_model" if int8 else "_openvino_model")
+    return None
+
+
+def export(pt_path, backend, imgsz, int8=False):
+    """Exporte le .pt vers `backend` si l'artefact n'existe pas encore ; retourne son chemin ou None."""
+    path = artifact_path(pt_path, backend, int8)
+    if path and os.path.exists(path): return path
+    model = _yolo(pt_path)
+    if backend == "onnx":
+        out = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if int8: out = _quantize_onnx(out, path)
+    elif backend == "openvino":
+        kwargs = {"int8": True, "data": BACKEND_INT8_DATA} if int8 else {}
+        out = model.export(format="openvino", imgsz=imgsz, dynamic=True, **kwargs)
+    else:
+        return None
+    out = str(out)
+    if out != path and os.path.exists(out): os.replace(out, path)
+    return path if os.path.exists(path) else None
+
+
+def _quantize_onnx(src, dst):
+    # Quantification dynamique des poids (pas de jeu de calibration nécessaire)
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(str(src), dst, weight_type=QuantType.QUInt8)
+    return dst
+
+
+def _median_ms(model, frames, imgsz, runs):
+    kwargs = {"imgsz": imgsz, "verbose": False}
+    model.predict(frames, **kwargs)
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        model.predict(frames, **kwargs)
+        times.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(times))
+
+
+def benchmark(model, imgsz, batch=1, runs=BACKEND_BENCH_RUNS):
+    """
+    Latence médiane (ms) pour traiter `batch` images synthétiques, après échauffement.
+
+    Retourne (ms, batch effectif). Un moteur à batch fixe (TensorRT batch=1)
+    qui refuse le lot est mesuré image par image, comme classify_batch s'en
+    servira : son coût est alors batch x la latence d'une image.
+    """
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (imgsz, imgsz, 3), dtype=np.uint8) for _ in range(batch)]
+    try: return _median_ms(model, frames, imgsz, runs), batch
+    except Exception:
+        if batch == 1: raise
+    return _median_ms(model, frames[:1], imgsz, runs) * batch, 1
+
+
+def _cache_path(pt_path):
+    return os.path.splitext(pt_path)[0] + ".backend.json"
+
+
+def _read_cache(pt_path, imgsz, int8):
+    try:
+        with open(_cache_path(pt_path)) as f: cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cache.get("pt_mtime") != os.path.getmtime(pt_path) or cache.get("imgsz") != imgsz: return None
+    if cache.get("int8") != int8 or not os.path.exists(cache.get("path") or ""): return None
+    return cache
+
+
+def select_backend(pt_path, engine_path=None, name="model", imgsz=640, batch=1,
+                   backends=MODEL_BACKENDS, int8=BACKEND_INT8):
+    """
+    Charge le modèle avec le backend le plus rapide (benchmark au premier démarrage).
+
+    Paramètres
+    ----------
+    backends : tuple(str)
+        Candidats parmi "engine", "onnx", "openvino", "pt".
+    int8 : bool
+        Candidats ONNX/OpenVINO quantifiés int8 en plus des versions float.
+
+    Retourne (modèle, décision) ; décision = contenu du cache JSON.
+    """
+    if not os.path.exists(pt_path):
+        # Pas de .pt (ex. moteur seul déployé) : rien à exporter ni à comparer
+        path = engine_path if engine_path and os.path.exists(engine_path) else pt_path
+        return _yolo(path), {"backend": "engine" if path == engine_path else "pt", "path": path}
+
+    cache = _read_cache(pt_path, imgsz, int8)
+    if cache:
+        try: return _yolo(cache["path"], cache.get("task")), cache
+        except Exception: pass
+
+    base = _yolo(pt_path)
+    task = base.task
+    candidates = []
+    for b in backends:
+        for q in ((False, True) if int8 and b in ("onnx", "openvino") else (False,)):
+            candidates.append((b + ("-int8" if q else ""), b, q))
+
+    timings, failed, batch1, best = {}, {}, [], None
+    for label, b, q in candidates:
+        try:
+            if b == "pt": path, model = pt_path, base
+            else:
+                path = artifact_path(pt_path, b, q, engine_path) if b == "engine" else export(pt_path, b, imgsz, q)
+                if not path or not os.path.exists(path):
+                    failed[label] = "artefact absent"; continue
+                model = _yolo(path, task)
+            ms, used = benchmark(model, imgsz, batch)
+        except Exception as e:
+            # Raison conservée dans la décision : un choix par défaut se voit dans le cache
+            failed[label] = f"{type(e).__name__}: {e}"[:200]
+            print(f"[BACKEND] {name}: {label} indisponible ({e})")
+            continue
+        timings[label] = round(ms, 2)
+        if used != batch: batch1.append(label)
+        if best is None or ms < best[0]: best = (ms, label, path, model)
+
+    if best is None: return base, {"backend": "pt", "path": pt_path, "failed": failed}
+    decision = {"backend": best[1], "path": best[2], "task": task, "ms": timings, "failed": failed,
+                "batch1": batch1, "imgsz": imgsz, "int8": int8, "pt_mtime": os.path.getmtime(pt_path)}
+    print(f"[BACKEND] {name}: {best[1]} ({timings})")
+    try:
+        with open(_cache_path(pt_path), "w") as f: json.dump(decision, f, indent=2)
+    except OSError: pass
+    return best[3], decision
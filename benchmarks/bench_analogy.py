@@ -0,0 +1,64 @@
+"""
+bench_analogy.py — Compare filter_detections_by_analogy (NumPy) à la version
+de référence en double boucle, à 10, 100 et 1000 boîtes.
+
+Par défaut les lignes ont la forme que pipeline.py passe au filtre
+([x1, y1, x2, y2, nomA, conf, cls, tid], confiance en d[5]) ; --classes
+place l'id de classe en d[5] pour mesurer le cas où des paires sont
+apparentées.
+
+Usage :
+    python benchmarks/bench_analogy.py
+    python benchmarks/bench_analogy.py --sizes 10 100 1000 --repeat 5 --classes
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import CLASS_NAMES
+from detections import filter_detections_by_analogy, filter_detections_by_analogy_ref
+
+
+def make_dets(n, w=1920, h=1080, seed=0, classes=False):
+    """Détections aléatoires au format de VisionSource.process (id de classe en d[5] si `classes`)."""
+    rnd = random.Random(seed)
+    dets = []
+    for k in range(n):
+        # Boîtes regroupées autour de quelques centres pour avoir des recouvrements
+        cx, cy = rnd.gauss(w / 2, w / 6), rnd.gauss(h / 2, h / 8)
+        bw, bh = rnd.uniform(20, 200), rnd.uniform(10, 100)
+        cid = rnd.randrange(len(CLASS_NAMES))
+        conf = rnd.random()
+        d5, d6 = (cid, conf) if classes else (conf, cid)
+        dets.append([cx - bw/2, cy - bh/2, cx + bw/2, cy + bh/2, CLASS_NAMES[cid], d5, d6, k])
+    return dets
+
+
+def bench(fn, dets, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(dets)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du filtre par analogie")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--classes", action="store_true", help="id de classe en d[5] au lieu de la confiance")
+    args = parser.parse_args()
+
+    print(f"{'boîtes':>7}  {'référence':>12}  {'numpy':>12}  {'gain':>7}  identique")
+    for n in args.sizes:
+        dets = make_dets(n, classes=args.classes)
+        t_ref, out_ref = bench(filter_detections_by_analogy_ref, dets, args.repeat)
+        t_np, out_np = bench(filter_detections_by_analogy, dets, args.repeat)
+        same = len(out_ref) == len(out_np) and all(a is b for a, b in zip(out_ref, out_np))
+        print(f"{n:>7}  {t_ref*1000:>10.2f}ms  {t_np*1000:>10.2f}ms  {t_ref/t_np:>6.1f}x  {same}")
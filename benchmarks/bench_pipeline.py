@@ -0,0 +1,286 @@
+"""
+bench_pipeline.py — Débit du pipeline de vision sans navigateur, sans flux
+réel et sans les poids dataset-*.pt.
+
+Les images (fichier vidéo local rejoué en boucle, ou générateur synthétique)
+passent par le même code que le serveur : FrameGrabber, SourceManager
+(détection groupée, tuiles), VisionSource.process (tracking, filtre,
+physique, dessin, télémétrie), EncodeStage et BatchClassifier. Seuls les
+modèles A/B/C sont remplacés par des stubs de latence et de nombre de
+boîtes réglables. Résultat en JSON pour comparer les exécutions.
+
+Usage :
+    python benchmarks/bench_pipeline.py --duration 10
+    python benchmarks/bench_pipeline.py --video essai.mp4 --det-ms 25 --boxes 12 --out run.json
+    python benchmarks/bench_pipeline.py --sources 3 --stride 2 --cls-ms 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+from classifier import BatchClassifier
+from config import modelA_names, modelB_names, modelC_names
+from pipeline import SourceManager
+
+
+# ── Sources d'images ──────────────────────────────────────────────────────────
+
+class SyntheticCap:
+    """Capture factice : images texturées (coût JPEG réaliste) à `fps` images/s (0 = au plus vite)."""
+
+    def __init__(self, width=1280, height=720, fps=30.0, pool=16, seed=0):
+        rng = np.random.default_rng(seed)
+        sky = np.linspace(200, 120, height // 2, dtype=np.float32)[:, None, None] * np.ones((1, width, 3), np.float32)
+        sea = np.linspace(90, 40, height - height // 2, dtype=np.float32)[:, None, None] * np.ones((1, width, 3), np.float32)
+        base = np.concatenate([sky, sea], axis=0)
+        self.frames = [np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8) for _ in range(pool)]
+        self.period = 1.0 / fps if fps > 0 else 0.0
+        self.next_t = time.time()
+        self.n      = 0
+
+    def read(self, image=None):
+        if self.period:
+            self.next_t = max(self.next_t + self.period, time.time() - self.period)
+            delay = self.next_t - time.time()
+            if delay > 0: time.sleep(delay)
+        self.n += 1
+        frame = self.frames[self.n % len(self.frames)]
+        # Comme cv2.VideoCapture.read(image) : écrit dans le tampon fourni s'il a la bonne forme
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame.copy()
+
+    def get(self, prop):
+        return 0
+
+    def release(self):
+        pass
+
+
+class LoopingFileCap:
+    """Fichier vidéo rejoué en boucle ; `realtime` respecte son FPS natif (sinon au plus vite)."""
+
+    def __init__(self, path, realtime=False):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened(): raise SystemExit(f"Vidéo illisible : {path}")
+        self.realtime = realtime
+
+    def read(self, image=None):
+        ok, frame = self.cap.read(image)
+        if not ok:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.cap.read(image)
+        return ok, frame
+
+    def grab(self):
+        if self.cap.grab(): return True
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return self.cap.grab()
+
+    def retrieve(self, image=None):
+        return self.cap.retrieve(image)
+
+    def get(self, prop):
+        # FrameGrabber ne cadence que les sources qui annoncent un nombre d'images
+        if prop == cv2.CAP_PROP_FRAME_COUNT and not self.realtime: return 0
+        return self.cap.get(prop)
+
+    def release(self):
+        self.cap.release()
+
+
+# ── Modèles factices ──────────────────────────────────────────────────────────
+
+class _Tensor:
+    """Imite l'API .cpu().numpy() des tenseurs Ultralytics."""
+
+    def __init__(self, a): self.a = a
+    def cpu(self): return self
+    def numpy(self): return self.a
+
+
+class _Boxes:
+    def __init__(self, data):
+        self.xyxy, self.conf, self.cls = _Tensor(data[:, :4]), _Tensor(data[:, 4]), _Tensor(data[:, 5])
+        self.n = len(data)
+
+    def __len__(self): return self.n
+
+
+class _Result:
+    def __init__(self, data): self.boxes = _Boxes(np.asarray(data, dtype=np.float32).reshape(-1, 6))
+
+
+class StubDetector:
+    """
+    modelA factice : `boxes` bateaux qui traversent l'image à vitesse constante.
+
+    Latence simulée = ms_batch + ms_image x taille du lot.
+    """
+
+    def __init__(self, boxes=8, ms_batch=15.0, ms_image=5.0, seed=0):
+        rng = np.random.default_rng(seed)
+        self.start    = rng.uniform(0, 1, (boxes, 2)) * [1.0, 0.3] + [0, 0.4]   # centres normalisés
+        self.speed    = rng.uniform(-0.03, 0.03, boxes)                         # largeur d'image / s
+        self.size     = rng.uniform(0.02, 0.12, (boxes, 1)) * [1.0, 0.5]
+        self.ms_batch = ms_batch
+        self.ms_image = ms_image
+        self.t0       = time.time()
+
+    def predict(self, frames, conf=0.25, verbose=False, **kwargs):
+        time.sleep((self.ms_batch + self.ms_image * len(frames)) / 1000)
+        t = time.time() - self.t0
+        out = []
+        for f in frames:
+            h, w = f.shape[:2]
+            c = self.start.copy()
+            c[:, 0] = (c[:, 0] + self.speed * t) % 1.0
+            b = np.concatenate([c - self.size / 2, c + self.size / 2], axis=1) * [w, h, w, h]
+            out.append(_Result(np.concatenate([b, np.full((len(b), 1), 0.8), np.ones((len(b), 1))], axis=1)))
+        return out
+
+
+class StubClassifier:
+    """modelB / modelC factice : une boîte par crop, classe tirée au hasard, `ms_image` ms par crop."""
+
+    def __init__(self, names, ms_batch=3.0, ms_image=2.0, seed=0):
+        self.names    = names
+        self.rng      = np.random.default_rng(seed)
+        self.ms_batch = ms_batch
+        self.ms_image = ms_image
+
+    def __call__(self, imgs, **kwargs):
+        imgs = imgs if isinstance(imgs, list) else [imgs]
+        time.sleep((self.ms_batch + self.ms_image * len(imgs)) / 1000)
+        out = []
+        for img in imgs:
+            h, w = img.shape[:2]
+            out.append(_Result([[w * 0.1, h * 0.1, w * 0.9, h * 0.9, self.rng.uniform(0.5, 0.99),
+                                 self.rng.integers(len(self.names))]]))
+        return out
+
+
+# ── Mesures ───────────────────────────────────────────────────────────────────
+
+def rss_mb():
+    """Mémoire résidente du processus (Mo)."""
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def quantiles_ms(stage, source):
+    s = metrics.REGISTRY.summaries.get((stage, source))
+    if s is None: return None
+    p50, p95, p99 = s.quantiles()
+    return {"p50": round(p50 * 1000, 2), "p95": round(p95 * 1000, 2), "p99": round(p99 * 1000, 2), "count": s.count}
+
+
+def counter(name, source=""):
+    return metrics.REGISTRY.counters.get((name, source), 0)
+
+
+def run(args):
+    detector = StubDetector(args.boxes, args.det_ms, args.det_ms_image)
+    modelB, modelC = StubClassifier(modelB_names, args.cls_ms, args.cls_ms_image), \
+                     StubClassifier(modelC_names, args.cls_ms, args.cls_ms_image, seed=1)
+    batcher = BatchClassifier(lambda: (modelB, modelC))
+    sent = {"messages": 0, "bytes": 0}
+
+    def emit(event, payload, to=None):
+        sent["messages"] += 1
+        sent["bytes"] += len(payload) if isinstance(payload, (bytes, bytearray)) else 0
+
+    manager = SourceManager(lambda: detector, batcher.submit, emit)
+    names = [f"bench{i}" for i in range(args.sources)]
+    for i, name in enumerate(names):
+        cap = LoopingFileCap(args.video, args.realtime) if args.video else \
+              SyntheticCap(args.width, args.height, args.fps, seed=i)
+        src = manager.start(name, args.video or "synthetic", cap, stride=args.stride, tiling=args.tiling)
+        src.overlay_mode = args.overlay
+        src.grabber.target_fps = args.target_fps
+        src.telemetry.add_client("bench")
+
+    # Échauffement puis remise à zéro des compteurs
+    time.sleep(args.warmup)
+    metrics.REGISTRY.summaries.clear(); metrics.REGISTRY.counters.clear()
+    start = {n: (manager.get(n).frame_count, manager.get(n).detections, manager.get(n).grabber.decode_cpu)
+             for n in names}
+    cls0, mem0, t0 = batcher.processed, rss_mb(), time.time()
+    mem_samples = []
+    while time.time() - t0 < args.duration:
+        time.sleep(min(1.0, args.duration / 10))
+        mem_samples.append(rss_mb())
+    elapsed = time.time() - t0
+
+    result = {"args": vars(args), "elapsed_s": round(elapsed, 2), "sources": {}}
+    for n in names:
+        src = manager.get(n)
+        frames, dets = src.frame_count - start[n][0], src.detections - start[n][1]
+        # Sans client MJPEG, --overlay choisit le flux encodé (annoté ou brut)
+        stage = src.encode_stage if args.overlay == "server" else src.raw_stage
+        result["sources"][n] = {
+            "fps": round(frames / elapsed, 2), "detect_fps": round(dets / elapsed, 2),
+            "latency_ms": quantiles_ms("latency", n), "process_ms": quantiles_ms("process", n),
+            "encode_ms": quantiles_ms("encode", stage.name), "dropped": src.grabber.dropped,
+            "skipped": counter("frames_skipped", n),
+            "decode_cpu_pct": round(100 * (src.grabber.decode_cpu - start[n][2]) / elapsed, 1),
+            "encode_dropped": stage.dropped, "classify": src.scheduler.stats(),
+            "copies": {"frames": src.grabber.copies, "crops": counter("crop_copies", n),
+                       "crop_views": counter("crop_views", n), "ring_full": counter("ring_full", n)},
+        }
+    result["fps_total"] = round(sum(s["fps"] for s in result["sources"].values()), 2)
+    result["detect_ms"] = quantiles_ms("detect", "")
+    cpu = metrics.REGISTRY.summaries.get(("detect_cpu", ""))
+    result["detect_cpu_pct"] = round(100 * cpu.total / elapsed, 1) if cpu else None
+    result["classification"] = dict(batcher.stats(), crops_per_s=round((batcher.processed - cls0) / elapsed, 2))
+    result["memory_mb"] = {"start": round(mem0, 1), "end": round(mem_samples[-1], 1),
+                           "growth": round(mem_samples[-1] - mem0, 1),
+                           "growth_per_min": round((mem_samples[-1] - mem0) / elapsed * 60, 2)}
+    result["telemetry"] = dict(sent, bytes_per_s=round(sent["bytes"] / elapsed))
+    result["stages"] = metrics.REGISTRY.summary()
+
+    for n in names: manager.stop(n)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark headless du pipeline de vision")
+    parser.add_argument("--video", help="Fichier vidéo local rejoué en boucle (défaut : images synthétiques)")
+    parser.add_argument("--realtime", action="store_true", help="Respecte le FPS natif de la vidéo")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=float, default=30.0, help="FPS des images synthétiques (0 = au plus vite)")
+    parser.add_argument("--sources", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--boxes", type=int, default=8, help="Bateaux renvoyés par le détecteur factice")
+    parser.add_argument("--det-ms", type=float, default=15.0, help="Latence fixe d'un lot modelA")
+    parser.add_argument("--det-ms-image", type=float, default=5.0, help="Latence modelA par image du lot")
+    parser.add_argument("--cls-ms", type=float, default=3.0, help="Latence fixe d'un lot B ou C")
+    parser.add_argument("--cls-ms-image", type=float, default=2.0, help="Latence B ou C par crop")
+    parser.add_argument("--stride", type=int, default=None)
+    parser.add_argument("--tiling", action="store_true", default=None)
+    parser.add_argument("--target-fps", type=float, default=0.0,
+                        help="Decode-skip : images converties par seconde et par source (0 = toutes, vidéo seulement)")
+    parser.add_argument("--overlay", choices=("server", "client"), default="server")
+    parser.add_argument("--out", help="Fichier JSON de sortie (défaut : stdout)")
+    args = parser.parse_args()
+
+    result = json.dumps(run(args), indent=2)
+    if args.out:
+        with open(args.out, "w") as f: f.write(result + "\n")
+    else:
+        print(result)
@@ -0,0 +1,311 @@
+"""
+capture.py — Étage de capture vidéo dédié.
+
+Lit la source en continu dans son propre thread (natif, voir native.py) et ne garde que la dernière
+image (on écrase la plus ancienne) : l'inférence travaille toujours sur une
+image fraîche au lieu de vider la file du décodeur.
+
+Les images sont décodées directement dans un anneau en mémoire partagée
+(framering.py) : read() rend une vue du slot, référencée pour le lecteur,
+qui la relâche quand il a fini (item[3].release()).
+
+Mode « decode-skip » (target_fps) : grab() avance dans le flux à chaque
+image, retrieve() (conversion YUV -> BGR et copie) n'est appelé que pour
+les images qui seront traitées : une par période cible, et seulement si
+la précédente a été consommée. Le temps CPU du thread de capture est
+mesuré à part (métrique decode_cpu) pour le distinguer de l'inférence.
+
+open_capture() demande au backend, s'il le permet, le décodage matériel
+(CAP_PROP_HW_ACCELERATION) et une définition réduite (mode caméra, ou
+pipeline GStreamer avec videoscale).
+
+Usage :
+    grabber = FrameGrabber(open_capture(src)).start()
+    item = grabber.read(last_seq)      # (seq, timestamp, frame, SlotRef) ou None
+    ...
+    item[3].release()
+    grabber.stop()
+"""
+
+import os
+import re
+
+import cv2
+import numpy as np
+
+import metrics
+from config import (CAPTURE_REOPEN_FAILURES, STREAM_URL_MARGIN, CAPTURE_TARGET_FPS, CAPTURE_HW_DECODE,
+                    CAPTURE_BACKEND, CAPTURE_DECODE_WIDTH)
+from framering import FrameRing, SlotRef
+from native import threading, time
+
+_GSTREAMER = None
+
+
+def has_gstreamer() -> bool:
+    global _GSTREAMER
+    if _GSTREAMER is None:
+        _GSTREAMER = bool(re.search(r"GStreamer:\s*YES", cv2.getBuildInformation()))
+    return _GSTREAMER
+
+
+def gst_pipeline(src, width=0):
+    """Pipeline GStreamer : décodeur choisi par uridecodebin (matériel s'il existe), mise à l'échelle avant conversion BGR."""
+    uri = src if "://" in src else "file://" + os.path.abspath(src)
+    scale = f" ! videoscale ! video/x-raw,width={int(width)},pixel-aspect-ratio=1/1" if width else ""
+    return (f"uridecodebin uri={uri}{scale} ! videoconvert ! video/x-raw,format=BGR"
+            " ! appsink drop=true max-buffers=1 sync=false")
+
+
+def open_capture(src, hw: bool = CAPTURE_HW_DECODE, backend: str = CAPTURE_BACKEND, width: int = CAPTURE_DECODE_WIDTH):
+    """
+    Ouvre une capture en demandant, quand le backend le permet, décodage matériel et définition réduite.
+
+    Paramètres
+    ----------
+    src : str ou int
+        URL, fichier ou index de caméra.
+    hw : bool
+        Décodage matériel FFmpeg (VIDEO_ACCELERATION_ANY, repli logiciel sinon).
+    backend : str
+        "auto", "ffmpeg" ou "gstreamer".
+    width : int
+        Largeur de décodage souhaitée (0 = native) : mode caméra le plus
+        proche, ou mise à l'échelle dans le pipeline GStreamer.
+    """
+    if isinstance(src, int) or (isinstance(src, str) and src.isdigit()):
+        cap = cv2.VideoCapture(int(src))
+        if width: cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)     # le pilote choisit le mode le plus proche
+        return cap
+    if backend == "gstreamer" or (backend == "auto" and width and has_gstreamer()):
+        cap = cv2.VideoCapture(gst_pipeline(src, width), cv2.CAP_GSTREAMER)
+        if cap.isOpened(): return cap
+    if hw and hasattr(cv2, "CAP_PROP_HW_ACCELERATION"):
+        cap = cv2.VideoCapture(src, cv2.CAP_FFMPEG, [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+        if cap.isOpened(): return cap
+    return cv2.VideoCapture(src)
+
+
+class FrameGrabber:
+    """
+    Thread de capture avec anneau « dernière image ».
+
+    Paramètres
+    ----------
+    cap : cv2.VideoCapture
+        Source déjà ouverte (caméra, fichier, flux yt_dlp).
+    pace_files : bool
+        Pour un fichier local, respecte le FPS natif au lieu de décoder
+        aussi vite que possible (sinon la vidéo défile en accéléré).
+    name : str
+        Nom de la source pour les métriques.
+    reopen : callable, optionnel
+        reopen() -> (cap, expiration) : nouvelle capture du même flux (URL
+        re-résolue). Appelé quand l'URL signée arrive à expiration ou après
+        CAPTURE_REOPEN_FAILURES lectures ratées consécutives.
+    expires : float, optionnel
+        Expiration (timestamp) de l'URL de la capture actuelle.
+    target_fps : float
+        Mode decode-skip : images réellement décodées par seconde au plus
+        (0 = toutes). Sans effet si la capture n'a pas grab()/retrieve().
+    """
+
+    def __init__(self, cap, pace_files: bool = True, name: str = "", reopen=None, expires=None,
+                 target_fps: float = CAPTURE_TARGET_FPS):
+        self.cap             = cap
+        self.name            = name
+        self.reopen          = reopen
+        self.expires         = expires
+        self.reopens         = 0
+        self._failures       = 0
+        self._cond           = threading.Condition()
+        self.ring            = None     # framering.FrameRing, créé à la première image
+        self._retired        = []       # anneaux remplacés (changement de résolution)
+        self._read_into      = True
+        self._seq            = 0
+        self._consumed       = True
+        self._running        = False
+        self._thread         = None
+        self.dropped         = 0
+        self.read_failures   = 0
+        self.copies          = 0        # images copiées dans l'anneau (non décodées sur place)
+        self.skipped         = 0        # images avancées par grab() sans retrieve()
+        self.decode_cpu      = 0.0      # temps CPU du thread de capture (s)
+        self.started         = time.time()
+        self.target_fps      = target_fps
+
+        self._period = 0.0
+        if pace_files and cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            if fps and fps > 0: self._period = 1.0 / fps
+
+    # ── Cycle de vie ───────────────────────────────────────────────────────────
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self):
+        self._running = True
+        self.started  = time.time()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 1.0):
+        """Arrête le thread de lecture et libère l'anneau (la capture n'est pas libérée)."""
+        self._running = False
+        with self._cond: self._cond.notify_all()
+        thread, self._thread = self._thread, None
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout)
+            if thread.is_alive(): return    # encore dans cap.read() : l'anneau reste à lui
+        for ring in self._retired + [self.ring]:
+            if ring: ring.close()
+        self.ring, self._retired = None, []
+
+    # ── Lecture ────────────────────────────────────────────────────────────────
+
+    def _reopen(self, why):
+        """Rouvre le flux (URL re-résolue) et reprend à la même position pour une vidéo finie."""
+        if self.reopen is None:
+            time.sleep(0.05); return
+        print(f"[{self.name}] Réouverture du flux ({why})")
+        pos = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        try: cap, expires = self.reopen()
+        except Exception as e: cap, expires = None, None; print(f"[{self.name}] Réouverture impossible : {e}")
+        if cap is None or not cap.isOpened():
+            # Nouvel essai après un délai ; l'ancienne capture est gardée d'ici là
+            self.expires = time.time() + STREAM_URL_MARGIN + 5
+            time.sleep(1.0); return
+        if pos > 0 and cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0: cap.set(cv2.CAP_PROP_POS_MSEC, pos)
+        old, self.cap, self.expires = self.cap, cap, expires
+        old.release()
+        self._failures = 0
+        self.reopens += 1
+        metrics.inc("reopens", source=self.name)
+
+    @property
+    def skip_period(self) -> float:
+        """Période minimale entre deux retrieve() en mode decode-skip (0 = mode désactivé)."""
+        if not self.target_fps or not hasattr(self.cap, "grab") or not hasattr(self.cap, "retrieve"): return 0.0
+        return 1.0 / self.target_fps
+
+    def _decode(self, buf, retrieve=False):
+        # Décodage sur place dans le slot si la capture le permet (cv2.VideoCapture.read(image))
+        fn = self.cap.retrieve if retrieve else self.cap.read
+        if buf is not None and self._read_into:
+            try: return fn(buf)
+            except TypeError: self._read_into = False   # capture sans read(image) (tests, rejeu)
+        return fn()
+
+    def _store(self, slot, frame):
+        """Slot contenant `frame` : celui où elle a été décodée, sinon une copie (comptée)."""
+        ring = self.ring
+        if ring is not None and np.may_share_memory(frame, ring.data[slot]): return slot
+        # Première image, capture sans décodage sur place ou changement de résolution
+        if ring is None or not ring.fits(frame.shape):
+            if ring is not None:
+                ring.abort(slot)
+                self._retired.append(ring)   # slots encore référencés en aval
+            ring = self.ring = FrameRing(frame.shape, seq=self._seq)
+            slot = ring.acquire()
+        np.copyto(ring.buffer(slot, frame.shape), frame)
+        self.copies += 1
+        metrics.inc("frame_copies", source=self.name)
+        return slot
+
+    def _cpu(self, c0):
+        dt = time.thread_time() - c0
+        self.decode_cpu += dt
+        metrics.observe("decode_cpu", dt, self.name)
+
+    def _loop(self):
+        next_t = time.time()
+        next_retrieve = 0.0
+        while self._running:
+            t0, c0 = time.perf_counter(), time.thread_time()
+            skip = self.skip_period
+            ok = True
+            if skip:
+                ok = self.cap.grab()
+                now = time.time()
+                if ok and not (self._consumed and now >= next_retrieve):
+                    # Image avancée mais jamais convertie : l'aval n'en veut pas encore
+                    self.skipped += 1
+                    metrics.inc("frames_skipped", source=self.name)
+                    metrics.observe("grab", time.perf_counter() - t0, self.name)
+                    self._cpu(c0)
+                    next_t = self._pace(next_t, now)
+                    continue
+                if ok: next_retrieve = max(next_retrieve + skip, now - skip)
+            slot = self.ring.acquire() if self.ring else -1
+            if self.ring and slot < 0:
+                # Tous les slots référencés : l'aval doit d'abord en rendre un
+                metrics.inc("ring_full", source=self.name)
+                time.sleep(0.005); continue
+            if ok: ok, frame = self._decode(self.ring.buffer(slot) if self.ring else None, retrieve=bool(skip))
+            if not ok:
+                if self.ring: self.ring.abort(slot)
+                self.read_failures += 1
+                self._failures += 1
+                metrics.inc("read_failures", source=self.name)
+                if self._failures >= CAPTURE_REOPEN_FAILURES: self._reopen("échecs de lecture")
+                else: time.sleep(0.05)
+                continue
+            self._failures = 0
+            if self.expires and time.time() > self.expires - STREAM_URL_MARGIN: self._reopen("lien expiré")
+            slot = self._store(slot, frame)
+            metrics.observe("capture", time.perf_counter() - t0, self.name)
+
+            now = time.time()
+            with self._cond:
+                # Image précédente jamais consommée -> perdue
+                if not self._consumed:
+                    self.dropped += 1
+                    metrics.inc("frames_dropped", source=self.name)
+                self._seq = self.ring.publish(slot, now, frame.shape)
+                self._consumed = False
+                self._cond.notify_all()
+            self._cpu(c0)
+            next_t = self._pace(next_t, now)
+
+    def _pace(self, next_t, now):
+        # Fichier local : cadence native de la vidéo (grab() seul compris)
+        if not self._period: return next_t
+        next_t = max(next_t + self._period, now - self._period)
+        delay = next_t - time.time()
+        if delay > 0: time.sleep(delay)
+        return next_t
+
+    def wait_first(self, timeout: float) -> bool:
+        """Attend la première image lue (sans la consommer). False si rien avant `timeout` ou si arrêté."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > 0 or not self._running, timeout)
+            return self._seq > 0
+
+    def read(self, last_seq: int = 0, timeout: float = 1.0):
+        """
+        Attend une image plus récente que `last_seq`.
+
+        Retourne (seq, timestamp, frame, ref) ou None si rien de neuf avant
+        `timeout` secondes ou si le grabber est arrêté. `frame` est une vue du
+        slot `ref` (framering.SlotRef), référencé jusqu'à ref.release().
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > last_seq or not self._running, timeout)
+            if self._seq <= last_seq or self.ring is None: return None
+            self._consumed = True
+            seq, ts, slot = self.ring.read_latest(0, last_seq)
+            ref = SlotRef(self.ring, slot)
+            return seq, ts, ref.view(), ref
+
+    def stats(self) -> dict:
+        elapsed = max(time.time() - self.started, 1e-6)
+        hw = self.cap.get(cv2.CAP_PROP_HW_ACCELERATION) if hasattr(cv2, "CAP_PROP_HW_ACCELERATION") else 0
+        return {"seq": self._seq, "dropped": self.dropped, "skipped": self.skipped, "read_failures": self.read_failures,
+                "frame_copies": self.copies, "reopens": self.reopens,
+                "decode_cpu_pct": round(100 * self.decode_cpu / elapsed, 1), "hw_accel": int(hw or 0),
+                "target_fps": self.target_fps if self.skip_period else None,
+                "expires_in_s": round(self.expires - time.time()) if self.expires else None,
+                "ring": self.ring.stats() if self.ring else None}
@@ -0,0 +1,225 @@
+"""
+classifier.py — Classification des crops par lots (modèles B et C).
+
+Les crops en attente de toutes les pistes sont regroupés, letterboxés au même
+format puis envoyés en une seule passe à modelB ; les crops validés par B
+repartent en un seul lot vers modelC. Chaque soumission renvoie un Future dont
+le résultat ({"tid", "resB", "resC"}) est ensuite appliqué à `track_state`.
+"""
+
+import heapq
+import itertools
+import math
+from concurrent.futures import Future as _Future
+
+import cv2
+import numpy as np
+
+from config import (CLASSIFY_BATCH_SIZE, CLASSIFY_MAX_WAIT, CLASSIFY_QUEUE_SIZE, CLASSIFY_TARGET_PRIORITY,
+                    CLASSIFY_MAX_INTERVAL, MAX_CROP_SIDE,
+                    CONF_THRESHOLD_B, CONF_THRESHOLD_C, modelB_names, modelC_names)
+import config
+import metrics
+from native import threading, time
+
+
+class Future(_Future):
+    """Future à condition native : résolu par le thread de classification, lu par le pipeline."""
+
+    def __init__(self):
+        super().__init__()
+        # concurrent.futures a importé le threading patché par eventlet
+        self._condition = threading.Condition()
+
+
+def _best_box(res, model_names, conf_thr):
+    """Meilleure détection d'un résultat Ultralytics (ou None)."""
+    if not res.boxes: return None
+    confs = res.boxes.conf.cpu().numpy()
+    idx = int(np.argmax(confs))
+    if confs[idx] < conf_thr: return None
+    cls = int(res.boxes.cls.cpu().numpy()[idx])
+    name = model_names[cls] if cls < len(model_names) else str(cls)
+    return {"name": name, "conf": float(confs[idx]), "box": res.boxes.xyxy.cpu().numpy()[idx]}
+
+
+def letterbox(img, size=MAX_CROP_SIDE, pad_value=114):
+    """Redimensionne en conservant le ratio dans un carré size x size. Retourne (img, r, (px, py))."""
+    h, w = img.shape[:2]
+    r = size / max(h, w)
+    nw, nh = max(1, round(w * r)), max(1, round(h * r))
+    out = np.full((size, size, 3), pad_value, dtype=np.uint8)
+    px, py = (size - nw) // 2, (size - nh) // 2
+    out[py:py+nh, px:px+nw] = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR) if (nw, nh) != (w, h) else img
+    return out, r, (px, py)
+
+
+def classify_batch(model, imgs, metas, model_names, conf_thr, imgsz=MAX_CROP_SIDE):
+    """
+    Une seule passe du modèle sur un lot d'images letterboxées.
+
+    `metas` contient (r, (px, py)) par image pour ramener les boîtes dans le
+    repère du crop d'origine. Retourne une liste de résultats (ou None).
+    """
+    if model is None or not imgs: return [None] * len(imgs)
+    kwargs = {"conf": conf_thr, "imgsz": imgsz, "verbose": False}
+    if config.use_cuda: kwargs["device"] = 0
+    try: results = model(imgs, **kwargs)
+    except Exception:
+        # Moteurs à batch fixe (TensorRT batch=1) : repli image par image
+        results = []
+        for img in imgs:
+            try: results.append(model(img, **kwargs)[0])
+            except Exception: results.append(None)
+    out = []
+    for res, (r, (px, py)) in zip(results, metas):
+        best = _best_box(res, model_names, conf_thr) if res is not None else None
+        if best: best["box"] = (best["box"] - np.array([px, py, px, py], dtype=np.float32)) / r
+        out.append(best)
+    return out
+
+
+def job_priority(is_target, box_frac, since, horizon=CLASSIFY_MAX_INTERVAL):
+    """
+    Priorité d'un crop (plus grand = plus urgent).
+
+    Cible sélectionnée d'abord, puis grandes boîtes (`box_frac` : surface
+    relative à l'image) et pistes classifiées il y a longtemps (`since` en images).
+    """
+    return (CLASSIFY_TARGET_PRIORITY if is_target else 0.0) + math.sqrt(max(0.0, box_frac)) + min(1.0, since / horizon)
+
+
+class BatchClassifier:
+    """
+    Regroupe les demandes de classification de toutes les pistes.
+
+    Les jobs attendent dans une file de priorité bornée : chaque lot prend
+    les plus prioritaires, les jobs annulés (piste évincée, source arrêtée)
+    sont retirés sans calcul, et quand la file est pleine le job le moins
+    prioritaire est abandonné (son Future est annulé).
+
+    Paramètres
+    ----------
+    get_models : callable
+        Retourne (modelB, modelC) ; None tant qu'un modèle n'est pas prêt.
+    batch_size : int
+        Nombre maximal de crops par passe.
+    max_wait : float
+        Secondes d'attente maximale pour compléter un lot après le premier crop.
+    max_queue : int
+        Nombre maximal de jobs en attente.
+    """
+
+    def __init__(self, get_models, batch_size: int = CLASSIFY_BATCH_SIZE,
+                 max_wait: float = CLASSIFY_MAX_WAIT, imgsz: int = MAX_CROP_SIDE,
+                 max_queue: int = CLASSIFY_QUEUE_SIZE):
+        self.get_models = get_models
+        self.batch_size = max(1, batch_size)
+        self.max_wait   = max_wait
+        self.imgsz      = imgsz
+        self.max_queue  = max(1, max_queue)
+        self._heap      = []        # (-priorité, n°, t_soumission, tid, crop, origin, future)
+        self._seq       = itertools.count()
+        self._cond      = threading.Condition()
+        self.processed  = 0
+        self.shed       = 0         # abandonnés, file pleine
+        self.cancelled  = 0         # annulés avant calcul (piste évincée, source arrêtée)
+        self.wait_avg   = 0.0
+        self.wait_max   = 0.0
+        self._thread    = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, tid, crop_img, crop_origin, priority: float = 0.0) -> Future:
+        fut = Future()
+        with self._cond:
+            if len(self._heap) >= self.max_queue: self._purge()
+            if len(self._heap) >= self.max_queue:
+                # File pleine : on sacrifie le moins prioritaire (le nouveau s'il l'est)
+                worst = max(range(len(self._heap)), key=lambda i: self._heap[i][:2])
+                if -self._heap[worst][0] >= priority:
+                    self.shed += 1
+                    metrics.inc("classify_shed")
+                    fut.cancel()
+                    return fut
+                self._heap[worst][-1].cancel()
+                self._heap[worst] = self._heap[-1]; self._heap.pop()
+                heapq.heapify(self._heap)
+                self.shed += 1
+                metrics.inc("classify_shed")
+            heapq.heappush(self._heap, (-priority, next(self._seq), time.time(), tid, crop_img, crop_origin, fut))
+            metrics.gauge("classify_depth", self.depth())
+            self._cond.notify()
+        return fut
+
+    def depth(self) -> int:
+        """Jobs en attente non annulés (les annulés ne quittent le tas qu'au prochain lot ou purge)."""
+        with self._cond: return sum(not job[-1].cancelled() for job in self._heap)
+
+    def _cancelled(self, n=1):
+        self.cancelled += n
+        metrics.inc("classify_cancelled", n)
+
+    def _purge(self):
+        # Retire les jobs dont le Future a été annulé par la source
+        live = [job for job in self._heap if not job[-1].cancelled()]
+        if len(live) < len(self._heap): self._cancelled(len(self._heap) - len(live))
+        self._heap = live
+        heapq.heapify(self._heap)
+
+    def _collect(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._heap)
+        # Laisse le lot se remplir au plus max_wait, puis prend les plus prioritaires
+        deadline = time.time() + self.max_wait
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._heap) >= self.batch_size, max(0.0, deadline - time.time()))
+            batch = [heapq.heappop(self._heap) for _ in range(min(self.batch_size, len(self._heap)))]
+            metrics.gauge("classify_depth", self.depth())
+        now = time.time()
+        jobs = []
+        for _, _, t, tid, crop, origin, fut in batch:
+            # Les jobs annulés entre-temps (piste évincée, source arrêtée) ne sont pas calculés
+            if not fut.set_running_or_notify_cancel():
+                self._cancelled(); continue
+            wait = now - t
+            metrics.observe("classify_wait", wait)
+            self.wait_avg = 0.9 * self.wait_avg + 0.1 * wait
+            self.wait_max = max(self.wait_max, wait)
+            jobs.append((tid, crop, origin, fut))
+        return jobs
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if not batch: continue
+            try:
+                results = self._run_batch([crop for _, crop, _, _ in batch])
+            except Exception as e:
+                for *_, fut in batch: fut.set_exception(e)
+                continue
+            for (tid, _, _, fut), (resB, resC) in zip(batch, results):
+                fut.set_result({"tid": tid, "resB": resB, "resC": resC})
+            self.processed += len(batch)
+
+    def stats(self) -> dict:
+        return {"depth": self.depth(), "queued": len(self._heap), "max_queue": self.max_queue, "processed": self.processed,
+                "shed": self.shed, "cancelled": self.cancelled,
+                "wait_avg_ms": round(self.wait_avg * 1000, 1), "wait_max_ms": round(self.wait_max * 1000, 1)}
+
+    def _run_batch(self, crops):
+        modelB, modelC = self.get_models()
+        boxed = [letterbox(c, self.imgsz) for c in crops]
+        imgs  = [b[0] for b in boxed]
+        metas = [b[1:] for b in boxed]
+
+        sw = metrics.stopwatch()
+        resB = classify_batch(modelB, imgs, metas, modelB_names, CONF_THRESHOLD_B, self.imgsz)
+        sw.lap("classify_B")
+        passed = [i for i, r in enumerate(resB) if r]
+        resC = [None] * len(crops)
+        for i, r in zip(passed, classify_batch(modelC, [imgs[i] for i in passed], [metas[i] for i in passed],
+                                               modelC_names, CONF_THRESHOLD_C, self.imgsz)):
+            resC[i] = r
+        if passed: sw.lap("classify_C")
+        metrics.inc("classify_crops", len(crops))
+        return list(zip(resB, resC))
@@ -12,12 +12,25 @@ Usage minimal :
 Ou en mode context manager :
     async with JetsonComm("192.168.1.XX") as comm:
         await comm.send_text("Hello")
+
+Images : trame WebSocket binaire = en-tête fixe (FRAME_HEADER, 18 octets)
+suivi des octets bruts de l'image, sans base64 ni JSON :
+
+    "JC"  u8 version  u8 type  u8 format  u8 (réservé)  u32 seq  f64 horodatage (s)
+
+entiers et flottant en big-endian (DataView côté navigateur). Le mode
+binaire est négocié à la connexion : {"role": "jetson", "binary": true},
+le serveur répond {"type": "hello", "binary": true}. Sans réponse (ancien
+serveur) ou si binary=False, les images partent en JSON base64 comme avant.
+Les textes restent en JSON.
 """
 
 import asyncio
 import json
 import base64
 import logging
+import struct
+import time
 from pathlib import Path
 
 import websockets
@@ -25,6 +38,32 @@ from websockets.exceptions import ConnectionClosed, WebSocketException
 
 logger = logging.getLogger("jetson_comm")
 
+FRAME_MAGIC   = b"JC"
+FRAME_VERSION = 1
+FRAME_HEADER  = struct.Struct(">2sBBBxId")
+MSG_IMAGE     = 1
+FORMATS       = {"jpeg": 0, "png": 1, "webp": 2, "bmp": 3}
+FORMAT_NAMES  = {v: k for k, v in FORMATS.items()}
+
+
+def encode_frame(data: bytes, fmt: str = "jpeg", seq: int = 0, ts: float | None = None,
+                 msg_type: int = MSG_IMAGE) -> bytes:
+    """En-tête binaire + octets bruts : le message envoyé tel quel en trame binaire."""
+    header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, msg_type, FORMATS.get(fmt, 0),
+                               seq & 0xFFFFFFFF, time.time() if ts is None else ts)
+    return header + data
+
+
+def decode_frame(frame: bytes) -> dict:
+    """Inverse de encode_frame (tests, outils). Lève ValueError si l'en-tête est invalide."""
+    if len(frame) < FRAME_HEADER.size:
+        raise ValueError("trame trop courte")
+    magic, version, msg_type, fmt, seq, ts = FRAME_HEADER.unpack_from(frame)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError(f"en-tête inconnu : {magic!r} v{version}")
+    return {"type": msg_type, "fmt": FORMAT_NAMES.get(fmt, "jpeg"), "seq": seq, "ts": ts,
+            "data": memoryview(frame)[FRAME_HEADER.size:]}
+
 
 class JetsonComm:
     """
@@ -40,15 +79,28 @@ class JetsonComm:
         Reconnexion automatique si la connexion est perdue (défaut: True)
     reconnect_delay : float
         Secondes d'attente entre deux tentatives (défaut: 3.0)
+    binary : bool
+        Propose les trames binaires pour les images (défaut: True) ; False
+        force le JSON base64.
+    negotiate_timeout : float
+        Attente de la réponse du serveur à la proposition binaire (défaut: 1.0)
     """
 
     def __init__(self, host: str, port: int = 8765,
-                 auto_reconnect: bool = True, reconnect_delay: float = 3.0):
-        self.uri             = f"ws://{host}:{port}"
-        self.auto_reconnect  = auto_reconnect
-        self.reconnect_delay = reconnect_delay
-        self._ws             = None
-        self._connected      = False
+                 auto_reconnect: bool = True, reconnect_delay: float = 3.0,
+                 binary: bool = True, negotiate_timeout: float = 1.0):
+        self.uri               = f"ws://{host}:{port}"
+        self.auto_reconnect    = auto_reconnect
+        self.reconnect_delay   = reconnect_delay
+        self.binary            = binary
+        self.negotiate_timeout = negotiate_timeout
+        self.binary_ok         = False      # négocié avec le serveur
+        self._ws               = None
+        self._connected        = False
+        self._seq              = 0
+        self.images_sent       = 0
+        self.bytes_sent        = 0          # charge utile des messages image
+        self.encode_s          = 0.0        # temps passé à construire les messages image
 
     # ── Propriété ──────────────────────────────────────────────────────────────
 
@@ -57,6 +109,13 @@ class JetsonComm:
         """True si la connexion WebSocket est active."""
         return self._connected and self._ws is not None
 
+    def stats(self) -> dict:
+        """Mode des images, nombre, octets et temps d'encodage cumulés."""
+        n = max(self.images_sent, 1)
+        return {"mode": "binary" if self.binary_ok else "json", "images": self.images_sent,
+                "bytes": self.bytes_sent, "bytes_per_image": round(self.bytes_sent / n),
+                "encode_ms_per_image": round(self.encode_s * 1000 / n, 3)}
+
     # ── Connexion ──────────────────────────────────────────────────────────────
 
     async def connect(self) -> bool:
@@ -66,15 +125,24 @@ class JetsonComm:
         """
         try:
             self._ws = await websockets.connect(self.uri)
-            await self._ws.send(json.dumps({"role": "jetson"}))
+            await self._ws.send(json.dumps({"role": "jetson", "binary": self.binary}))
+            self.binary_ok = self.binary and await self._negotiate()
             self._connected = True
-            logger.info(f"[JetsonComm] Connecté à {self.uri}")
+            logger.info(f"[JetsonComm] Connecté à {self.uri} (images {'binaires' if self.binary_ok else 'JSON'})")
             return True
         except Exception as e:
             self._connected = False
             logger.error(f"[JetsonComm] Échec connexion : {e}")
             return False
 
+    async def _negotiate(self) -> bool:
+        """Attend la réponse « hello » du serveur ; un ancien serveur ne répond pas -> JSON."""
+        try:
+            msg = json.loads(await asyncio.wait_for(self._ws.recv(), self.negotiate_timeout))
+        except (asyncio.TimeoutError, ValueError, TypeError):
+            return False
+        return msg.get("type") == "hello" and bool(msg.get("binary"))
+
     async def disconnect(self):
         """Ferme proprement la connexion."""
         self._connected = False
@@ -117,7 +185,19 @@ class JetsonComm:
             logger.error(f"[JetsonComm] Erreur envoi texte : {e}")
             return False
 
-    async def send_image_bytes(self, data: bytes, fmt: str = "jpeg") -> bool:
+    def encode_image(self, data: bytes, fmt: str = "jpeg", ts: float | None = None):
+        """
+        Message image prêt à envoyer : bytes (trame binaire) si le binaire est
+        négocié, sinon str JSON base64. Incrémente le n° de séquence.
+        """
+        self._seq += 1
+        if self.binary_ok:
+            return encode_frame(data, fmt, self._seq, ts)
+        b64 = base64.b64encode(data).decode("utf-8")
+        return json.dumps({"type": "image", "fmt": fmt, "seq": self._seq,
+                           "ts": time.time() if ts is None else ts, "data": b64})
+
+    async def send_image_bytes(self, data: bytes, fmt: str = "jpeg", ts: float | None = None) -> bool:
         """
         Envoie une image à partir de bytes bruts.
 
@@ -125,6 +205,7 @@ class JetsonComm:
         ----------
         data : bytes  Contenu binaire de l'image.
         fmt  : str    Format de l'image ("jpeg", "png", …).
+        ts   : float  Horodatage de l'image (défaut: maintenant).
 
         Retourne True si envoyé avec succès.
         """
@@ -132,9 +213,12 @@ class JetsonComm:
             logger.error("[JetsonComm] send_image_bytes : non connecté")
             return False
         try:
-            b64 = base64.b64encode(data).decode("utf-8")
-            payload = json.dumps({"type": "image", "fmt": fmt, "data": b64})
+            t0 = time.perf_counter()
+            payload = self.encode_image(data, fmt, ts)
+            self.encode_s += time.perf_counter() - t0
             await self._ws.send(payload)
+            self.images_sent += 1
+            self.bytes_sent += len(payload)
             logger.debug(f"[JetsonComm] Image envoyée ({len(data)} octets, {fmt})")
             return True
         except (ConnectionClosed, WebSocketException) as e:
@@ -8,11 +8,14 @@ Usage :
     python test_comm.py --host 192.168.1.XX
     python test_comm.py --host 192.168.1.XX --test texte
     python test_comm.py --host 192.168.1.XX --test image --img photo.jpg
+    python test_comm.py --host 192.168.1.XX --json          # images en JSON base64 (repli)
+    python test_comm.py --test mesure [--img photo.jpg]     # octets / temps d'encodage, sans serveur
 """
 
 import asyncio
 import argparse
 import logging
+import os
 import time
 import struct
 
@@ -109,6 +112,7 @@ async def test_images_synthetiques(comm: JetsonComm):
         status = "✅" if ok else "❌"
         log.info(f"  {status} Image {couleur} ({len(img_bytes)} octets)")
         await asyncio.sleep(1.0)
+    log.info(f"  Bilan images : {comm.stats()}")
 
 
 async def test_image_fichier(comm: JetsonComm, path: str):
@@ -133,6 +137,35 @@ async def test_rafale(comm: JetsonComm, n: int = 20, delay: float = 0.2):
     log.info(f"  {'✅' if errors == 0 else '⚠️ '} {n - errors}/{n} messages envoyés avec succès")
 
 
+def ws_wire_bytes(n: int) -> int:
+    """Taille sur le fil d'un message client de n octets (en-tête WebSocket + masque compris)."""
+    return n + 2 + (2 if n >= 126 else 0) + (6 if n >= 65536 else 0) + 4
+
+
+def test_mesure(img_path: str = None, repeat: int = 200):
+    """Test 7 : octets sur le fil et temps d'encodage, binaire vs JSON base64 (sans serveur)."""
+    log.info(f"══ TEST 7 : Binaire vs JSON ({repeat} envois par image) ══")
+    images = {"png 320x200": make_test_image("bleu"),
+              "png 1280x720": make_test_image("vert", 1280, 720),
+              "jpeg ~60 ko (aléatoire)": os.urandom(60_000),
+              "jpeg ~250 ko (aléatoire)": os.urandom(250_000)}
+    if img_path:
+        with open(img_path, "rb") as f: images[os.path.basename(img_path)] = f.read()
+    for label, data in images.items():
+        res = {}
+        for mode in ("json", "binary"):
+            comm = JetsonComm("localhost")
+            comm.binary_ok = mode == "binary"
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                payload = comm.encode_image(data, "png" if label.startswith("png") else "jpeg")
+                if isinstance(payload, str): payload = payload.encode()   # websockets encode le texte en UTF-8
+            res[mode] = (ws_wire_bytes(len(payload)), (time.perf_counter() - t0) / repeat * 1000)
+        (jb, jt), (bb, bt) = res["json"], res["binary"]
+        log.info(f"  {label:<26} JSON {jb:>8} o {jt:7.3f} ms | binaire {bb:>8} o {bt:7.3f} ms"
+                 f" | -{100 * (1 - bb / jb):.0f}% octets, x{jt / max(bt, 1e-9):.0f} encodage")
+
+
 async def test_deconnexion_reconnexion(host: str, port: int):
     """Test 6 : déconnexion et reconnexion automatique."""
     log.info("══ TEST 6 : Déconnexion / reconnexion ══")
@@ -149,35 +182,38 @@ async def test_deconnexion_reconnexion(host: str, port: int):
 
 # ── Point d'entrée ────────────────────────────────────────────────────────────
 
-async def main(host: str, port: int, test: str, img_path: str):
+async def main(host: str, port: int, test: str, img_path: str, binary: bool = True):
+    if test == "mesure":
+        test_mesure(img_path)
+        return
     log.info(f"Serveur cible : ws://{host}:{port}")
     log.info("─" * 50)
 
     if test == "connexion":
-        comm = JetsonComm(host, port)
+        comm = JetsonComm(host, port, binary=binary)
         await test_connexion(comm)
         await comm.disconnect()
 
     elif test == "texte":
-        async with JetsonComm(host, port) as comm:
+        async with JetsonComm(host, port, binary=binary) as comm:
             await test_textes(comm)
 
     elif test == "image":
-        async with JetsonComm(host, port) as comm:
+        async with JetsonComm(host, port, binary=binary) as comm:
             if img_path:
                 await test_image_fichier(comm, img_path)
             else:
                 await test_images_synthetiques(comm)
 
     elif test == "rafale":
-        async with JetsonComm(host, port) as comm:
+        async with JetsonComm(host, port, binary=binary) as comm:
             await test_rafale(comm)
 
     elif test == "reconnexion":
         await test_deconnexion_reconnexion(host, port)
 
     elif test == "tout":
-        async with JetsonComm(host, port) as comm:
+        async with JetsonComm(host, port, binary=binary) as comm:
             if not comm.connected:
                 log.error("Connexion impossible, abandon.")
                 return
@@ -203,11 +239,13 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, default=8765,
                         help="Port WebSocket (défaut: 8765)")
     parser.add_argument("--test",
-                        choices=["connexion", "texte", "image", "rafale", "reconnexion", "tout"],
+                        choices=["connexion", "texte", "image", "rafale", "reconnexion", "mesure", "tout"],
                         default="tout",
                         help="Scénario à lancer (défaut: tout)")
     parser.add_argument("--img", default=None,
                         help="Chemin d'un fichier image pour le test 'image'")
+    parser.add_argument("--json", action="store_true",
+                        help="Images en JSON base64 au lieu des trames binaires")
     args = parser.parse_args()
 
-    asyncio.run(main(args.host, args.port, args.test, args.img))
\ No newline at end of file
+    asyncio.run(main(args.host, args.port, args.test, args.img, binary=not args.json))
\ No newline at end of file
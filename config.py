@@ -1,4 +1,3 @@
-from concurrent.futures import ThreadPoolExecutor
 from collections import defaultdict, deque, Counter
 
 import threading
@@ -15,22 +14,73 @@ ENGINE_A_PATH = "engineA.engine"
 ENGINE_B_PATH = "engineB.engine"
 ENGINE_C_PATH = "engineC.engine"
 
+# Backends comparés au premier démarrage (décision mise en cache à côté des poids)
+MODEL_BACKENDS = ("engine", "onnx", "openvino", "pt")
+BACKEND_INT8 = False                # Candidats ONNX/OpenVINO quantifiés int8 en plus
+BACKEND_INT8_DATA = "coco8.yaml"    # Jeu de calibration pour l'int8 OpenVINO
+BACKEND_BENCH_RUNS = 10             # Inférences chronométrées par candidat
+
 CONF_THRESHOLD_A = 0.30
 CONF_THRESHOLD_B = 0.30
 CONF_THRESHOLD_C = 0.35
 
-CLASSIFY_INTERVAL = 5
+CLASSIFY_INTERVAL = 5       # Intervalle de base entre deux classifications d'une piste (images)
+CLASSIFY_MAX_INTERVAL = 150 # Intervalle max une fois la classe confirmée et stable
+CLASSIFY_SIZE_CHANGE = 0.3  # Variation relative de hauteur de boîte qui relance la classification
+CLASSIFY_HASH_CHANGE = 12   # Distance dHash (bits sur 64) qui relance la classification
+CLASSIFY_CACHE_SIZE = 256   # Empreintes d'apparence gardées en cache (LRU)
+CLASSIFY_CACHE_DIST = 3     # Distance dHash max pour réutiliser un résultat en cache
 MAX_CROP_SIDE = 640
 CLASS_VOTE_WINDOW = 5
 VOTE_MIN_CONFIRM = 3
-MAX_THREAD_WORKERS = 2
+CLASSIFY_BATCH_SIZE = 16   # Crops max par passe B/C
+CLASSIFY_MAX_WAIT = 0.02   # Attente max (s) pour compléter un lot
+CLASSIFY_QUEUE_SIZE = 64   # Jobs en attente max (au-delà : le moins prioritaire est abandonné)
+CLASSIFY_TARGET_PRIORITY = 10.0  # Bonus de priorité des crops de la cible sélectionnée
 PROC_MAX_WIDTH = 640
+FRAME_RING_SLOTS = 8         # Slots de l'anneau d'images partagé par source (framering.py)
+FRAME_RING_RESERVE = 3       # Slots gardés libres pour la capture : au-delà, les crops sont copiés
+TILING = False              # Tuiles natives dans la bande d'horizon en plus de l'image réduite
+TILE_SIZE = 640             # Largeur d'une tuile (pixels natifs)
+TILE_OVERLAP = 0.25         # Chevauchement horizontal entre tuiles
+TILE_BAND_HEIGHT = 320      # Hauteur de la bande autour de l'horizon détecté (pixels natifs)
+TILE_BAND = None            # Bande fixe (haut, bas) en fraction de hauteur, ex. (0.35, 0.55)
+TILE_NMS_IOU = 0.5          # Fusion des détections tuiles / image réduite
+STREAM_URL_TTL = 3600       # Durée de validité supposée d'une URL de flux sans paramètre `expire` (s)
+STREAM_URL_MARGIN = 120     # Marge avant expiration : URL plus servie par le cache, capture rouverte (s)
+CAPTURE_REOPEN_FAILURES = 20  # Lectures ratées consécutives avant de rouvrir un flux réouvrable
+CAPTURE_TARGET_FPS = 0         # Decode-skip : images converties par seconde au plus (0 = toutes)
+CAPTURE_HW_DECODE = False      # Décodage matériel FFmpeg (VIDEO_ACCELERATION_ANY) si disponible
+CAPTURE_BACKEND = "auto"       # "auto", "ffmpeg" ou "gstreamer"
+CAPTURE_DECODE_WIDTH = 0       # Largeur de décodage demandée (caméra / GStreamer), 0 = native
+SOURCE_WARM_TIMEOUT = 15.0     # Remplacement à chaud : attente max de la première image de la nouvelle source (s)
+SOURCE_DRAIN_TIMEOUT = 2.0     # Arrêt : attente max des classifications déjà en calcul (s)
+SOURCE_MAX_ERRORS = 50         # Images en échec consécutives avant l'arrêt de la source
 JPEG_QUALITY = 75
+JPEG_ENCODER = "auto"       # "auto" (libjpeg-turbo si installé), "turbo" ou "opencv"
+TELEMETRY_MAX_HZ = 10       # Messages 'update' max par seconde et par client (sauf overlay client)
+TELEMETRY_KEYFRAME_S = 5.0  # Période d'envoi de l'état complet des pistes
+RECORD_DIR = "recordings"   # Sessions enregistrées (.vrec, voir recording.py)
+METRICS_ENABLED = True      # Chronométrage des étapes (/metrics)
+METRICS_WINDOW = 1024       # Mesures gardées par étape pour les quantiles p50/p95/p99
 REAL_BOAT_HEIGHT = 3.0
+FOCAL_PX = 800              # Focale (pixels) du modèle de distance hauteur réelle / hauteur de boîte
+CAMERA_HFOV_DEG = 150       # Champ horizontal : gisement = facteur d'azimut x HFOV / 2
+KIN_ACCEL_SIGMA = 0.5       # Kalman : accélération non modélisée (m/s²)
+KIN_BOX_SIGMA_PX = 1.5      # Kalman : erreur sur la hauteur de boîte (pixels) -> erreur de distance
+KIN_BEARING_SIGMA_DEG = 0.3 # Kalman : erreur de gisement (degrés)
+KIN_INIT_SPEED_SIGMA = 5.0  # Kalman : incertitude de vitesse d'une nouvelle piste (m/s)
+KIN_MAX_DT = 2.0            # Kalman : pas de prédiction max (s) après une longue absence
 TRACK_BUFFER = 30
 MAX_TRACK_AGE = 30
+DETECT_STRIDE = 1    # modelA une image sur K, boîtes propagées entre deux (1 = toutes)
+TRACKER_CFG = "botsort.yaml"  # Tracker Ultralytics instancié par source (ou "bytetrack.yaml")
 
 # === OPTIONS D'AFFICHAGE (Ce qui est dessiné SUR la vidéo) ===
+# "server" : overlays incrustés dans le flux JPEG
+# "client" : flux brut, boîtes envoyées dans 'update' et dessinées par le navigateur
+OVERLAY_MODE = "server"
+
 overlay_options = {
     "ID": False, 
     "Classe": True, 
@@ -70,32 +120,18 @@ ANALOGY_MAP = {i: v for i, v in enumerate([
 ])}
 
 
-modelA = None; modelB = None; modelC = None
-
-executor = ThreadPoolExecutor(max_workers=MAX_THREAD_WORKERS)
-pending_futures = {}
-track_state = {}
 modelA_names = ['Autre', 'Bateau']
 modelB_names = ['Commerce', 'Militaire', 'Loisir']
 modelC_names = ['Autre', 'Fregate', 'Patrouilleur', 'Porte-avion', 'Ravitailleur', 'Sous-marin', 'Porte-conteneur', 'Bateau de peche', 'Petrolier', 'Navire de croisiere', 'Ferry', 'Voilier', 'Bateau a moteur', 'Petit bateau']
 
-# Global State
-target_id = None
-history = defaultdict(lambda: deque(maxlen=TRACK_BUFFER))
-info = {}
-dist_f = {}
-ages = {}
-active = set()
-box_locations = {} # Stockage des coordonnées normalisées pour le clic
-cap = None
-current_frame = None
-frame_lock = threading.Lock()
-running = False
-
 # Models
-use_cuda = False
-try:
-    import torch
-    use_cuda = torch.cuda.is_available()
-except Exception: pass
-print(f"[INFO] CUDA: {use_cuda}")
\ No newline at end of file
+use_cuda = False   # Renseigné par detect_cuda() (import de torch différé au chargement des modèles)
+
+def detect_cuda():
+    global use_cuda
+    try:
+        import torch
+        use_cuda = torch.cuda.is_available()
+    except Exception: pass
+    print(f"[INFO] CUDA: {use_cuda}")
+    return use_cuda
@@ -0,0 +1,149 @@
+"""
+detections.py — Filtrage des détections par analogie de classes.
+
+Quand deux boîtes se recouvrent (IoU >= seuil) et que l'une porte une classe
+ancêtre de l'autre (ex. "Bateau" -> "Militaire" -> "Fregate"), on garde la
+plus spécifique. Les relations d'ANALOGY_MAP sont précalculées en une matrice
+booléenne indexée par id de classe, l'IoU est calculée pour toutes les paires
+d'un coup en NumPy. En dessous de SCALAR_MAX boîtes, une boucle Python qui
+ne calcule l'IoU que des paires apparentées revient moins cher que les
+matrices n x n.
+
+La classe est lue en d[5]. Dans pipeline.py les lignes sont
+[x1, y1, x2, y2, nomA, conf, cls, tid] : d[5] y est la confiance, qui ne
+correspond à aucune classe d'ANALOGY_MAP (sauf 0.0 ou 1.0 exacts), et le
+filtre rend alors la liste telle quelle sans calculer d'IoU.
+"""
+
+import numpy as np
+
+from config import ANALOGY_MAP
+
+
+def compute_ancestors_map(m):
+    anc = {k: set() for k in m}
+    for k in m:
+        stack = list(m[k])
+        while stack:
+            p = stack.pop()
+            if p not in anc[k]:
+                anc[k].add(p)
+                stack.extend(m.get(p, []))
+    return anc
+
+
+def compute_ancestor_matrix(anc):
+    """
+    M[p, k] = True si p est un ancêtre de k.
+
+    Une ligne/colonne supplémentaire (toujours False) sert aux classes
+    inconnues, indexées par -1.
+    """
+    n = max(anc) + 1 if anc else 0
+    mat = np.zeros((n + 1, n + 1), dtype=bool)
+    for k, parents in anc.items():
+        for p in parents: mat[p, k] = True
+    return mat
+
+
+ANCESTORS = compute_ancestors_map(ANALOGY_MAP)
+ANCESTOR_MATRIX = compute_ancestor_matrix(ANCESTORS)
+
+SCALAR_MAX = 24     # Nombre de boîtes jusqu'auquel la boucle Python est plus rapide
+
+
+# === UTIL ===
+def iou(a, b):
+    x1 = max(a[0], b[0]); y1 = max(a[1], b[1])
+    x2 = min(a[2], b[2]); y2 = min(a[3], b[3])
+    inter = max(0, x2-x1) * max(0, y2-y1)
+    area_a = max(1, a[2]-a[0]) * max(1, a[3]-a[1])
+    area_b = max(1, b[2]-b[0]) * max(1, b[3]-b[1])
+    return inter / (area_a + area_b - inter) if (area_a + area_b - inter) > 0 else 0
+
+
+def iou_matrix(boxes):
+    """IoU de toutes les paires d'un tableau (n, 4) x1y1x2y2, même formule que iou()."""
+    b = np.asarray(boxes)
+    if b.dtype.kind != "f": b = b.astype(np.float64)
+    x1 = np.maximum(b[:, None, 0], b[None, :, 0]); y1 = np.maximum(b[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(b[:, None, 2], b[None, :, 2]); y2 = np.minimum(b[:, None, 3], b[None, :, 3])
+    inter = np.maximum(0, x2-x1) * np.maximum(0, y2-y1)
+    area = np.maximum(1, b[:, 2]-b[:, 0]) * np.maximum(1, b[:, 3]-b[:, 1])
+    union = area[:, None] + area[None, :] - inter
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(union > 0, inter / np.where(union > 0, union, 1), 0)
+
+
+def _class_index(cids):
+    # Même sémantique que ANCESTORS.get(c) : une classe absente n'a aucune relation
+    return np.array([int(c) if c in ANCESTORS else -1 for c in cids], dtype=np.intp)
+
+
+def filter_detections_by_analogy(dets, thresh=0.5):
+    """
+    Supprime les boîtes génériques recouvertes par une boîte plus spécifique.
+
+    `dets` : liste de détections dont d[:4] est la boîte et d[5] l'id de classe
+    (voir la note du module sur les lignes de pipeline.py).
+    Résultat identique à filter_detections_by_analogy_ref (même ordre de
+    parcours des paires), seules les lignes ayant une relation sont visitées.
+    """
+    if not dets: return dets
+    n = len(dets)
+    if n <= SCALAR_MAX: return _filter_scalar(dets, thresh)
+    ci = _class_index([d[5] for d in dets])
+    if (ci < 0).all(): return list(dets)
+    anc = ANCESTOR_MATRIX[ci[:, None], ci[None, :]]     # ci ancêtre de cj
+    if not np.triu(anc | anc.T, 1).any(): return list(dets)
+    overlap = iou_matrix([d[:4] for d in dets]) >= thresh
+    drop_i = anc & overlap       # ci ancêtre de cj -> i supprimé
+    drop_j = anc.T & overlap     # cj ancêtre de ci -> j supprimé
+    related = np.triu(drop_i | drop_j, 1)
+
+    keep = np.ones(n, dtype=bool)
+    for i in np.flatnonzero(related.any(axis=1)):
+        if not keep[i]: continue
+        js = np.flatnonzero(related[i, i+1:] & keep[i+1:]) + i + 1
+        if not js.size: continue
+        hit = drop_i[i, js]
+        if hit.any():
+            first = int(np.argmax(hit))
+            keep[js[:first]] = False
+            keep[i] = False
+        else:
+            keep[js] = False
+    return [d for d, k in zip(dets, keep) if k]
+
+
+def _filter_scalar(dets, thresh):
+    # Même parcours que la référence, relation de classes testée avant l'IoU
+    cids = [d[5] for d in dets]
+    if not any(c in ANCESTORS for c in cids): return list(dets)
+    n = len(dets)
+    keep = [True] * n
+    for i in range(n):
+        anc_i = ANCESTORS.get(cids[i], ())
+        for j in range(i+1, n):
+            if not keep[i]: break
+            if not keep[j]: continue
+            a = cids[i] in ANCESTORS.get(cids[j], ())
+            if not a and cids[j] not in anc_i: continue
+            if iou(dets[i][:4], dets[j][:4]) < thresh: continue
+            if a: keep[i] = False
+            else: keep[j] = False
+    return [d for d, k in zip(dets, keep) if k]
+
+
+def filter_detections_by_analogy_ref(dets, thresh=0.5):
+    """Version de référence (double boucle Python), conservée pour les benchmarks."""
+    if not dets: return dets
+    items = [{"box": d[:4], "cid": d[5], "keep": True, "orig": d} for d in dets]
+    for i in range(len(items)):
+        for j in range(i+1, len(items)):
+            if not items[i]["keep"] or not items[j]["keep"]: continue
+            if iou(items[i]["box"], items[j]["box"]) < thresh: continue
+            ci, cj = items[i]["cid"], items[j]["cid"]
+            if ci in ANCESTORS.get(cj, set()): items[i]["keep"] = False
+            elif cj in ANCESTORS.get(ci, set()): items[j]["keep"] = False
+    return [it["orig"] for it in items if it["keep"]]
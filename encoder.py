@@ -0,0 +1,136 @@
+"""
+encoder.py — Étage d'encodage JPEG hors de la boucle de traitement.
+
+Le worker dépose l'image annotée dans un slot unique puis passe directement à
+l'image suivante ; un thread dédié encode la dernière image déposée (les
+images non encodées à temps sont remplacées, jamais mises en file). Le
+thread est natif (voir native.py) : l'encodage chevauche l'inférence de
+l'image suivante sans passer par eventlet.tpool.
+libjpeg-turbo (PyTurboJPEG) est utilisé s'il est installé, sinon OpenCV.
+"""
+
+import cv2
+
+import metrics
+from native import threading, time
+
+from config import JPEG_QUALITY, JPEG_ENCODER
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+except ImportError:
+    TurboJPEG = None
+
+
+class JpegEncoder:
+    """
+    Encodeur JPEG (handle libjpeg-turbo créé une fois par étage).
+
+    Paramètres
+    ----------
+    quality : int
+        Qualité JPEG 0-100.
+    backend : str
+        "auto" (turbo si disponible), "turbo" ou "opencv".
+    """
+
+    def __init__(self, quality: int = JPEG_QUALITY, backend: str = JPEG_ENCODER):
+        self.quality = quality
+        self._turbo  = None
+        if backend in ("auto", "turbo") and TurboJPEG is not None:
+            # Handle libjpeg-turbo créé une fois et réutilisé pour chaque image
+            try: self._turbo = TurboJPEG()
+            except Exception: self._turbo = None
+        self.backend = "turbo" if self._turbo else "opencv"
+        self._params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+
+    def encode(self, frame):
+        """
+        Retourne le JPEG (bytes, ou vue sur le tableau NumPy d'OpenCV) ou None.
+
+        Chaque appel produit un nouveau buffer : cv2.imencode n'écrit pas dans
+        un tableau fourni, et le JPEG doit rester intact tant qu'un client lent
+        de /video_feed l'envoie encore.
+        """
+        if self._turbo:
+            return self._turbo.encode(frame, quality=self.quality, pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+        ok, buf = cv2.imencode('.jpg', frame, self._params)
+        return buf.data if ok else None
+
+
+class EncodeStage:
+    """
+    Thread d'encodage avec slot « dernière image ».
+
+    Paramètres
+    ----------
+    on_encoded : callable
+        Appelé avec le JPEG de chaque image encodée (ex. broadcaster.publish).
+    name : str
+        Nom de la source pour les métriques.
+    """
+
+    def __init__(self, on_encoded, quality: int = JPEG_QUALITY, backend: str = JPEG_ENCODER, name: str = ""):
+        self.encoder    = JpegEncoder(quality, backend)
+        self.name       = name
+        self.on_encoded = on_encoded
+        self._cond      = threading.Condition()
+        self._pending   = None
+        self._running   = True
+        self.encoded    = 0
+        self.dropped    = 0
+        self.last_ms    = 0.0
+        self.avg_ms     = 0.0
+        self._thread    = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, release=None):
+        """
+        Dépose une image à encoder (remplace celle en attente s'il y en a une).
+
+        `release` est appelé quand l'image n'est plus utilisée (encodée ou
+        remplacée) : l'image peut être une vue d'un slot de l'anneau de capture.
+        """
+        with self._cond:
+            if not self._running:
+                if release: release()
+                return
+            if self._pending is not None:
+                self.dropped += 1
+                metrics.inc("encode_dropped", source=self.name)
+                if self._pending[1]: self._pending[1]()
+            self._pending = (frame, release)
+            self._cond.notify()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or not self._running)
+                if not self._running: return
+                (frame, release), self._pending = self._pending, None
+            t0 = time.perf_counter()
+            try: jpeg = self.encoder.encode(frame)
+            except Exception: jpeg = None
+            finally:
+                if release: release()
+            if jpeg is None: continue
+            self.last_ms = (time.perf_counter() - t0) * 1000
+            metrics.observe("encode", self.last_ms / 1000, self.name)
+            self.avg_ms = self.last_ms if not self.encoded else 0.9 * self.avg_ms + 0.1 * self.last_ms
+            self.encoded += 1
+            t0 = time.perf_counter()
+            self.on_encoded(jpeg)
+            metrics.observe("publish", time.perf_counter() - t0, self.name)
+
+    def stop(self, timeout: float = 1.0):
+        """Arrête le thread ; l'image en attente est abandonnée et son slot rendu."""
+        with self._cond:
+            self._running = False
+            pending, self._pending = self._pending, None
+            self._cond.notify_all()
+        if pending and pending[1]: pending[1]()
+        if self._thread is not threading.current_thread(): self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {"backend": self.encoder.backend, "encoded": self.encoded, "dropped": self.dropped,
+                "last_ms": round(self.last_ms, 2), "avg_ms": round(self.avg_ms, 2)}
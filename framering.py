@@ -0,0 +1,241 @@
+"""
+framering.py — Anneau d'images en mémoire partagée.
+
+N slots de taille fixe dans un bloc multiprocessing.shared_memory, chacun
+décrit par un en-tête (n° de séquence, horodatage, forme, références). Le
+grabber décode directement dans un slot libre (cap.read(vue)) ; les étages
+suivants se passent le slot (SlotRef) et travaillent sur des vues : pas de
+copie de l'image entre capture, détection, dessin, encodage et crops de
+classification. Un slot référencé n'est jamais réécrit ; il redevient
+libre quand tous ses utilisateurs l'ont relâché.
+
+Le bloc de contrôle porte le curseur d'écriture (dernier n° publié, slot
+correspondant) et un curseur par lecteur : un autre processus peut ouvrir
+l'anneau par son nom (FrameRing.attach) et lire la dernière image sans
+qu'aucun tableau ne soit sérialisé. Il faut alors un verrou inter-processus
+(multiprocessing.Lock) ; par défaut le verrou est un verrou de thread natif.
+
+Usage :
+    ring = FrameRing((720, 1280, 3), slots=8)
+    i = ring.acquire()                    # slot libre pour l'écriture
+    ok, frame = cap.read(ring.buffer(i))  # décodage sur place
+    ring.publish(i, time.time(), frame.shape)
+    seq, ts, i = ring.read_latest(reader=0)   # slot référencé pour le lecteur
+    ...ring.view(i)...
+    ring.release(i)
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from config import FRAME_RING_SLOTS
+from native import threading
+
+MAX_READERS = 4
+_ALIGN = 64
+
+CTRL_DTYPE = np.dtype([
+    ("slots",     "<u4"), ("slot_bytes", "<u8"),
+    ("h",         "<u4"), ("w", "<u4"), ("c", "<u4"),   # forme maximale d'un slot
+    ("write_seq", "<u8"),                               # dernier n° publié
+    ("latest",    "<i4"),                               # slot de la dernière image (-1 : aucune)
+    ("read_seq",  "<u8", (MAX_READERS,)),               # dernier n° lu par chaque lecteur
+])
+
+SLOT_DTYPE = np.dtype([
+    ("seq",  "<u8"),
+    ("ts",   "<f8"),
+    ("h",    "<u4"), ("w", "<u4"), ("c", "<u4"),
+    ("pins", "<i4"),    # références en cours (écriture comprise)
+])
+
+
+def _aligned(n):
+    return -(-n // _ALIGN) * _ALIGN
+
+
+class _SharedMemory(shared_memory.SharedMemory):
+    def __del__(self):
+        # Images encore utilisées : le bloc sera démappé avec la dernière
+        try: self.close()
+        except BufferError: pass
+
+
+class SlotRef:
+    """Référence à un slot de l'anneau, transmise entre étages à la place de l'image."""
+
+    __slots__ = ("ring", "index")
+
+    def __init__(self, ring, index):
+        self.ring  = ring
+        self.index = index
+
+    def view(self):
+        return self.ring.view(self.index)
+
+    def pin(self, reserve=0):
+        return self.ring.pin(self.index, reserve)
+
+    def release(self, *_):
+        # *_ : utilisable directement comme callback (Future.add_done_callback)
+        self.ring.release(self.index)
+
+
+class FrameRing:
+    """
+    Anneau de `slots` images de forme maximale `shape` (h, w, c) uint8.
+
+    Paramètres
+    ----------
+    shape : tuple
+        Forme maximale d'une image ; une image plus petite occupe le début du slot.
+    slots : int
+        Nombre de slots.
+    name : str, optionnel
+        Nom du bloc partagé (généré si absent).
+    create : bool
+        False pour ouvrir un bloc existant (voir attach()).
+    lock : verrou, optionnel
+        Verrou des en-têtes ; multiprocessing.Lock si l'anneau est partagé entre processus.
+    seq : int
+        Dernier n° déjà publié (un anneau qui en remplace un autre continue sa numérotation).
+    """
+
+    def __init__(self, shape, slots: int = FRAME_RING_SLOTS, name=None, create: bool = True, lock=None, seq: int = 0):
+        h, w, c = (*shape, 1)[:3] if len(shape) == 2 else shape
+        slot_bytes = _aligned(h * w * c)
+        head = _aligned(CTRL_DTYPE.itemsize)
+        data = _aligned(head + slots * SLOT_DTYPE.itemsize)
+        self.shm   = _SharedMemory(name=name, create=create, size=data + slots * slot_bytes if create else 0)
+        # frombuffer garde un export du bloc : tant qu'une image (ou un crop) de
+        # l'anneau existe, shm.close() ne peut pas démapper la mémoire sous elle
+        raw = np.frombuffer(self.shm.buf, np.uint8)
+        self.ctrl  = raw[:CTRL_DTYPE.itemsize].view(CTRL_DTYPE).reshape(())
+        self.heads = raw[head:head + slots * SLOT_DTYPE.itemsize].view(SLOT_DTYPE)
+        self.data  = raw[data:data + slots * slot_bytes].reshape(slots, slot_bytes)
+        self.lock  = lock or threading.Lock()
+        self.owner = create
+        self.shape = (h, w, c)
+        self.slot_bytes = slot_bytes
+        self.full  = 0       # acquire() sans slot libre
+        self._next = 0
+        if create:
+            self.ctrl["slots"], self.ctrl["slot_bytes"] = slots, slot_bytes
+            self.ctrl["h"], self.ctrl["w"], self.ctrl["c"] = h, w, c
+            self.ctrl["write_seq"], self.ctrl["latest"], self.ctrl["read_seq"] = seq, -1, 0
+            self.heads[:] = 0
+
+    @classmethod
+    def attach(cls, name, lock=None):
+        """Ouvre un anneau créé par un autre processus."""
+        shm = shared_memory.SharedMemory(name=name)
+        ctrl = np.frombuffer(shm.buf, CTRL_DTYPE, count=1)[0].copy()
+        shm.close()
+        return cls((int(ctrl["h"]), int(ctrl["w"]), int(ctrl["c"])), int(ctrl["slots"]), name, create=False, lock=lock)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def slots(self):
+        return len(self.heads)
+
+    def fits(self, shape):
+        return int(np.prod(shape)) <= self.slot_bytes
+
+    # ── Écriture ───────────────────────────────────────────────────────────────
+
+    def acquire(self):
+        """Slot libre pour l'écriture (ni référencé ni dernière image publiée), ou -1."""
+        with self.lock:
+            latest = int(self.ctrl["latest"])
+            for k in range(self.slots):
+                i = (self._next + k) % self.slots
+                if i != latest and self.heads[i]["pins"] == 0:
+                    self.heads[i]["pins"] = 1
+                    self._next = i + 1
+                    return i
+            self.full += 1
+            return -1
+
+    def buffer(self, i, shape=None):
+        """Vue contiguë (h, w, c) du slot i, à la forme maximale par défaut."""
+        shape = shape or self.shape
+        return self.data[i, :int(np.prod(shape))].reshape(shape)
+
+    def publish(self, i, ts, shape):
+        """Termine l'écriture du slot i : il devient la dernière image. Retourne son n°."""
+        with self.lock:
+            seq = int(self.ctrl["write_seq"]) + 1
+            hd = self.heads[i]
+            hd["seq"], hd["ts"] = seq, ts
+            hd["h"], hd["w"], hd["c"] = (*shape, 1)[:3] if len(shape) == 2 else shape
+            hd["pins"] -= 1
+            self.ctrl["write_seq"], self.ctrl["latest"] = seq, i
+            return seq
+
+    def abort(self, i):
+        """Abandonne l'écriture du slot i (lecture ratée)."""
+        self.release(i)
+
+    # ── Lecture ────────────────────────────────────────────────────────────────
+
+    def read_latest(self, reader=0, last_seq=0):
+        """
+        Référence la dernière image si elle est plus récente que `last_seq`.
+
+        Retourne (seq, ts, slot) ou None ; le slot doit être relâché
+        (release) par le lecteur. Le curseur du lecteur avance.
+        """
+        with self.lock:
+            i, seq = int(self.ctrl["latest"]), int(self.ctrl["write_seq"])
+            if i < 0 or seq <= last_seq: return None
+            self.heads[i]["pins"] += 1
+            self.ctrl["read_seq"][reader] = seq
+            return seq, float(self.heads[i]["ts"]), i
+
+    def view(self, i):
+        """Image du slot i à sa forme publiée (vue, pas de copie)."""
+        hd = self.heads[i]
+        return self.buffer(i, (int(hd["h"]), int(hd["w"]), int(hd["c"])))
+
+    def pin(self, i, reserve: int = 0):
+        """
+        Référence supplémentaire sur le slot i (étage aval, crop en file).
+
+        Refusée (False) s'il resterait moins de `reserve` slots libres pour
+        l'écriture : l'appelant copie alors ce dont il a besoin.
+        """
+        with self.lock:
+            if self.heads is None or self.heads[i]["pins"] <= 0: return False   # déjà rendu : contenu non garanti
+            if reserve:
+                free = self.heads["pins"] == 0
+                latest = int(self.ctrl["latest"])
+                if latest >= 0: free[latest] = False
+                if int(free.sum()) < reserve: return False
+            self.heads[i]["pins"] += 1
+            return True
+
+    def release(self, i):
+        with self.lock:
+            if self.heads is not None and self.heads[i]["pins"] > 0: self.heads[i]["pins"] -= 1
+
+    # ── Divers ─────────────────────────────────────────────────────────────────
+
+    def stats(self) -> dict:
+        pins = self.heads["pins"]
+        seq = int(self.ctrl["write_seq"])
+        return {"slots": self.slots, "slot_mb": round(self.slot_bytes / 2**20, 2), "name": self.name,
+                "free": int((pins == 0).sum()), "pinned": int((pins > 0).sum()), "full": self.full,
+                "write_seq": seq, "reader_lag": [seq - int(r) for r in self.ctrl["read_seq"] if r]}
+
+    def close(self):
+        """Détache le bloc (et le supprime si cet anneau l'a créé)."""
+        with self.lock: self.ctrl = self.heads = self.data = None
+        try: self.shm.close()
+        except BufferError: pass     # vues encore utilisées : libéré avec elles
+        if self.owner:
+            try: self.shm.unlink()
+            except FileNotFoundError: pass
@@ -0,0 +1,129 @@
+"""
+kinematics.py — Cinématique des pistes par filtre de Kalman vectorisé.
+
+Chaque piste a un état vitesse constante (x, y, vx, vy) en mètres dans le
+repère « vue de dessus » de la caméra (y vers l'avant, x vers la droite).
+La mesure vient de la boîte : distance par le modèle de hauteur de bateau
+(boat_heights x focale / hauteur en pixels) et gisement par la position
+horizontale dans le champ de la caméra. Toutes les pistes vues dans l'image
+sont prédites et mises à jour en une seule passe NumPy.
+
+Le bruit de mesure suit la géométrie : l'erreur de distance est
+proportionnelle à distance / hauteur de boîte (quelques pixels d'erreur sur
+la hauteur), l'erreur de gisement est angulaire ; la covariance polaire est
+convertie en cartésien pour chaque piste.
+"""
+
+import numpy as np
+
+from config import KIN_ACCEL_SIGMA, KIN_BOX_SIGMA_PX, KIN_BEARING_SIGMA_DEG, KIN_INIT_SPEED_SIGMA, KIN_MAX_DT
+
+MS_TO_KNOTS = 1.94384
+
+
+class KinematicsFilter:
+    """
+    États de Kalman indexés par slot de TrackStore.
+
+    Paramètres
+    ----------
+    accel_sigma : float
+        Écart-type de l'accélération non modélisée (m/s²), bruit de processus.
+    box_sigma_px : float
+        Erreur typique sur la hauteur de boîte (pixels) -> erreur relative de distance.
+    bearing_sigma_deg : float
+        Erreur de gisement (degrés).
+    """
+
+    def __init__(self, capacity: int = 64, accel_sigma: float = KIN_ACCEL_SIGMA,
+                 box_sigma_px: float = KIN_BOX_SIGMA_PX, bearing_sigma_deg: float = KIN_BEARING_SIGMA_DEG,
+                 init_speed_sigma: float = KIN_INIT_SPEED_SIGMA, max_dt: float = KIN_MAX_DT):
+        self.q          = accel_sigma ** 2
+        self.box_sigma  = box_sigma_px
+        self.bearing_sd = np.radians(bearing_sigma_deg)
+        self.v0_var     = init_speed_sigma ** 2
+        self.max_dt     = max_dt
+        self.capacity   = 0
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        old = self.capacity
+        x, P, t = np.zeros((capacity, 4)), np.zeros((capacity, 4, 4)), np.full(capacity, np.nan)
+        if old: x[:old], P[:old], t[:old] = self.x, self.P, self.t
+        self.x, self.P, self.t, self.capacity = x, P, t, capacity
+
+    def reset(self, s):
+        """Nouvelle piste dans le slot s : l'état sera initialisé à la première mesure."""
+        if s < self.capacity: self.t[s] = np.nan
+
+    def measure(self, dist, bearing, h_box):
+        """Mesures (n,) -> position (n, 2) et covariance (n, 2, 2) cartésiennes."""
+        sin, cos = np.sin(bearing), np.cos(bearing)
+        z = np.stack([dist * sin, dist * cos], axis=1)
+        var_d = (dist * self.box_sigma / np.maximum(h_box, 1.0)) ** 2
+        var_b = np.full_like(dist, self.bearing_sd ** 2)
+        # Jacobien de (d, θ) -> (d sinθ, d cosθ)
+        J = np.stack([np.stack([sin, dist * cos], -1), np.stack([cos, -dist * sin], -1)], axis=1)
+        R = J @ (np.stack([var_d, var_b], -1)[:, :, None] * J.transpose(0, 2, 1))
+        return z, R
+
+    def step(self, slots, t, dist=None, bearing=None, h_box=None):
+        """
+        Prédit à l'instant t les pistes `slots`, puis les corrige si une mesure est fournie.
+
+        Sans mesure (images propagées entre deux détections), seule la
+        prédiction est appliquée. Retourne un dict de tableaux (n,) : dist,
+        speed (noeuds), heading (degrés), et leurs écarts-types *_sd.
+        """
+        slots = np.asarray(slots, dtype=np.intp)
+        if slots.size and slots.max() >= self.capacity: self._grow(max(int(slots.max()) + 1, 2 * self.capacity))
+        x, P = self.x[slots], self.P[slots]
+        new = np.isnan(self.t[slots])
+        z = R = None
+        if dist is not None: z, R = self.measure(np.asarray(dist, float), np.asarray(bearing, float), np.asarray(h_box, float))
+
+        if new.any() and z is not None:
+            # Initialisation : position mesurée, vitesse inconnue
+            x[new] = 0; x[new, :2] = z[new]
+            P[new] = 0; P[new, :2, :2] = R[new]; P[new, 2, 2] = P[new, 3, 3] = self.v0_var
+
+        old = ~new
+        if old.any():
+            dt = np.clip(t - self.t[slots[old]], 0.0, self.max_dt)
+            n = dt.size
+            F = np.tile(np.eye(4), (n, 1, 1)); F[:, 0, 2] = F[:, 1, 3] = dt
+            # Bruit d'accélération blanc, par axe : [[dt⁴/4, dt³/2], [dt³/2, dt²]] q
+            Q = np.zeros((n, 4, 4))
+            Q[:, 0, 0] = Q[:, 1, 1] = dt**4 / 4 * self.q
+            Q[:, 0, 2] = Q[:, 2, 0] = Q[:, 1, 3] = Q[:, 3, 1] = dt**3 / 2 * self.q
+            Q[:, 2, 2] = Q[:, 3, 3] = dt**2 * self.q
+            xo = np.einsum("nij,nj->ni", F, x[old])
+            Po = F @ P[old] @ F.transpose(0, 2, 1) + Q
+            if z is not None:
+                # Mise à jour : H sélectionne la position
+                S = Po[:, :2, :2] + R[old]
+                K = Po[:, :, :2] @ np.linalg.inv(S)
+                xo = xo + np.einsum("nij,nj->ni", K, z[old] - xo[:, :2])
+                Po = Po - K @ Po[:, :2, :]
+            x[old], P[old] = xo, Po
+
+        valid = ~new | (z is not None)
+        self.x[slots[valid]], self.P[slots[valid]], self.t[slots[valid]] = x[valid], P[valid], t
+        return self.outputs(x, P)
+
+    @staticmethod
+    def outputs(x, P):
+        px, py, vx, vy = x.T
+        d = np.maximum(np.hypot(px, py), 1e-6)
+        v = np.hypot(vx, vy)
+        vs = np.maximum(v, 1e-6)
+        # Propagation au premier ordre des covariances position / vitesse
+        jd = np.stack([px / d, py / d], -1)
+        jv = np.stack([vx / vs, vy / vs], -1)
+        jh = np.stack([vy / vs**2, -vx / vs**2], -1)
+        Pp, Pv = P[:, :2, :2], P[:, 2:, 2:]
+        q = lambda j, C: np.sqrt(np.maximum(np.einsum("ni,nij,nj->n", j, C, j), 0))
+        return {"dist": d, "dist_sd": q(jd, Pp),
+                "speed": v * MS_TO_KNOTS, "speed_sd": q(jv, Pv) * MS_TO_KNOTS,
+                "heading": np.degrees(np.arctan2(vx, vy)) % 360,
+                "heading_sd": np.minimum(np.degrees(q(jh, Pv)), 180.0)}
@@ -0,0 +1,136 @@
+"""
+metrics.py — Chronométrage des étapes du pipeline et export Prometheus.
+
+Chaque étape (capture, détection, tracking, filtre, physique, dessin,
+encodage, émission, classification...) alimente une fenêtre glissante de
+durées par (étape, source) ; les quantiles p50/p95/p99 ne sont calculés
+qu'à la lecture (/metrics). Sur le chemin critique, une mesure coûte un
+perf_counter() et une écriture dans un buffer NumPy pré-alloué.
+"""
+
+import time
+
+import numpy as np
+
+from config import METRICS_ENABLED, METRICS_WINDOW
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Summary:
+    """Fenêtre circulaire des `window` dernières durées (secondes), plus somme et nombre totaux."""
+
+    __slots__ = ("values", "count", "total")
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.values = np.zeros(window, dtype=np.float64)
+        self.count  = 0
+        self.total  = 0.0
+
+    def observe(self, v):
+        self.values[self.count % self.values.size] = v
+        self.count += 1
+        self.total += v
+
+    def quantiles(self, qs=QUANTILES):
+        k = min(self.count, self.values.size)
+        if not k: return [float("nan")] * len(qs)
+        return np.quantile(self.values[:k], qs).tolist()
+
+
+class Stopwatch:
+    """Chronomètre à tours : lap(étape) enregistre le temps écoulé depuis le tour précédent."""
+
+    __slots__ = ("registry", "source", "t")
+
+    def __init__(self, registry, source=""):
+        self.registry = registry
+        self.source   = source
+        self.t        = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.registry.observe(stage, now - self.t, self.source)
+        self.t = now
+        return now
+
+    def skip(self):
+        """Repart de maintenant sans rien enregistrer (temps hors étape)."""
+        self.t = time.perf_counter()
+
+
+class Registry:
+    """
+    Durées par (étape, source), compteurs et jauges par (nom, source).
+
+    Paramètres
+    ----------
+    window : int
+        Nombre de dernières mesures utilisées pour les quantiles.
+    enabled : bool
+        Désactivé, observe(), inc() et gauge() retournent immédiatement.
+    """
+
+    def __init__(self, window: int = METRICS_WINDOW, enabled: bool = METRICS_ENABLED):
+        self.window    = window
+        self.enabled   = enabled
+        self.summaries = {}
+        self.counters  = {}
+        self.gauges    = {}
+
+    def observe(self, stage, seconds, source=""):
+        if not self.enabled: return
+        s = self.summaries.get((stage, source))
+        if s is None: s = self.summaries[(stage, source)] = Summary(self.window)
+        s.observe(seconds)
+
+    def inc(self, name, n=1, source=""):
+        if not self.enabled: return
+        key = (name, source)
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def gauge(self, name, value, source=""):
+        """Valeur instantanée (ex. profondeur d'une file), remplacée à chaque appel."""
+        if not self.enabled: return
+        self.gauges[(name, source)] = value
+
+    def stopwatch(self, source=""):
+        return Stopwatch(self, source)
+
+    def summary(self) -> dict:
+        """{source: {étape: {"p50_ms", "p95_ms", "p99_ms", "count"}}} pour le panneau de debug."""
+        out = {}
+        for (stage, source), s in sorted(self.summaries.items()):
+            p50, p95, p99 = s.quantiles()
+            out.setdefault(source or "*", {})[stage] = {
+                "p50_ms": round(p50 * 1000, 2), "p95_ms": round(p95 * 1000, 2),
+                "p99_ms": round(p99 * 1000, 2), "count": s.count}
+        return out
+
+    def prometheus(self) -> str:
+        """Format texte d'exposition Prometheus (summary + counters + gauges)."""
+        lines = ["# HELP vision_stage_seconds Durée des étapes du pipeline (fenêtre glissante).",
+                 "# TYPE vision_stage_seconds summary"]
+        for (stage, source), s in sorted(self.summaries.items()):
+            labels = f'stage="{stage}",source="{source}"'
+            for q, v in zip(QUANTILES, s.quantiles()):
+                lines.append(f'vision_stage_seconds{{{labels},quantile="{q}"}} {v:.6g}')
+            lines.append(f"vision_stage_seconds_sum{{{labels}}} {s.total:.6g}")
+            lines.append(f"vision_stage_seconds_count{{{labels}}} {s.count}")
+        names = sorted({name for name, _ in self.counters})
+        for name in names:
+            lines.append(f"# TYPE vision_{name}_total counter")
+            for (n, source), v in sorted(self.counters.items()):
+                if n == name: lines.append(f'vision_{name}_total{{source="{source}"}} {v}')
+        for name in sorted({name for name, _ in self.gauges}):
+            lines.append(f"# TYPE vision_{name} gauge")
+            for (n, source), v in sorted(self.gauges.items()):
+                if n == name: lines.append(f'vision_{name}{{source="{source}"}} {v}')
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+observe   = REGISTRY.observe
+inc       = REGISTRY.inc
+gauge     = REGISTRY.gauge
+stopwatch = REGISTRY.stopwatch
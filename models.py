@@ -0,0 +1,126 @@
+"""
+models.py — Chargement des modèles A/B/C en arrière-plan, avec préchauffage.
+
+Les imports lourds (torch, ultralytics) ne sont faits qu'ici, dans le thread
+de chargement lancé au démarrage du serveur : l'application répond tout de
+suite et le flux vidéo s'affiche pendant le chargement. Chaque modèle passe
+par une inférence à vide au format de traitement avant d'être exposé, pour
+que la première vraie image ne paie ni l'initialisation ni les allocations.
+L'état (« pending », « loading », « warming », « ready », « error ») est
+remonté à l'interface via `on_change`.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+import config
+from config import (MODEL_A_PATH, MODEL_B_PATH, MODEL_C_PATH, ENGINE_A_PATH, ENGINE_B_PATH, ENGINE_C_PATH,
+                    PROC_MAX_WIDTH, MAX_CROP_SIDE, CLASSIFY_BATCH_SIZE)
+
+# (clé, poids, moteur TensorRT, taille d'entrée, batch de préchauffage / benchmark, forme de l'image)
+SPECS = (
+    ("A", MODEL_A_PATH, ENGINE_A_PATH, PROC_MAX_WIDTH, 1, (PROC_MAX_WIDTH * 9 // 16, PROC_MAX_WIDTH, 3)),
+    ("B", MODEL_B_PATH, ENGINE_B_PATH, MAX_CROP_SIDE, min(4, CLASSIFY_BATCH_SIZE), (MAX_CROP_SIDE, MAX_CROP_SIDE, 3)),
+    ("C", MODEL_C_PATH, ENGINE_C_PATH, MAX_CROP_SIDE, min(4, CLASSIFY_BATCH_SIZE), (MAX_CROP_SIDE, MAX_CROP_SIDE, 3)),
+)
+
+
+def load_model(pt_path, engine_path=None, name="model", imgsz=640, batch=1):
+    """Backend le plus rapide sur cette machine (PyTorch, TensorRT, ONNX Runtime, OpenVINO). Retourne (modèle, info)."""
+    from backends import select_backend
+    try: return select_backend(pt_path, engine_path, name, imgsz, batch)
+    except Exception as e: print(f"[BACKEND] {name}: {e}")
+    from ultralytics import YOLO
+    if engine_path and os.path.exists(engine_path):
+        try: return YOLO(engine_path), {"backend": "engine", "path": engine_path}
+        except Exception: pass
+    return YOLO(pt_path), {"backend": "pt", "path": pt_path}
+
+
+def warmup(model, imgsz, batch, shape):
+    """Inférence à vide au format de traitement (initialisation des noyaux et des buffers)."""
+    kwargs = {"imgsz": imgsz, "verbose": False}
+    if config.use_cuda: kwargs["device"] = 0
+    imgs = [np.zeros(shape, dtype=np.uint8)] * batch
+    try: model.predict(imgs, **kwargs)
+    except Exception:
+        if batch == 1: raise
+        # Moteur à batch fixe (TensorRT batch=1) : classify_batch passera image par image
+        model.predict(imgs[:1], **kwargs)
+
+
+class ModelLoader:
+    """
+    Modèles partagés par le pipeline, chargés une fois en arrière-plan.
+
+    Paramètres
+    ----------
+    on_change : callable, optionnel
+        Appelé avec status() à chaque changement d'état (ex. émission socket.io).
+    run : callable, optionnel
+        Exécuteur des appels bloquants, run(fn, *args) (eventlet.tpool.execute
+        pour ne pas geler la boucle réseau pendant les imports et l'export).
+    """
+
+    def __init__(self, on_change=None, run=None):
+        self.on_change = on_change
+        self._run      = run or (lambda fn, *a: fn(*a))
+        self.models    = {key: None for key, *_ in SPECS}
+        self.state     = {key: "pending" for key, *_ in SPECS}
+        self.backends  = {}
+        self.load_s    = {}
+        self.errors    = {}
+        self.t0        = time.time()
+        self.ready_s   = None
+        self._thread   = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._load, daemon=True)
+            self._thread.start()
+        return self
+
+    @property
+    def ready(self) -> bool:
+        return all(s in ("ready", "error") for s in self.state.values())
+
+    def _set(self, key, state):
+        self.state[key] = state
+        if self.ready and self.ready_s is None: self.ready_s = round(time.time() - self.t0, 2)
+        if self.on_change:
+            try: self.on_change(self.status())
+            except Exception: pass
+
+    def _load(self):
+        self._run(config.detect_cuda)
+        # A d'abord : la détection démarre pendant que B et C se chargent
+        for key, pt_path, engine_path, imgsz, batch, shape in SPECS:
+            t = time.time()
+            self._set(key, "loading")
+            try:
+                model, self.backends[key] = self._run(load_model, pt_path, engine_path, "Model" + key, imgsz, batch)
+                self._set(key, "warming")
+                self._run(warmup, model, imgsz, batch, shape)
+            except Exception as e:
+                self.errors[key] = str(e)
+                print(f"[MODELS] Model{key}: {e}")
+                self._set(key, "error")
+                continue
+            self.models[key] = model
+            self.load_s[key] = round(time.time() - t, 2)
+            self._set(key, "ready")
+        print(f"[MODELS] Prêts en {self.ready_s}s ({self.load_s})")
+
+    def detector(self):
+        return self.models["A"]
+
+    def classifiers(self):
+        return self.models["B"], self.models["C"]
+
+    def status(self) -> dict:
+        return {"ready": self.ready, "models": dict(self.state), "load_s": dict(self.load_s),
+                "ready_s": self.ready_s, "errors": dict(self.errors),
+                "backends": {k: v.get("backend") for k, v in self.backends.items()}}
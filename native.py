@@ -0,0 +1,117 @@
+"""
+native.py — Vrais threads OS sous eventlet et passerelle vers le hub.
+
+app.py appelle eventlet.monkey_patch() : threading.Thread y devient un green
+thread, et tout calcul OpenCV/PyTorch qui y tourne monopolise le hub
+(socket.io, /video_feed). Les étages lourds (capture, inférence, encodage,
+classification) prennent donc ici les modules d'origine, non patchés :
+leurs threads et leurs verrous sont natifs et tournent en parallèle du hub.
+
+Seul le hub touche aux sockets. Les étages natifs lui confient émissions et
+publications d'images via GreenBridge : la file est vidée par un green
+thread, réveillé par un thread du pool eventlet.tpool qui attend l'événement
+natif. Sans eventlet (benchmarks, rejeu), ce sont les modules standard et
+la passerelle appelle directement.
+
+Usage :
+    bridge = GreenBridge().start()
+    emit = bridge.wrap(socketio.emit)                 # ordre conservé
+    publish = bridge.wrap_latest(broadcaster.publish) # seule la dernière image compte
+"""
+
+import sys
+from collections import deque
+
+import metrics
+
+# Seul un processus qui a déjà importé (et patché) eventlet est concerné
+GREEN = "eventlet" in sys.modules and sys.modules["eventlet"].patcher.is_monkey_patched("thread")
+
+if GREEN:
+    from eventlet import patcher
+    threading = patcher.original("threading")
+    time      = patcher.original("time")
+else:
+    import threading
+    import time
+
+
+class GreenBridge:
+    """
+    File d'appels des threads natifs vers le hub eventlet.
+
+    Paramètres
+    ----------
+    max_pending : int
+        Appels ordonnés en attente au-delà desquels les plus anciens sont
+        abandonnés (hub bloqué) ; les appels « dernière valeur » ne
+        s'accumulent jamais.
+    """
+
+    def __init__(self, max_pending: int = 1024):
+        self._calls   = deque(maxlen=max_pending)
+        self._latest  = {}
+        self._lock    = threading.Lock()
+        self._event   = threading.Event()
+        self.calls    = 0
+        self.dropped  = 0
+        self.replaced = 0
+        self.started  = False
+
+    def start(self):
+        """Lance le green thread de distribution (sans eventlet : appels directs, rien à lancer)."""
+        if GREEN and not self.started:
+            import eventlet
+            eventlet.spawn(self._loop)
+        self.started = True
+        return self
+
+    # ── Côté threads natifs ────────────────────────────────────────────────────
+
+    def call(self, fn, *args, **kwargs):
+        """Exécute fn(*args, **kwargs) dans le hub, dans l'ordre des appels."""
+        if not GREEN: return fn(*args, **kwargs)
+        with self._lock:
+            if len(self._calls) == self._calls.maxlen:
+                self.dropped += 1
+                metrics.inc("bridge_dropped")
+            self._calls.append((fn, args, kwargs, time.perf_counter()))
+        self._event.set()
+
+    def latest(self, key, fn, *args):
+        """Comme call(), mais un appel encore en attente pour `key` est remplacé."""
+        if not GREEN: return fn(*args)
+        with self._lock:
+            if key in self._latest: self.replaced += 1
+            self._latest[key] = (fn, args, {}, time.perf_counter())
+        self._event.set()
+
+    def wrap(self, fn):
+        return lambda *args, **kwargs: self.call(fn, *args, **kwargs)
+
+    def wrap_latest(self, fn):
+        return lambda *args: self.latest(fn, fn, *args)
+
+    # ── Côté hub ───────────────────────────────────────────────────────────────
+
+    def _wait(self):
+        # Exécuté dans un thread tpool : bloque sur l'événement natif sans bloquer le hub
+        self._event.wait(1.0)
+        self._event.clear()
+
+    def _loop(self):
+        from eventlet import tpool
+        while True:
+            tpool.execute(self._wait)
+            with self._lock:
+                calls = list(self._calls) + list(self._latest.values())
+                self._calls.clear(); self._latest.clear()
+            for fn, args, kwargs, t in calls:
+                metrics.observe("bridge_wait", time.perf_counter() - t)
+                try: fn(*args, **kwargs)
+                except Exception: pass
+            self.calls += len(calls)
+
+    def stats(self) -> dict:
+        return {"green": GREEN, "pending": len(self._calls) + len(self._latest), "calls": self.calls,
+                "dropped": self.dropped, "replaced": self.replaced}
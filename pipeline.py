@@ -0,0 +1,698 @@
+"""
+pipeline.py — Traitement vidéo multi-sources.
+
+Chaque source nommée possède sa capture, son tracker, ses pistes, son étage
+d'encodage et sa diffusion. Un seul thread d'inférence fait tourner modelA
+(partagé) : à chaque tick il prend la dernière image de chaque source, les
+détecte en un seul lot, puis chaque source poursuit avec son propre tracker,
+le filtrage par analogie, la physique, le dessin et la télémétrie.
+
+Capture, inférence et encodage tournent dans des threads natifs (native.py),
+hors du hub eventlet : le serveur web ne reçoit que les images encodées et
+la télémétrie, via la passerelle GreenBridge.
+
+SourceManager est seul propriétaire du cycle de vie : une seule VisionSource
+active par nom, jamais traitée après son arrêt ; les classifications en file
+sont annulées à l'arrêt, celles déjà en calcul attendues. Relancer la même
+URL réutilise la capture en place ; changer d'URL se fait à chaud : la
+nouvelle source démarre à côté de l'ancienne, qui reste diffusée jusqu'à la
+première image de la remplaçante (même diffusion MJPEG, mêmes clients).
+"""
+
+import cv2
+import numpy as np
+
+from config import (PROC_MAX_WIDTH, CONF_THRESHOLD_A, VOTE_MIN_CONFIRM,
+                    MAX_TRACK_AGE, DETECT_STRIDE, TILING, REAL_BOAT_HEIGHT, TRACK_BUFFER, CLASS_VOTE_WINDOW, TRACKER_CFG,
+                    OVERLAY_MODE, FRAME_RING_RESERVE, SOURCE_WARM_TIMEOUT, SOURCE_DRAIN_TIMEOUT, SOURCE_MAX_ERRORS, FOCAL_PX, CAMERA_HFOV_DEG, CLASS_NAMES, class_colors, boat_heights, modelA_names, overlay_options)
+from capture import FrameGrabber
+from detections import filter_detections_by_analogy, iou_matrix
+from encoder import EncodeStage
+from streaming import FrameBroadcaster
+from telemetry import TelemetryEncoder, pack_tracks
+from tiling import TilePlanner
+from scheduler import ClassifyScheduler
+from classifier import job_priority
+from recording import Recorder
+from kinematics import KinematicsFilter
+import metrics
+from native import threading, time
+from tracks import TrackStore
+
+
+def scale_for_processing(frame, max_w=PROC_MAX_WIDTH):
+    h, w = frame.shape[:2]
+    if w <= max_w: return frame, 1.0
+    scale = max_w / w
+    return cv2.resize(frame, (int(w*scale), int(h*scale))), scale
+
+def bgr_to_hex(bgr):
+    # Convertit un tuple (B, G, R) en string hex '#RRGGBB'
+    return "#{:02x}{:02x}{:02x}".format(bgr[2], bgr[1], bgr[0])
+
+CLASS_HEX = [bgr_to_hex(class_colors.get(n, (0,200,200))) for n in CLASS_NAMES]
+
+def draw_track(frame, tid, box, name, dist, speed, heading, conf, target_id=None):
+    x1, y1, x2, y2 = box
+    col_bgr = class_colors.get(name, (0,200,200))
+
+    # === DESSIN SUR IMAGE ===
+    # Épaissir la boîte UNIQUEMENT si c'est la cible
+    # 6 = Gras (Sélectionné)
+    # 2 = Normal/Fin (Non sélectionné)
+    thick = 6 if tid == target_id else 2
+
+    cv2.rectangle(frame, (x1, y1), (x2, y2), col_bgr, thick)
+
+    # Construction du texte
+    txt = ""
+    if overlay_options["ID"]: txt += f"ID:{tid} "
+    if overlay_options["Classe"]: txt += f"{name} "
+    if overlay_options["Distance"]: txt += f"{dist:.0f}m "
+    if overlay_options["Vitesse"]: txt += f"{speed:.1f}kt "
+    if overlay_options["Cap"]: txt += f"{heading:.0f}° "
+    if overlay_options["Conf"]: txt += f"{conf:.2f}"
+
+    if txt.strip():
+        (tw, th), _ = cv2.getTextSize(txt, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        cv2.rectangle(frame, (x1, y1-th-4), (x1+tw+4, y1), col_bgr, -1)
+        cv2.putText(frame, txt.strip(), (x1+2, y1-3), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
+
+
+# === DETECTION / TRACKING ===
+class Detections:
+    """Détections (n, 6) x1 y1 x2 y2 conf cls, au format attendu par les trackers Ultralytics."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = np.asarray(data, dtype=np.float32).reshape(-1, 6)
+
+    def __len__(self): return len(self.data)
+    def __getitem__(self, idx): return Detections(self.data[idx])
+
+    @property
+    def xyxy(self): return self.data[:, :4]
+    @property
+    def conf(self): return self.data[:, 4]
+    @property
+    def cls(self): return self.data[:, 5]
+    @property
+    def xywh(self):
+        b = self.data[:, :4]
+        return np.stack([(b[:, 0]+b[:, 2])/2, (b[:, 1]+b[:, 3])/2, b[:, 2]-b[:, 0], b[:, 3]-b[:, 1]], axis=1)
+
+
+def detect_batch(model, frames, conf=CONF_THRESHOLD_A):
+    """Une seule passe de modelA sur les images de toutes les sources. Retourne une liste de Detections."""
+    if model is None or not frames: return [Detections(np.empty((0, 6))) for _ in frames]
+    out = []
+    for res in model.predict(frames, conf=conf, verbose=False):
+        b = res.boxes
+        out.append(Detections(np.concatenate([b.xyxy.cpu().numpy(), b.conf.cpu().numpy()[:, None],
+                                              b.cls.cpu().numpy()[:, None]], axis=1)))
+    return out
+
+
+class IoUTracker:
+    """
+    Suivi minimal par association gloutonne sur l'IoU.
+
+    Repli quand Ultralytics n'est pas installé (benchmarks, postes de test) ;
+    même interface et même format de sortie que BYTETracker.update().
+    """
+
+    def __init__(self, iou_thr=0.3, max_lost=30):
+        self.iou_thr  = iou_thr
+        self.max_lost = max_lost
+        self.tracks   = {}      # tid -> [boîte, images sans association]
+        self.next_id  = 1
+
+    def update(self, dets, img=None):
+        d = dets.data
+        ids = list(self.tracks)
+        free = set(range(len(ids)))
+        if ids and len(d):
+            prev = np.array([self.tracks[t][0] for t in ids])
+            ious = iou_matrix(np.vstack([d[:, :4], prev]))[:len(d), len(d):]
+        out = []
+        for i in np.argsort(-d[:, 4]) if len(d) else []:
+            j = max(free, key=lambda k: ious[i, k], default=None) if ids else None
+            if j is not None and ious[i, j] >= self.iou_thr:
+                free.discard(j); tid = ids[j]
+            else:
+                tid = self.next_id; self.next_id += 1
+            self.tracks[tid] = [d[i, :4].copy(), 0]
+            out.append([*d[i, :4], tid, d[i, 4], d[i, 5], i])
+        for j in free:
+            t = self.tracks[ids[j]]
+            t[1] += 1
+            if t[1] > self.max_lost: del self.tracks[ids[j]]
+        return np.array(out, dtype=np.float32).reshape(-1, 8)
+
+
+def make_tracker(cfg=TRACKER_CFG, frame_rate=30):
+    """Tracker Ultralytics indépendant (BoT-SORT / ByteTrack), un par source."""
+    try: from ultralytics.trackers.byte_tracker import BYTETracker
+    except ImportError:
+        print("[TRACK] Ultralytics absent : repli sur le suivi IoU")
+        return IoUTracker()
+    from ultralytics.trackers.bot_sort import BOTSORT
+    from ultralytics.utils import IterableSimpleNamespace
+    from ultralytics.utils.checks import check_yaml
+    try: from ultralytics.utils import yaml_load
+    except ImportError:
+        from ultralytics.utils import YAML
+        yaml_load = YAML.load
+    args = IterableSimpleNamespace(**yaml_load(check_yaml(cfg)))
+    return (BOTSORT if args.tracker_type == "botsort" else BYTETracker)(args=args, frame_rate=frame_rate)
+
+
+class VisionSource:
+    """
+    Une source vidéo nommée et tout son état de traitement.
+
+    Paramètres
+    ----------
+    name : str
+        Identifiant de la source (utilisé dans /video_feed/<name>).
+    cap : cv2.VideoCapture
+        Capture déjà ouverte.
+    submit_classification : callable
+        submit(tid, crop, origin, priority) -> Future, partagé entre les sources.
+    emit : callable
+        emit(event, payload, to=sid) pour la télémétrie.
+    bridge : native.GreenBridge, optionnel
+        Passerelle vers le hub eventlet pour les émissions et la publication
+        des images (sans elle, appels directs depuis le thread du pipeline).
+    broadcasters : tuple, optionnel
+        Diffusions (annotée, brute) reprises d'une source remplacée à chaud
+        (clients conservés).
+    overlay_modes : dict, optionnel
+        sid -> "server" ou "client", choix propre à chaque client web
+        (partagé par SourceManager entre toutes les sources).
+
+    Deux flux MJPEG : l'image annotée (overlays incrustés) et l'image brute
+    (overlays dessinés par le navigateur). Chaque client lit celui qu'il a
+    choisi ; un flux sans client n'est ni dessiné ni encodé. Sans aucun
+    client (banc, rejeu), `overlay_mode` décide.
+    """
+
+    def __init__(self, name, url, cap, submit_classification, emit, bridge=None, broadcasters=None,
+                 overlay_modes=None):
+        self.name         = name
+        self.url          = url
+        self.cap          = cap
+        self.grabber      = FrameGrabber(cap, name=name)
+        self.tracker      = make_tracker()
+        self.tracks       = TrackStore(CLASS_NAMES, hist_len=TRACK_BUFFER, vote_window=CLASS_VOTE_WINDOW)
+        self.pending      = {}
+        self.scheduler    = ClassifyScheduler()
+        self.submit       = submit_classification
+        self.emit         = bridge.wrap(emit) if bridge else emit
+        self.broadcaster, self.raw_broadcaster = broadcasters or (FrameBroadcaster(), FrameBroadcaster())
+        publish = bridge.wrap_latest if bridge else (lambda fn: fn)
+        self.encode_stage = EncodeStage(publish(self.broadcaster.publish), name=name)
+        self.raw_stage    = EncodeStage(publish(self.raw_broadcaster.publish), name=name + ":raw")
+        self.telemetry    = TelemetryEncoder()
+        self.target_id    = None
+        self.overlay_mode = OVERLAY_MODE        # sans client MJPEG (banc, rejeu)
+        self.overlay_modes = {} if overlay_modes is None else overlay_modes
+        self.last_seq     = 0
+        self.prev_time    = time.time()
+        self.fps          = 0.0
+        self.stride       = max(1, DETECT_STRIDE)
+        self.frame_count  = 0
+        self.detections   = 0
+        self.last_det_t   = -float("inf")
+        self.prop_iou     = 1.0      # IoU moyenne prédiction / détection suivante
+        self.started      = time.time()
+        self.first_frame_s     = None   # démarrage -> première image diffusée
+        self.first_annotated_s = None   # démarrage -> première image passée par modelA
+        self.tiler        = TilePlanner() if TILING else None
+        self.recorder     = None        # recording.Recorder pendant un enregistrement
+        self.kinematics   = KinematicsFilter(self.tracks.capacity)
+        self.errors       = 0           # images en échec consécutives (SourceManager)
+
+    def start(self):
+        self.grabber.start()
+        return self
+
+    def stop(self, drain: float = SOURCE_DRAIN_TIMEOUT):
+        """
+        Arrête la source. Classifications en file annulées, celles déjà en
+        calcul attendues au plus `drain` secondes (leurs crops référencent l'anneau).
+        """
+        running = [fut for fut in self.pending.values() if not fut.cancel()]
+        self.pending.clear()
+        deadline = time.time() + drain
+        for fut in running:
+            try: fut.exception(timeout=max(0.0, deadline - time.time()))
+            except Exception:
+                metrics.inc("drain_timeouts", source=self.name); break
+        self.grabber.stop()
+        self.encode_stage.stop()
+        self.raw_stage.stop()
+        if self.recorder: self.recorder.close()
+        # La capture a pu être rouverte par le grabber (lien expiré)
+        if self.grabber.cap: self.grabber.cap.release()
+
+    def poll(self):
+        """Dernière image non traitée (seq, ts, frame) ou None, sans attendre."""
+        if not self.grabber.running: return None
+        return self.grabber.read(self.last_seq, timeout=0)
+
+    def client_overlay_sids(self):
+        return {sid for sid, mode in list(self.overlay_modes.items()) if mode == "client"}
+
+    def stats(self) -> dict:
+        elapsed = max(1e-3, time.time() - self.started)
+        return {"fps": round(self.fps, 1), "stride": self.stride,
+                "frames": self.frame_count, "detections": self.detections,
+                "output_fps": round(self.frame_count / elapsed, 1),
+                "detect_fps": round(self.detections / elapsed, 1),
+                "prop_iou": round(self.prop_iou, 3), "tracks": len(self.tracks),
+                "classify": self.scheduler.stats(),
+                "first_frame_s": self.first_frame_s, "first_annotated_s": self.first_annotated_s,
+                "tiling": self.tiler.stats() if self.tiler else None,
+                **self.grabber.stats()}
+
+    def mark_first_annotated(self):
+        self.first_annotated_s = round(time.time() - self.started, 3)
+        print(f"[{self.name}] Première image annotée après {self.first_annotated_s}s")
+        self.emit('source_ready', {"name": self.name, "first_frame_s": self.first_frame_s,
+                                   "first_annotated_s": self.first_annotated_s})
+
+    def select(self, x, y):
+        # Sélectionne la cible sous le clic, ou désélectionne (même cible / clic dans le vide)
+        found = self.tracks.find_at(x, y)
+        self.target_id = None if found is None or found == self.target_id else found
+
+    def _vote(self, s, tid, result, cache=True, late=False):
+        # Résultat B/C (calculé, en cache ou rejoué) : vote, cache, intervalle, enregistrement
+        self.scheduler.record(self.tracks, s, result, VOTE_MIN_CONFIRM, cache)
+        if self.recorder:
+            self.recorder.add_vote(tid, self.tracks.class_ids.get(result['name'], -1) if result else -1,
+                                   result['conf'] if result else 0.0, late)
+
+    def _replay_votes(self, votes, late):
+        for tid, cid, conf, is_late in votes:
+            if is_late != late: continue
+            s = self.tracks.slot(tid)
+            if s is not None: self._vote(s, tid, {"name": CLASS_NAMES[cid], "conf": conf} if cid >= 0 else None, cache=False)
+
+    def _apply_classifications(self):
+        done = []
+        for tid, fut in list(self.pending.items()):
+            if fut.done():
+                try: done.append(fut.result())
+                except: pass
+                del self.pending[tid]
+
+        for res in done:
+            s = self.tracks.slot(res['tid'])
+            if s is None: continue # Piste évincée entre-temps
+            chosen = res['resC'] if res['resC'] else res['resB']
+            self._vote(s, res['tid'], chosen)
+
+    def due_for_detection(self):
+        """Le détecteur ne tourne qu'une image sur `stride` ; les autres sont propagées."""
+        return self.frame_count % self.stride == 0
+
+    def _propagate(self, now):
+        # Boîtes extrapolées (vitesse constante) des pistes vues à la dernière détection
+        sl, boxes = self.tracks.predict_boxes(now, self.last_det_t)
+        return [(b, int(tid), float(cf), int(c)) for b, tid, cf, c in
+                zip(boxes, self.tracks.tid[sl].tolist(), self.tracks.conf[sl].tolist(), self.tracks.det_cls[sl].tolist())]
+
+    def process(self, item, proc_frame, scale, dets, replay=None):
+        """
+        Suite du traitement d'une image après la détection groupée.
+
+        `dets` à None : image sans détection (stride), les boîtes sont
+        propagées depuis la dernière détection. `replay` (recording.FrameRecord)
+        fournit les pistes et les votes B/C enregistrés, sans inférence.
+        `item` = (seq, ts, frame[, SlotRef]) : l'image est une vue de l'anneau
+        de capture ; encodage et crops en file y prennent leur propre référence.
+        """
+        self.last_seq, cap_ts, frame = item[:3]
+        ref = item[3] if len(item) > 3 else None
+        # Flux demandés par les clients MJPEG : brut, annoté, ou les deux
+        want_raw = self.raw_broadcaster.clients > 0
+        draw = self.broadcaster.clients > 0 or (not want_raw and self.overlay_mode == "server")
+        if not want_raw and not draw: want_raw = True
+        tracks = self.tracks
+        sw = metrics.stopwatch(self.name)
+        t_start = sw.t
+
+        # Mesure FPS
+        now = time.time()
+        dt = now - self.prev_time
+        self.prev_time = now
+        self.fps = 1.0 / dt if dt > 0 else 0
+
+        fh_orig, fw_orig = frame.shape[:2]
+        if replay is None: self._apply_classifications()
+        else: self._replay_votes(replay.votes, late=False)
+        sw.lap("apply_classification")
+
+        detected = dets is not None if replay is None else replay.detected
+        self.frame_count += 1
+        if replay is not None:
+            if detected: self.detections += 1; self.last_det_t = now
+            rows = replay.rows
+        elif detected:
+            # Tracking (tracker propre à la source) : x1 y1 x2 y2 id conf cls idx
+            self.detections += 1
+            self.last_det_t = now
+            rows = [(t[:4] / scale if scale != 1.0 else t[:4], int(t[4]), float(t[5]), int(t[6]))
+                    for t in self.tracker.update(dets, proc_frame)]
+            sw.lap("track")
+        else:
+            rows = self._propagate(now)
+            sw.lap("propagate")
+        tracks.begin_frame()
+
+        if len(rows):
+            raw = []
+            for b, tid, cf, c in rows:
+                nameA = modelA_names[c] if 0 <= c < len(modelA_names) else "Inconnu"
+                raw.append([b[0], b[1], b[2], b[3], nameA, cf, c, tid])
+
+            filtered = filter_detections_by_analogy(raw)
+            frame_idx = self.frame_count
+            sw.lap("filter")
+
+            seen = []   # (slot, tid, boîte, nom affiché, conf affichée)
+            for d in filtered:
+                x1, y1, x2, y2 = map(int, d[:4])
+                tid = int(d[7])
+                nameA = d[4]
+                conf_val = d[5]
+
+                s, new = tracks.upsert(tid, nameA)
+                if new: self.kinematics.reset(s)
+                tracks.mark_seen(s)
+                tracks.conf[s] = conf_val
+                if detected:
+                    # Vitesse de la boîte pour la propagation + erreur de la prédiction précédente
+                    score = tracks.observe_box(s, d[:4], d[6], now)
+                    if score is not None: self.prop_iou = 0.95 * self.prop_iou + 0.05 * score
+
+                # Mise à jour des coordonnées pour le clic (normalisé 0-1)
+                tracks.box[s] = (x1/fw_orig, y1/fh_orig, x2/fw_orig, y2/fh_orig)
+
+                if replay is not None:
+                    # Votes tirés du cache à cet endroit lors de l'enregistrement
+                    self._replay_votes([v for v in replay.votes if v[0] == tid], late=True)
+                elif detected and nameA in ["Bateau", "bateau"] and tid not in self.pending:
+                    pad = 10
+                    cx1, cy1 = max(0, x1-pad), max(0, y1-pad)
+                    cx2, cy2 = min(fw_orig, x2+pad), min(fh_orig, y2+pad)
+                    # Reclassification espacée si la classe est stable, résultat réutilisé si crop déjà vu
+                    since = frame_idx - tracks.last_cl[s]
+                    todo = self.scheduler.decide(tracks, s, frame_idx, frame[cy1:cy2, cx1:cx2])
+                    if todo and todo[0] == "cached":
+                        self._vote(s, tid, todo[1], cache=False, late=True)
+                    elif todo:
+                        prio = job_priority(tid == self.target_id, (x2-x1)*(y2-y1) / (fw_orig*fh_orig), since)
+                        # Crop = vue du slot, gardé jusqu'au résultat ; copie si les overlays
+                        # vont être dessinés dessus ou si l'anneau manque de slots libres
+                        crop = frame[cy1:cy2, cx1:cx2]
+                        view = ref is not None and not draw and ref.pin(FRAME_RING_RESERVE)
+                        if not view:
+                            crop = crop.copy()
+                            metrics.inc("crop_copies", source=self.name)
+                        fut = self.pending[tid] = self.submit(tid, crop, (cx1,cy1), prio)
+                        if view:
+                            fut.add_done_callback(ref.release)
+                            metrics.inc("crop_views", source=self.name)
+
+                final_name = tracks.name(s, nameA)
+                final_conf = tracks.confirmed_conf[s] if tracks.confirmed_id[s] >= 0 else conf_val
+                seen.append((s, tid, (x1, y1, x2, y2), final_name, final_conf))
+            sw.lap("tracks")
+
+            # Cinématique : un pas de Kalman pour toutes les pistes de l'image (mesure sur les images détectées)
+            sl = np.array([e[0] for e in seen], dtype=np.intp)
+            boxes = np.array([e[2] for e in seen], dtype=np.float64).reshape(-1, 4)
+            h_box = np.maximum(1, boxes[:, 3] - boxes[:, 1])
+            cx, cy = (boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2
+            azimuth = (cx - fw_orig / 2) / (fw_orig / 2)
+            t_meas = replay.ts if replay is not None else cap_ts
+            if detected:
+                heights = np.array([boat_heights.get(e[3], REAL_BOAT_HEIGHT) for e in seen])
+                kin = self.kinematics.step(sl, t_meas, heights * FOCAL_PX / h_box,
+                                           np.radians(azimuth * CAMERA_HFOV_DEG / 2), h_box)
+            else:
+                kin = self.kinematics.step(sl, t_meas)
+            tracks.dist[sl] = kin["dist"]; tracks.dist_sd[sl] = kin["dist_sd"]
+            tracks.speed[sl] = kin["speed"]; tracks.speed_sd[sl] = kin["speed_sd"]
+            tracks.heading[sl] = kin["heading"]; tracks.heading_sd[sl] = kin["heading_sd"]
+            tracks.azimuth[sl] = azimuth
+            tracks.pos[sl] = np.stack([cx, cy], axis=1)
+            for s, x, y, dist in zip(sl.tolist(), cx.tolist(), cy.tolist(), kin["dist"].tolist()):
+                tracks.push_history(s, x, y, dist)
+            sw.lap("kinematics")
+
+            # Overlays incrustés seulement si un client lit le flux annoté ; le flux
+            # brut part avant (copie seulement si les deux flux ont des clients)
+            if want_raw and draw:
+                self.raw_stage.submit(frame.copy())
+                want_raw = False
+            if draw:
+                for (s, tid, box, final_name, final_conf), dist, speed, heading in zip(
+                        seen, kin["dist"].tolist(), kin["speed"].tolist(), kin["heading"].tolist()):
+                    draw_track(frame, tid, box, final_name, dist, speed, heading, final_conf, self.target_id)
+                sw.lap("draw")
+
+        # Cleanup (vieillissement vectorisé, éviction au-delà de MAX_TRACK_AGE)
+        # Les crops encore en file des pistes évincées ne seront pas calculés
+        for tid in tracks.age_step(MAX_TRACK_AGE):
+            fut = self.pending.pop(tid, None)
+            if fut: fut.cancel()
+
+        if self.recorder: self.recorder.add_frame(self.last_seq, cap_ts, frame.shape, detected, rows)
+        sw.lap("age")
+
+        # Encodage JPEG dans son propre étage (chevauche l'inférence suivante)
+        # (brut et annoté sans rien de dessiné : la même vue part dans les deux flux)
+        if want_raw and draw: self.raw_stage.submit(frame, ref.release if ref and ref.pin() else None)
+        stage = self.encode_stage if draw else self.raw_stage
+        stage.submit(frame, ref.release if ref and ref.pin() else None)
+        if self.first_frame_s is None: self.first_frame_s = round(time.time() - self.started, 3)
+
+        # Télémétrie binaire différentielle, au débit propre à chaque client
+        records = pack_tracks(tracks)
+        for sid, payload in self.telemetry.encode_all(records, target_id=self.target_id, fps=self.fps,
+                                                      latency_ms=(time.time() - cap_ts) * 1000,
+                                                      encode_ms=(self.encode_stage if draw else self.raw_stage).avg_ms,
+                                                      dropped=self.grabber.dropped,
+                                                      client_overlay=self.client_overlay_sids()):
+            self.emit('update', payload, to=sid)
+        sw.lap("emit")
+        metrics.observe("latency", time.time() - cap_ts, self.name)
+        metrics.observe("process", sw.t - t_start, self.name)
+        metrics.inc("frames", source=self.name)
+        if detected: metrics.inc("detections", source=self.name)
+
+
+class SourceManager:
+    """
+    Sources actives + thread d'inférence unique partagé (thread natif).
+
+    Paramètres
+    ----------
+    get_detector : callable
+        Retourne modelA (None tant qu'il n'est pas prêt), partagé par toutes les sources.
+    bridge : native.GreenBridge, optionnel
+        Passerelle vers le hub eventlet (voir VisionSource).
+    """
+
+    def __init__(self, get_detector, submit_classification, emit, bridge=None):
+        self.get_detector = get_detector
+        self.submit       = submit_classification
+        self.emit         = emit
+        self.bridge       = bridge
+        self.sources      = {}
+        self.viewers      = {}      # sid -> nom de source choisi (None = source par défaut)
+        self.overlay_modes = {}     # sid -> "server" / "client", propre à chaque client
+        self._lock        = threading.Lock()
+        self._busy        = threading.Lock()   # tenu pendant un tick : aucune source arrêtée en cours de traitement
+        self._gen         = {}      # nom -> n° du dernier start/stop (un démarrage dépassé est abandonné)
+        self._thread      = None
+
+    # ── Sources ────────────────────────────────────────────────────────────────
+
+    def names(self):
+        return list(self.sources)
+
+    def get(self, name=None):
+        """Source par nom ; sans nom (ou nom inconnu), la première source démarrée."""
+        if name in self.sources: return self.sources[name]
+        return next(iter(self.sources.values()), None)
+
+    def _bump(self, name):
+        with self._lock:
+            gen = self._gen[name] = self._gen.get(name, 0) + 1
+            return gen
+
+    def _configure(self, src, stride=None, tiling=None, record=None):
+        if stride: src.stride = max(1, int(stride))
+        if tiling is not None: src.tiler = TilePlanner() if tiling else None
+        if record: src.recorder = Recorder(record, {"name": src.name, "url": src.url})
+
+    def reuse(self, name, url, stride=None, tiling=None, record=None):
+        """
+        Relance de la source `name` sur la même URL : options appliquées en
+        place, sans rouvrir la capture ni perdre les pistes. Retourne la source,
+        ou None s'il faut la (re)démarrer.
+        """
+        src = self.sources.get(name)
+        if src is None or src.url != url or not src.grabber.running: return None
+        self._bump(name)     # un démarrage à chaud en cours pour ce nom est abandonné
+        with self._busy:
+            old = src.recorder
+            src.recorder = None
+            if old: old.close()
+            self._configure(src, stride, tiling, record)
+        return src
+
+    def start(self, name, url, cap, stride=None, tiling=None, record=None, reopen=None, expires=None,
+              warm_timeout: float = SOURCE_WARM_TIMEOUT):
+        """
+        Démarre la source `name`, ou remplace à chaud celle qui porte ce nom.
+
+        Avec une source déjà active, la nouvelle lit sa capture à côté et ne
+        la remplace qu'à sa première image ; l'ancienne reste traitée et
+        diffusée jusque-là. Retourne la nouvelle source, ou None si elle n'a
+        rien lu avant `warm_timeout` ou si un start/stop plus récent l'a
+        rendue caduque (elle est alors arrêtée, l'ancienne continue).
+        """
+        gen = self._bump(name)
+        prev = self.sources.get(name)
+        src = VisionSource(name, url, cap, self.submit, self.emit, self.bridge,
+                           broadcasters=(prev.broadcaster, prev.raw_broadcaster) if prev else None,
+                           overlay_modes=self.overlay_modes)
+        self._configure(src, stride, tiling, record)
+        src.grabber.reopen, src.grabber.expires = reopen, expires
+        src.start()
+        if prev and not src.grabber.wait_first(warm_timeout):
+            metrics.inc("warm_swap_failed", source=name)
+            src.stop(); return None
+        with self._lock:
+            if self._gen.get(name) != gen: old, src = src, None    # dépassé pendant l'attente
+            else: old, self.sources[name] = self.sources.get(name), src
+        if old:
+            # Plus sélectionnée par _loop ; on laisse finir le tick en cours avant de l'arrêter
+            with self._busy: pass
+            old.stop()
+        if src is None: return None
+        if prev: metrics.inc("warm_swaps", source=name)
+        for sid in list(self.viewers): self.attach(sid, self.viewers[sid])
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        return src
+
+    def stop(self, name):
+        self._bump(name)
+        with self._lock:
+            src = self.sources.pop(name, None)
+        if src:
+            with self._busy: pass
+            src.stop()
+        for sid in list(self.viewers): self.attach(sid, self.viewers[sid])
+
+    # ── Clients ────────────────────────────────────────────────────────────────
+
+    def attach(self, sid, name=None):
+        """Associe un client web à une source (télémétrie et clics)."""
+        self.viewers[sid] = name
+        target = self.get(name)
+        for src in list(self.sources.values()):
+            if src is target:
+                src.telemetry.add_client(sid)
+            else: src.telemetry.remove_client(sid)
+        return target
+
+    def set_overlay(self, sid, mode):
+        """Mode overlay d'un client : n'affecte ni les autres clients ni la source."""
+        if mode in ("server", "client"): self.overlay_modes[sid] = mode
+
+    def detach(self, sid):
+        self.viewers.pop(sid, None)
+        self.overlay_modes.pop(sid, None)
+        for src in list(self.sources.values()): src.telemetry.remove_client(sid)
+
+    def source_of(self, sid):
+        return self.get(self.viewers.get(sid))
+
+    # ── Boucle d'inférence ─────────────────────────────────────────────────────
+
+    def _loop(self):
+        while True:
+            with self._busy:
+                with self._lock:
+                    ready = [(src, item) for src in self.sources.values() for item in [src.poll()] if item]
+                if ready:
+                    try: self._tick(ready)
+                    finally:
+                        # Références de lecture rendues à l'anneau (encodage et crops en file ont pris les leurs)
+                        for _, item in ready: item[3].release()
+            time.sleep(0.01 if ready else 0.005)
+
+    def _tick(self, ready):
+        # Un seul lot modelA pour les sources dont c'est le tour de détection :
+        # image réduite + éventuelles tuiles natives de la bande d'horizon
+        to_detect = [(src, item) for src, item in ready if src.due_for_detection()]
+        sw = metrics.stopwatch()
+        batch, plans = [], []
+        for src, item in to_detect:
+            proc_frame, scale = scale_for_processing(item[2])
+            tiles = src.tiler.plan(item[2], proc_frame) if src.tiler and scale != 1.0 else []
+            plans.append((proc_frame, scale, len(batch), tiles))
+            batch.append(proc_frame)
+            batch.extend(t for t, _ in tiles)
+        if batch: sw.lap("scale")
+        detector = self.get_detector()
+        c0 = time.thread_time()
+        try: dets = detect_batch(detector, batch)
+        except Exception: time.sleep(0.1); return
+        if batch and detector is not None:
+            sw.lap("detect")
+            # CPU du thread d'inférence, à comparer au decode_cpu des grabbers
+            metrics.observe("detect_cpu", time.thread_time() - c0)
+            metrics.inc("detect_images", len(batch))
+
+        for (src, item), (proc_frame, scale, k, tiles) in zip(to_detect, plans):
+            d = dets[k]
+            if tiles:
+                d = Detections(src.tiler.merge(d.data, [t.data for t in dets[k+1:k+1+len(tiles)]],
+                                               [o for _, o in tiles], scale))
+                sw.lap("tile_merge")
+            if not self._run(src, item, proc_frame, scale, d): continue
+            if detector is not None and src.first_annotated_s is None: src.mark_first_annotated()
+        # Les autres : propagation des boîtes, sans passer par le détecteur
+        for src, item in ready:
+            if any(src is s for s, _ in to_detect): continue
+            self._run(src, item, None, 1.0, None)
+
+    def _run(self, src, item, proc_frame, scale, dets):
+        # Échecs comptés et journalisés ; une source qui échoue à chaque image est arrêtée
+        try: src.process(item, proc_frame, scale, dets)
+        except Exception as e:
+            src.errors += 1
+            metrics.inc("process_errors", source=src.name)
+            if src.errors == 1: print(f"[{src.name}] Erreur de traitement : {e!r}")
+            if src.errors == SOURCE_MAX_ERRORS:
+                print(f"[{src.name}] {src.errors} images en échec consécutives, arrêt de la source")
+                src.emit('source_status', {"name": src.name, "state": "error", "error": f"traitement : {e!r}"})
+                # Hors du thread d'inférence : stop() attend la fin du tick en cours
+                threading.Thread(target=self._stop_failed, args=(src,), daemon=True).start()
+            return False
+        src.errors = 0
+        return True
+
+    def _stop_failed(self, src):
+        if self.sources.get(src.name) is src: self.stop(src.name)
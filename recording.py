@@ -0,0 +1,267 @@
+"""
+recording.py — Enregistrement et rejeu des sessions de détection.
+
+Le fichier (.vrec) est colonnaire et lu par memory-map :
+
+    "VREC" u32 version u32 taille_meta   meta JSON (colonnes : offset, dtype, forme)
+    frames     FRAME_DTYPE par image traitée (index : premières lignes et nombres)
+    det_box    f4 x4   boîtes en pixels de l'image d'origine (sortie tracker ou propagation)
+    det_tid    i4      id de piste
+    det_conf   f4      confiance modelA
+    det_cls    i2      classe modelA
+    vote_tid   i4      résultats B/C appliqués (calculés ou tirés du cache)
+    vote_cls   i2      indice dans CLASS_NAMES, -1 si rejeté par B
+    vote_conf  f4
+    vote_late  u1      1 = appliqué pendant la boucle des pistes (cache), 0 = en début d'image
+
+Chaque image connaît le début et le nombre de ses lignes : on accède à
+l'image i en O(1), sans parcourir le fichier. Pendant l'enregistrement les
+colonnes sont ajoutées à des fichiers temporaires, assemblés à la fermeture.
+
+Rejeu : les lignes enregistrées remplacent détection, tracking et
+classification ; filtre, physique, dessin, encodage et télémétrie tournent
+normalement, aussi vite que possible.
+
+Usage :
+    python recording.py replay session.vrec [--video essai.mp4] [--start 0] [--count 1000]
+"""
+
+import json
+import os
+import struct
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from config import CLASS_NAMES
+from native import threading, time
+
+MAGIC = b"VREC"
+VERSION = 1
+_HEAD = struct.Struct("<4sII")
+_ALIGN = 64
+
+FRAME_DTYPE = np.dtype([
+    ("seq",      "<u8"),    # n° d'image lue par le grabber (1 = première image de la source)
+    ("ts",       "<f8"),    # horodatage de capture
+    ("row0",     "<u8"), ("nrows",  "<u4"),
+    ("vote0",    "<u8"), ("nvotes", "<u4"),
+    ("detected", "u1"),     # 1 = passe modelA, 0 = boîtes propagées
+    ("w",        "<u2"), ("h", "<u2"),
+])
+
+COLUMNS = {
+    "det_box":   (np.dtype("<f4"), (4,)),
+    "det_tid":   (np.dtype("<i4"), ()),
+    "det_conf":  (np.dtype("<f4"), ()),
+    "det_cls":   (np.dtype("<i2"), ()),
+    "vote_tid":  (np.dtype("<i4"), ()),
+    "vote_cls":  (np.dtype("<i2"), ()),
+    "vote_conf": (np.dtype("<f4"), ()),
+    "vote_late": (np.dtype("u1"),  ()),
+}
+
+FrameRecord = namedtuple("FrameRecord", "index seq ts w h detected rows votes")
+
+
+class Recorder:
+    """
+    Écrit une session image par image.
+
+    Paramètres
+    ----------
+    path : str
+        Fichier .vrec final (créé à close()).
+    meta : dict, optionnel
+        Informations libres conservées dans l'en-tête (url, nom de la source...).
+    """
+
+    def __init__(self, path, meta=None):
+        self.path   = path
+        self.meta   = dict(meta or {}, created=time.time(), classes=CLASS_NAMES)
+        self.frames = 0
+        self.rows   = 0
+        self.votes  = 0
+        self._votes = []     # votes de l'image en cours
+        self._lock  = threading.Lock()
+        self._files = {name: open(f"{path}.{name}.tmp", "wb") for name in ["frames", *COLUMNS]}
+
+    def add_vote(self, tid, class_id, conf, late=False):
+        """Résultat B/C appliqué à une piste pendant l'image en cours (class_id -1 : rejeté)."""
+        self._votes.append((tid, class_id, conf, late))
+
+    def add_frame(self, seq, ts, shape, detected, rows):
+        """Termine l'image : `rows` = [(boîte, tid, conf, cls)] en pixels de l'image d'origine."""
+        with self._lock:
+            if self._files is not None: self._write_frame(seq, ts, shape, detected, rows)
+
+    def _write_frame(self, seq, ts, shape, detected, rows):
+        f = self._files
+        n, nv = len(rows), len(self._votes)
+        if n:
+            f["det_box"].write(np.asarray([r[0] for r in rows], dtype="<f4").reshape(n, 4).tobytes())
+            f["det_tid"].write(np.asarray([r[1] for r in rows], dtype="<i4").tobytes())
+            f["det_conf"].write(np.asarray([r[2] for r in rows], dtype="<f4").tobytes())
+            f["det_cls"].write(np.asarray([r[3] for r in rows], dtype="<i2").tobytes())
+        if nv:
+            tids, cls, confs, late = zip(*self._votes)
+            f["vote_tid"].write(np.asarray(tids, dtype="<i4").tobytes())
+            f["vote_cls"].write(np.asarray(cls, dtype="<i2").tobytes())
+            f["vote_conf"].write(np.asarray(confs, dtype="<f4").tobytes())
+            f["vote_late"].write(np.asarray(late, dtype="u1").tobytes())
+            self._votes = []
+        rec = np.array([(seq, ts, self.rows, n, self.votes, nv, detected, shape[1], shape[0])], dtype=FRAME_DTYPE)
+        f["frames"].write(rec.tobytes())
+        self.frames += 1; self.rows += n; self.votes += nv
+
+    def close(self):
+        """Assemble les colonnes dans le fichier final et supprime les temporaires."""
+        with self._lock:
+            if self._files is None: return
+            for fh in self._files.values(): fh.close()
+            self._files = None
+        counts = {"frames": self.frames, "vote_tid": self.votes, "vote_cls": self.votes,
+                  "vote_conf": self.votes, "vote_late": self.votes}
+        specs = {"frames": (FRAME_DTYPE, ())}
+        specs.update(COLUMNS)
+
+        cols, offset = {}, 0
+        for name, (dtype, shape) in specs.items():
+            n = counts.get(name, self.rows)
+            cols[name] = {"dtype": dtype.descr if dtype.names else dtype.str, "shape": [n, *shape], "offset": offset}
+            offset += -(-n * dtype.itemsize * int(np.prod(shape, dtype=int)) // _ALIGN) * _ALIGN
+        meta = dict(self.meta, frames=self.frames, rows=self.rows, votes=self.votes, columns=cols)
+        blob = json.dumps(meta).encode()
+        base = -(-(_HEAD.size + len(blob)) // _ALIGN) * _ALIGN
+
+        with open(self.path, "wb") as out:
+            out.write(_HEAD.pack(MAGIC, VERSION, len(blob)) + blob)
+            for name, col in cols.items():
+                out.seek(base + col["offset"])
+                with open(f"{self.path}.{name}.tmp", "rb") as fh:
+                    while chunk := fh.read(1 << 20): out.write(chunk)
+                os.remove(f"{self.path}.{name}.tmp")
+            out.truncate(base + offset)
+
+
+class Recording:
+    """Lecture par memory-map d'un fichier .vrec ; recording[i] ou frame(i) en O(1)."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic, version, n = _HEAD.unpack(f.read(_HEAD.size))
+            if magic != MAGIC: raise ValueError(f"{path} : pas un enregistrement .vrec")
+            self.meta = json.loads(f.read(n))
+        base = -(-(_HEAD.size + n) // _ALIGN) * _ALIGN
+        self.cols = {}
+        for name, col in self.meta["columns"].items():
+            dtype = np.dtype([tuple(d) for d in col["dtype"]]) if isinstance(col["dtype"], list) else np.dtype(col["dtype"])
+            shape = tuple(col["shape"])
+            self.cols[name] = (np.memmap(path, dtype=dtype, mode="r", offset=base + col["offset"], shape=shape)
+                               if shape[0] else np.empty(shape, dtype=dtype))
+        self.frames = self.cols["frames"]
+        self.class_names = self.meta.get("classes", CLASS_NAMES)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, i):
+        return self.frame(i)
+
+    def frame(self, i):
+        f = self.frames[i]
+        a, b = int(f["row0"]), int(f["row0"]) + int(f["nrows"])
+        c = self.cols
+        rows = list(zip(c["det_box"][a:b], c["det_tid"][a:b].tolist(), c["det_conf"][a:b].tolist(), c["det_cls"][a:b].tolist()))
+        a, b = int(f["vote0"]), int(f["vote0"]) + int(f["nvotes"])
+        votes = list(zip(c["vote_tid"][a:b].tolist(), c["vote_cls"][a:b].tolist(), c["vote_conf"][a:b].tolist(),
+                         c["vote_late"][a:b].astype(bool).tolist()))
+        return FrameRecord(i, int(f["seq"]), float(f["ts"]), int(f["w"]), int(f["h"]), bool(f["detected"]), rows, votes)
+
+    def index_of_seq(self, seq):
+        """Première image enregistrée dont le n° de capture est >= seq (recherche dichotomique)."""
+        return int(np.searchsorted(self.frames["seq"], seq))
+
+
+class ReplayFrames:
+    """
+    Images du rejeu : la vidéo d'origine si elle est fournie (même n° d'image),
+    sinon des images unies au format enregistré. Interface de cv2.VideoCapture.
+    """
+
+    def __init__(self, video=None):
+        self.cap  = cv2.VideoCapture(video) if video else None
+        self.pos  = 0
+        self._blank = {}
+
+    def _blank_frame(self, w, h):
+        blank = self._blank.get((w, h))
+        if blank is None: blank = self._blank[(w, h)] = np.full((h, w, 3), 40, dtype=np.uint8)
+        return blank.copy()
+
+    def frame_at(self, seq, w, h):
+        if self.cap is None: return self._blank_frame(w, h)
+        target = seq - 1
+        if target < self.pos or target - self.pos > 300:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, target); self.pos = target
+        while self.pos < target:
+            self.cap.grab(); self.pos += 1
+        ok, frame = self.cap.read()
+        self.pos += 1
+        return frame if ok else self._blank_frame(w, h)
+
+    def read(self):
+        return False, None
+
+    def get(self, prop):
+        return 0
+
+    def release(self):
+        if self.cap is not None: self.cap.release()
+
+
+def replay(path, source, frames=None, start=0, count=None):
+    """
+    Rejoue un enregistrement dans une VisionSource (sans inférence). Retourne les statistiques.
+
+    `source` est une VisionSource dont le grabber n'est pas démarré ; `frames`
+    fournit les images (ReplayFrames).
+    """
+    rec = Recording(path)
+    frames = frames or ReplayFrames()
+    stop = len(rec) if count is None else min(len(rec), start + count)
+    t0 = time.perf_counter()
+    for i in range(start, stop):
+        r = rec.frame(i)
+        source.process((r.seq, time.time(), frames.frame_at(r.seq, r.w, r.h)), None, 1.0, None, replay=r)
+    elapsed = time.perf_counter() - t0
+    n = stop - start
+    span = float(rec.frames["ts"][stop - 1] - rec.frames["ts"][start]) if n > 1 else 0.0
+    return {"frames": n, "elapsed_s": round(elapsed, 3), "fps": round(n / elapsed, 1) if elapsed else None,
+            "recorded_s": round(span, 2), "speedup": round(span / elapsed, 1) if elapsed and span else None}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from pipeline import VisionSource
+
+    parser = argparse.ArgumentParser(description="Rejeu d'une session enregistrée (.vrec)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("replay")
+    p.add_argument("path")
+    p.add_argument("--video", help="Vidéo d'origine (sinon images unies)")
+    p.add_argument("--start", type=int, default=0)
+    p.add_argument("--count", type=int)
+    p.add_argument("--overlay", choices=("server", "client"), default="server")
+    p.add_argument("--info", action="store_true", help="Affiche seulement l'en-tête")
+    args = parser.parse_args()
+
+    rec = Recording(args.path)
+    print(json.dumps({k: v for k, v in rec.meta.items() if k not in ("columns", "classes")}))
+    if not args.info:
+        frames = ReplayFrames(args.video)
+        src = VisionSource("replay", args.path, frames, lambda *a: None, lambda *a, **k: None)
+        src.overlay_mode = args.overlay
+        print(json.dumps(replay(args.path, src, frames, args.start, args.count)))
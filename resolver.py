@@ -0,0 +1,123 @@
+"""
+resolver.py — Résolution des URL de flux (YouTube...) en URL lisibles par OpenCV.
+
+yt_dlp fournit la liste des formats : on prend le plus petit format vidéo
+d'au moins PROC_MAX_WIDTH pixels de large (inutile de décoder du 1080p ou
+de la 4K pour la réduire aussitôt), en préférant H.264, moins coûteux à
+décoder. L'URL obtenue est mise en cache jusqu'à son expiration
+(paramètre `expire` des URL signées googlevideo, sinon STREAM_URL_TTL) ;
+open() sert aussi à rouvrir la capture quand le lien expire en cours de
+lecture.
+
+Les appels sont bloquants (réseau + analyse yt_dlp) : app.py les fait
+hors du hub (eventlet.tpool), le grabber les fait dans son propre thread.
+"""
+
+import re
+import time
+from collections import namedtuple
+
+from capture import open_capture
+from config import PROC_MAX_WIDTH, STREAM_URL_TTL, STREAM_URL_MARGIN
+from native import threading
+
+Resolved = namedtuple("Resolved", "url stream_url expires width height fps format_id cached")
+
+_EXPIRE = re.compile(r"[?&/]expire[=/](\d+)")
+_CODEC_RANK = {"avc1": 0, "h264": 0, "vp9": 1, "vp09": 1, "hev1": 2, "hvc1": 2, "av01": 3}
+_PROTOCOLS = ("http", "https", "m3u8", "m3u8_native")
+
+
+def codec_rank(fmt):
+    """0 = H.264 (décodage le moins coûteux) ... 3 = AV1 (pas toujours supporté par OpenCV)."""
+    return _CODEC_RANK.get((fmt.get("vcodec") or "").split(".")[0], 2)
+
+
+def pick_format(formats, min_width=PROC_MAX_WIDTH):
+    """
+    Plus petit format vidéo d'au moins `min_width` pixels de large.
+
+    À largeur égale : codec le plus simple à décoder, puis débit le plus
+    faible. Si aucun format n'est assez large, le plus large disponible.
+    Retourne le dict yt_dlp du format, ou None.
+    """
+    video = [f for f in formats if f.get("url") and f.get("vcodec") != "none" and f.get("width")
+             and f.get("protocol", "https") in _PROTOCOLS]
+    if not video: return None
+    wide = [f for f in video if f["width"] >= min_width]
+    if wide: return min(wide, key=lambda f: (f["width"], codec_rank(f), f.get("tbr") or 0))
+    return max(video, key=lambda f: (f["width"], -codec_rank(f)))
+
+
+def url_expiry(url):
+    """Expiration (timestamp) d'une URL signée, None si l'URL n'en porte pas."""
+    m = _EXPIRE.search(url)
+    return float(m.group(1)) if m else None
+
+
+class StreamResolver:
+    """
+    Cache URL de page -> URL de flux, valable jusqu'à expiration - `margin`.
+
+    Paramètres
+    ----------
+    min_width : int
+        Largeur minimale du format choisi (largeur de traitement).
+    ttl : float
+        Validité en cache d'une URL non signée (secondes).
+    margin : float
+        Secondes avant expiration où l'URL n'est plus servie depuis le cache.
+    """
+
+    def __init__(self, min_width: int = PROC_MAX_WIDTH, ttl: float = STREAM_URL_TTL,
+                 margin: float = STREAM_URL_MARGIN):
+        self.min_width = min_width
+        self.ttl       = ttl
+        self.margin    = margin
+        self._cache    = {}
+        self._lock     = threading.Lock()
+        self.hits      = 0
+        self.misses    = 0
+
+    def resolve(self, url, force: bool = False) -> Resolved:
+        """URL directement lisible par cv2.VideoCapture (URL d'origine si ce n'est pas une page web)."""
+        if not url or not url.startswith("http"): return Resolved(url, url, None, None, None, None, None, False)
+        now = time.time()
+        with self._lock:
+            res, until = self._cache.get(url, (None, 0))
+            if res and not force and until - self.margin > now:
+                self.hits += 1
+                return res._replace(cached=True)
+        self.misses += 1
+        res = self._extract(url)
+        with self._lock:
+            # Entrées expirées retirées à chaque nouvelle résolution
+            self._cache = {k: v for k, v in self._cache.items() if v[1] > now}
+            if res.stream_url != url: self._cache[url] = (res, res.expires or now + self.ttl)
+        return res
+
+    def _extract(self, url):
+        try:
+            import yt_dlp
+            with yt_dlp.YoutubeDL({"format": "bv*/b", "quiet": True, "no_warnings": True}) as ydl:
+                info = ydl.extract_info(url, download=False)
+        except Exception as e:
+            # Pas une page connue de yt_dlp (flux direct, caméra IP) : URL telle quelle
+            print(f"[SOURCE] yt_dlp : {e}")
+            return Resolved(url, url, url_expiry(url), None, None, None, None, False)
+        fmt = pick_format(info.get("formats") or [info], self.min_width) or info
+        stream = fmt.get("url") or info.get("url") or url
+        print(f"[SOURCE] Format {fmt.get('format_id')} {fmt.get('width')}x{fmt.get('height')} {fmt.get('vcodec')}")
+        return Resolved(url, stream, url_expiry(stream), fmt.get("width"), fmt.get("height"),
+                        fmt.get("fps"), fmt.get("format_id"), False)
+
+    def open(self, url, force: bool = False):
+        """Résout puis ouvre la capture. Retourne (cap, expiration ou None)."""
+        res = self.resolve(url, force)
+        return open_capture(res.stream_url if res.stream_url else 0), res.expires
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {"hits": self.hits, "misses": self.misses,
+                "cached": {k: {"format": v.format_id, "size": f"{v.width}x{v.height}", "valid_s": round(until - now),
+                               "signed": v.expires is not None} for k, (v, until) in list(self._cache.items())}}
@@ -0,0 +1,136 @@
+"""
+scheduler.py — Planification adaptative des classifications B/C.
+
+Une piste n'est reclassifiée que si c'est utile : tant que ses votes sont
+confirmés et concordants, l'intervalle entre deux classifications double
+(jusqu'à CLASSIFY_MAX_INTERVAL images). Il revient à CLASSIFY_INTERVAL dès
+que la hauteur de la boîte ou l'apparence du crop change nettement
+(empreinte perceptuelle dHash 64 bits). Un petit cache LRU associe les
+empreintes aux résultats déjà obtenus pour éviter de recalculer un crop
+quasi identique.
+"""
+
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from config import (CLASSIFY_INTERVAL, CLASSIFY_MAX_INTERVAL, CLASSIFY_SIZE_CHANGE, CLASSIFY_HASH_CHANGE,
+                    CLASSIFY_CACHE_SIZE, CLASSIFY_CACHE_DIST)
+
+_BITS = 1 << np.arange(64, dtype=np.uint64)
+
+
+def dhash(img, size=8):
+    """Empreinte dHash (int 64 bits) : signe du gradient horizontal d'une vignette 9x8 en niveaux de gris."""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(_BITS[bits].sum())
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class AppearanceCache:
+    """
+    Cache LRU empreinte -> résultat de classification.
+
+    Paramètres
+    ----------
+    capacity : int
+        Nombre maximal d'empreintes conservées.
+    max_dist : int
+        Distance de Hamming maximale pour qu'une empreinte voisine soit un succès.
+    """
+
+    def __init__(self, capacity: int = CLASSIFY_CACHE_SIZE, max_dist: int = CLASSIFY_CACHE_DIST):
+        self.capacity = capacity
+        self.max_dist = max_dist
+        self._items   = OrderedDict()
+        self.hits     = 0
+        self.misses   = 0
+
+    def get(self, h):
+        """Retourne (trouvé, résultat) ; le résultat peut être None (crop rejeté par B)."""
+        key = h if h in self._items else next((k for k in self._items if hamming(k, h) <= self.max_dist), None)
+        if key is None:
+            self.misses += 1
+            return False, None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return True, self._items[key]
+
+    def put(self, h, result):
+        self._items[h] = result
+        self._items.move_to_end(h)
+        while len(self._items) > self.capacity: self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ClassifyScheduler:
+    """
+    Décide, par piste, s'il faut classifier le crop, réutiliser un résultat ou attendre.
+
+    L'état par piste (intervalle courant, empreinte et hauteur de boîte à la
+    dernière classification) vit dans les colonnes cl_* du TrackStore.
+    """
+
+    def __init__(self, base: int = CLASSIFY_INTERVAL, max_interval: int = CLASSIFY_MAX_INTERVAL,
+                 size_change: float = CLASSIFY_SIZE_CHANGE, hash_change: int = CLASSIFY_HASH_CHANGE,
+                 cache: AppearanceCache = None):
+        self.base         = base
+        self.max_interval = max(base, max_interval)
+        self.size_change  = size_change
+        self.hash_change  = hash_change
+        self.cache        = cache or AppearanceCache()
+        self.submitted    = 0
+        self.skipped      = 0
+        self.started      = time.time()
+
+    def decide(self, tracks, s, frame_idx, crop):
+        """
+        Retourne None (rien à faire), ("cached", résultat) ou ("submit", None).
+
+        `frame_idx` est le compteur d'images de la source ; `crop` la zone de la
+        boîte dans l'image d'origine (vue, non copiée).
+        """
+        since = frame_idx - tracks.last_cl[s]
+        if since <= self.base or not crop.size: return None
+
+        h = dhash(crop)
+        height = crop.shape[0]
+        ref_h = tracks.cl_h[s]
+        changed = ref_h > 0 and (abs(height - ref_h) > self.size_change * ref_h
+                                 or hamming(h, int(tracks.cl_hash[s])) > self.hash_change)
+        if changed: tracks.cl_interval[s] = self.base
+        elif since <= max(self.base, tracks.cl_interval[s]):
+            # Piste stable, résultat encore récent : on attend
+            self.skipped += 1
+            return None
+
+        tracks.last_cl[s] = frame_idx
+        tracks.cl_hash[s] = h
+        tracks.cl_h[s] = height
+        found, result = self.cache.get(h)
+        if found: return ("cached", result)
+        self.submitted += 1
+        return ("submit", None)
+
+    def record(self, tracks, s, result, min_confirm, cache=True):
+        """Applique un résultat (calculé ou en cache) : vote, mise en cache et ajustement de l'intervalle."""
+        if cache: self.cache.put(int(tracks.cl_hash[s]), result)
+        if result: tracks.add_vote(s, result['name'], result['conf'], min_confirm)
+        confirmed = tracks.confirmed_id[s]
+        agrees = result is not None and confirmed >= 0 and tracks.class_names[confirmed] == result['name']
+        # Votes confirmés et concordants : on espace ; sinon retour à la cadence de base
+        tracks.cl_interval[s] = min(self.max_interval, max(self.base, tracks.cl_interval[s]) * 2) if agrees else self.base
+
+    def stats(self) -> dict:
+        minutes = max(1e-3, (time.time() - self.started) / 60)
+        return {"submitted": self.submitted, "cache_hits": self.cache.hits, "skipped": self.skipped,
+                "calls_per_min": round(self.submitted / minutes, 1), "cache_size": len(self.cache)}
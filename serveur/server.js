@@ -15,6 +15,26 @@ const httpServer = http.createServer((req, res) => {
 const wss      = new WebSocketServer({ server: httpServer });
 let jetson     = null;
 const browsers = new Set();
+const binaryOk = new WeakSet();   // navigateurs qui acceptent les trames binaires
+
+// Trame image binaire (client/jetson_comm.py) :
+// "JC" u8 version u8 type u8 format u8 réservé u32 seq f64 horodatage, big-endian
+const FRAME_HEADER  = 18;
+const FRAME_VERSION = 1;
+const MSG_IMAGE     = 1;
+const FORMAT_NAMES  = ["jpeg", "png", "webp", "bmp"];
+
+function parseFrame(buf) {
+  if (buf.length < FRAME_HEADER || buf.toString("latin1", 0, 2) !== "JC" || buf[2] !== FRAME_VERSION) return null;
+  if (buf[3] !== MSG_IMAGE) return null;   // seul type défini : les autres ne sont pas relayés comme images
+  return { type: buf[3], fmt: FORMAT_NAMES[buf[4]] || "jpeg", seq: buf.readUInt32BE(6), ts: buf.readDoubleBE(10) };
+}
+
+// Pour les pages sans support binaire : même message qu'avant, en JSON base64 (encodé une fois)
+function frameToJson(buf, head) {
+  return JSON.stringify({ type: "image", fmt: head.fmt, seq: head.seq, ts: head.ts,
+                          data: buf.toString("base64", FRAME_HEADER) });
+}
 
 function broadcastJetsonStatus(connected) {
   const msg = JSON.stringify({ type: "jetson_status", connected });
@@ -32,10 +52,24 @@ wss.on("connection", (ws, req) => {
 
     if (msg.role === "jetson") {
       jetson = ws;
-      console.log("[+] Jetson connectée");
+      console.log(`[+] Jetson connectée (images ${msg.binary ? "binaires" : "JSON"})`);
+      if (msg.binary) ws.send(JSON.stringify({ type: "hello", binary: true }));   // négociation acceptée
       broadcastJetsonStatus(true);   // ← signaler aux navigateurs
 
-      ws.on("message", (data) => {
+      ws.on("message", (data, isBinary) => {
+        if (isBinary) {
+          // Relais sans décodage ; conversion JSON seulement si une page ancienne est connectée
+          const head = parseFrame(data);
+          if (!head) { console.log(`[JETSON MSG] trame binaire invalide ou de type inconnu (${data.length} octets)`); return; }
+          console.log(`[JETSON IMG] #${head.seq} ${head.fmt} ${data.length - FRAME_HEADER} octets`);
+          let json = null;
+          for (const b of browsers) {
+            if (b.readyState !== 1) continue;
+            if (binaryOk.has(b)) b.send(data, { binary: true });
+            else b.send(json ??= frameToJson(data, head));
+          }
+          return;
+        }
         const str = data.toString();
         console.log(`[JETSON MSG] ${str.substring(0, 120)}`);
         for (const b of browsers) {
@@ -51,7 +85,8 @@ wss.on("connection", (ws, req) => {
 
     } else if (msg.role === "browser") {
       browsers.add(ws);
-      console.log(`[+] Navigateur connecté (total: ${browsers.size})`);
+      if (msg.binary) binaryOk.add(ws);
+      console.log(`[+] Navigateur connecté (total: ${browsers.size}${msg.binary ? ", binaire" : ""})`);
 
       // Envoyer immédiatement le statut courant de la Jetson
       ws.send(JSON.stringify({ type: "jetson_status", connected: jetson !== null }));
@@ -0,0 +1,68 @@
+"""
+streaming.py — Diffusion MJPEG « encode once, fan-out ».
+
+Chaque image JPEG est encadrée une seule fois en morceau multipart puis
+partagée par tous les clients de /video_feed. Un client ne reçoit une image
+que lorsqu'une nouvelle version existe ; un client lent saute directement à
+la plus récente au lieu d'accumuler un retard.
+"""
+
+import itertools
+import threading
+import time
+
+
+class FrameBroadcaster:
+    """
+    Dernière image encodée + compteur de version, partagés entre clients.
+
+    Paramètres
+    ----------
+    boundary : bytes
+        Délimiteur multipart (doit correspondre au mimetype de la route).
+    """
+
+    def __init__(self, boundary: bytes = b"frame"):
+        self.boundary  = boundary
+        self.version   = 0
+        self._chunk    = None
+        self._cond     = threading.Condition()
+        self._clients  = {}
+        self._ids      = itertools.count(1)
+
+    def publish(self, jpeg: bytes):
+        """Publie une nouvelle image JPEG et réveille les clients en attente."""
+        # Une seule copie du JPEG (join), partagée par tous les clients : le serveur
+        # WSGI regroupe de toute façon les petits morceaux avant écriture
+        head = b"--%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % (self.boundary, len(jpeg))
+        chunk = b"".join((head, jpeg, b"\r\n"))
+        with self._cond:
+            self._chunk = chunk
+            self.version += 1
+            self._cond.notify_all()
+
+    def stream(self, addr=None, timeout: float = 1.0):
+        """Générateur multipart pour un client ; s'arrête quand le client se déconnecte."""
+        cid = next(self._ids)
+        st = self._clients[cid] = {"addr": addr, "since": time.time(), "delivered": 0, "skipped": 0}
+        last = 0
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self.version > last, timeout)
+                    if self.version == last: continue
+                    # Versions publiées pendant l'envoi précédent : sautées, pas mises en file
+                    if last: st["skipped"] += self.version - last - 1
+                    last, chunk = self.version, self._chunk
+                yield chunk
+                st["delivered"] += 1
+        finally:
+            self._clients.pop(cid, None)
+
+    @property
+    def clients(self) -> int:
+        return len(self._clients)
+
+    def stats(self) -> dict:
+        return {"version": self.version,
+                "clients": [dict(id=cid, **st) for cid, st in list(self._clients.items())]}
@@ -0,0 +1,154 @@
+"""
+telemetry.py — Canal 'update' compact : binaire, différentiel et limité en débit.
+
+Chaque message est un buffer little-endian :
+
+    en-tête (28 octets)   magic 'T', version, flags, -, seq u32, target_id i32,
+                          fps u16 (x10), latency_ms u16, encode_ms u16 (x10),
+                          n_upd u16, n_rem u16, -, dropped u32
+    n_upd x REC_DTYPE     pistes ajoutées ou modifiées depuis le dernier envoi
+    n_rem x u32           tid des pistes disparues
+
+Distances (dist, dist_sd) en u32 décimètres, jusqu'à ~429 000 km : le modèle
+de hauteur de bateau (FOCAL_PX, boîtes de quelques pixels) dépasse
+largement les 6,5 km d'un u16 et une valeur saturée serait indiscernable.
+Vitesses u16 centièmes de noeud (655 kt), caps u16 centièmes de degré.
+
+Les classes sont transmises par id (noms et couleurs envoyés une seule fois
+via 'telemetry_meta'). Chaque client a son propre débit maximal et son propre
+état « dernier envoyé » ; une image complète (keyframe) est renvoyée
+périodiquement. Le décodage se fait dans templates/script.js.
+"""
+
+import struct
+import time
+
+import numpy as np
+
+from config import TELEMETRY_MAX_HZ, TELEMETRY_KEYFRAME_S
+
+VERSION = 3
+FLAG_KEYFRAME = 1
+FLAG_CLIENT_OVERLAY = 2
+
+HEADER = struct.Struct("<BBBBIiHHHHHHI")
+
+# Grandeurs quantifiées : une piste n'est renvoyée que si sa version quantifiée change
+REC_DTYPE = np.dtype([
+    ("tid",     "<u4"),
+    ("cls",     "<i2"),
+    ("heading", "<u2"),     # degrés x100
+    ("dist",    "<u4"),     # mètres x10
+    ("speed",   "<u2"),     # noeuds x100
+    ("azimuth", "<i2"),     # facteur -1..1 x10000
+    ("conf",    "<u2"),     # x10000
+    ("box",     "<u2", 4),  # boîte normalisée x65535
+    ("dist_sd", "<u4"),     # écarts-types du filtre de Kalman : mètres x10,
+    ("speed_sd", "<u2"),    # noeuds x100,
+    ("heading_sd", "<u2"),  # degrés x100
+])
+
+
+def _q(values, scale, lo, hi):
+    return np.clip(np.rint(np.nan_to_num(values) * scale), lo, hi)
+
+
+def pack_tracks(store):
+    """Enregistrements binaires des pistes actives d'un TrackStore."""
+    sl = store.active_slots()
+    rec = np.zeros(sl.size, dtype=REC_DTYPE)
+    if not sl.size: return rec
+    confirmed = store.confirmed_id[sl] >= 0
+    rec["tid"]     = store.tid[sl]
+    rec["cls"]     = np.where(confirmed, store.confirmed_id[sl], store.class_id[sl])
+    rec["heading"] = _q(store.heading[sl], 100, 0, 35999)
+    rec["dist"]    = _q(store.dist[sl], 10, 0, 2**32 - 1)
+    rec["speed"]   = _q(store.speed[sl], 100, 0, 65535)
+    rec["azimuth"] = _q(store.azimuth[sl], 10000, -32767, 32767)
+    rec["conf"]    = _q(np.where(confirmed, store.confirmed_conf[sl], store.conf[sl]), 10000, 0, 10000)
+    rec["box"]     = _q(store.box[sl], 65535, 0, 65535)
+    rec["dist_sd"]    = _q(store.dist_sd[sl], 10, 0, 2**32 - 1)
+    rec["speed_sd"]   = _q(store.speed_sd[sl], 100, 0, 65535)
+    rec["heading_sd"] = _q(store.heading_sd[sl], 100, 0, 18000)
+    return rec
+
+
+class TelemetryEncoder:
+    """
+    État différentiel et limitation de débit par client (sid socket.io).
+
+    Paramètres
+    ----------
+    max_hz : float
+        Débit maximal par client (messages/s) ; un client peut demander moins.
+    keyframe_s : float
+        Période d'envoi de l'état complet.
+    """
+
+    def __init__(self, max_hz: float = TELEMETRY_MAX_HZ, keyframe_s: float = TELEMETRY_KEYFRAME_S):
+        self.max_hz     = max_hz
+        self.keyframe_s = keyframe_s
+        self._clients   = {}
+
+    def add_client(self, sid, max_hz=None):
+        if sid in self._clients: return
+        self._clients[sid] = {"period": 1.0 / self.max_hz, "last_t": 0.0, "last_key": 0.0, "sent": {},
+                              "seq": 0, "messages": 0, "bytes": 0, "since": time.time()}
+        if max_hz: self.set_rate(sid, max_hz)
+
+    def remove_client(self, sid):
+        self._clients.pop(sid, None)
+
+    def set_rate(self, sid, max_hz):
+        st = self._clients.get(sid)
+        if st and max_hz > 0: st["period"] = 1.0 / min(float(max_hz), self.max_hz)
+
+    def encode_all(self, records, target_id=None, fps=0.0, latency_ms=0, encode_ms=0.0,
+                   dropped=0, client_overlay=(), now=None):
+        """
+        Produit (sid, payload) pour chaque client dont la période est écoulée.
+
+        `records` est le résultat de pack_tracks() pour l'image courante ;
+        `client_overlay` : sids qui dessinent eux-mêmes les overlays (flag par client).
+        Ces clients ne sont pas limités en débit : chaque image traitée, donc chaque
+        image du flux brut, reçoit ses boîtes. La synchronisation reste approximative :
+        le flux MJPEG ne porte pas de numéro d'image et le client dessine les
+        dernières boîtes reçues sur l'image affichée (décalage d'une image au plus,
+        selon les latences respectives du flux et du socket).
+        """
+        now = time.time() if now is None else now
+        if not self._clients: return []
+        size = REC_DTYPE.itemsize
+        raw = records.tobytes()
+        rows = {tid: raw[i*size:(i+1)*size] for i, tid in enumerate(records["tid"].tolist())}
+        out = []
+        for sid, st in list(self._clients.items()):
+            own = sid in client_overlay
+            if not own and now - st["last_t"] < st["period"]: continue
+            keyframe = now - st["last_key"] >= self.keyframe_s
+            sent = {} if keyframe else st["sent"]
+            upd = [r for tid, r in rows.items() if sent.get(tid) != r]
+            rem = [tid for tid in sent if tid not in rows]
+
+            flags = (FLAG_KEYFRAME if keyframe else 0) | (FLAG_CLIENT_OVERLAY if own else 0)
+            st["seq"] += 1
+            head = HEADER.pack(0x54, VERSION, flags, 0, st["seq"] & 0xFFFFFFFF,
+                               -1 if target_id is None else int(target_id),
+                               min(int(fps * 10), 65535), min(int(latency_ms), 65535),
+                               min(int(encode_ms * 10), 65535), len(upd), len(rem), 0,
+                               int(dropped) & 0xFFFFFFFF)
+            payload = head + b"".join(upd) + np.asarray(rem, dtype="<u4").tobytes()
+
+            st["sent"] = rows
+            st["last_t"] = now
+            if keyframe: st["last_key"] = now
+            st["messages"] += 1
+            st["bytes"] += len(payload)
+            out.append((sid, payload))
+        return out
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {sid: {"hz": round(1.0 / st["period"], 1), "messages": st["messages"], "bytes": st["bytes"],
+                      "bytes_per_s": round(st["bytes"] / max(1e-3, now - st["since"]))}
+                for sid, st in list(self._clients.items())}
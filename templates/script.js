@@ -46,6 +46,16 @@ const allOptions = ['ID', 'Classe', 'Distance', 'Vitesse', 'Cap', 'Conf'];
 const defaults = { 'Classe': true, 'ID': false, 'Distance': false, 'Vitesse': false, 'Cap': false, 'Conf': false };
 const boxContainer = document.getElementById('checkboxes');
 
+// Options propres à CE navigateur (utilisées en mode overlay "client")
+const overlayOptions = Object.assign({}, defaults);
+let clientOverlay = false;
+
+function toggleOption(opt, checked) {
+    overlayOptions[opt] = checked;
+    // En mode "client" le choix reste local, sans effet sur les autres opérateurs
+    if (!clientOverlay) socket.emit('toggle', { key: opt, value: checked });
+}
+
 allOptions.forEach(opt => {
     const div = document.createElement('div');
     div.className = 'chk-item';
@@ -55,9 +65,7 @@ allOptions.forEach(opt => {
     input.id = 'chk-' + opt;
     if(defaults[opt]) input.checked = true;
     
-    input.addEventListener('change', () => {
-        socket.emit('toggle', { key: opt });
-    });
+    input.addEventListener('change', () => toggleOption(opt, input.checked));
 
     const lbl = document.createElement('label');
     lbl.htmlFor = 'chk-' + opt;
@@ -66,7 +74,7 @@ allOptions.forEach(opt => {
     div.onclick = (e) => {
         if(e.target !== input) {
             input.checked = !input.checked;
-            socket.emit('toggle', { key: opt });
+            toggleOption(opt, input.checked);
         }
     };
 
@@ -75,12 +83,144 @@ allOptions.forEach(opt => {
     boxContainer.appendChild(div);
 });
 
+// --- MODE OVERLAY (serveur = incrusté dans le JPEG / client = dessiné ici) ---
+// Choix propre à ce navigateur : il lit le flux brut ou le flux annoté, les autres ne sont pas touchés
+const chkClientOverlay = document.getElementById('chk-client-overlay');
+let currentSource = null;
+
+function feedUrl(name) {
+    return '/video_feed' + (name ? '/' + encodeURIComponent(name) : '')
+         + '?overlay=' + (clientOverlay ? 'client' : 'server') + '&t=' + Date.now();
+}
+
+function setClientOverlay(on) {
+    clientOverlay = on;
+    // Retour au flux annoté : il doit refléter les cases cochées ici pendant le mode client
+    if (!on) allOptions.forEach(opt => socket.emit('toggle', { key: opt, value: overlayOptions[opt] }));
+    socket.emit('overlay_mode', { mode: on ? 'client' : 'server' });
+    videoImg.src = feedUrl(currentSource);
+}
+chkClientOverlay.addEventListener('change', () => setClientOverlay(chkClientOverlay.checked));
+socket.on('connect', () => { if (chkClientOverlay.checked) setClientOverlay(true); });
+
+// --- PANNEAU DEBUG (quantiles des étapes du pipeline, /metrics.json) ---
+const chkDebug = document.getElementById('chk-debug');
+const debugPanel = document.getElementById('debug-panel');
+let debugTimer = null;
+
+function refreshDebug() {
+    fetch('/metrics.json').then(r => r.json()).then(m => {
+        let html = "<table><tr><th>Étape</th><th>p50</th><th>p95</th><th>p99</th></tr>";
+        for (const [source, stages] of Object.entries(m)) {
+            html += `<tr><th colspan="4">${source}</th></tr>`;
+            for (const [stage, q] of Object.entries(stages))
+                html += `<tr><td>${stage}</td><td>${q.p50_ms}</td><td>${q.p95_ms}</td><td>${q.p99_ms}</td></tr>`;
+        }
+        debugPanel.innerHTML = html + "</table>";
+    }).catch(() => {});
+}
+
+chkDebug.addEventListener('change', () => {
+    debugPanel.style.display = chkDebug.checked ? 'block' : 'none';
+    clearInterval(debugTimer);
+    if (chkDebug.checked) { refreshDebug(); debugTimer = setInterval(refreshDebug, 1000); }
+});
+
+const overlayCanvas = document.getElementById('overlay');
+const octx = overlayCanvas.getContext('2d');
+
+function drawOverlay(tracks, targetId) {
+    // Canvas calé sur la zone affichée de l'image
+    const r = videoImg.getBoundingClientRect();
+    const c = overlayCanvas.parentElement.getBoundingClientRect();
+    overlayCanvas.style.left = (r.left - c.left) + 'px';
+    overlayCanvas.style.top = (r.top - c.top) + 'px';
+    const w = Math.round(r.width), h = Math.round(r.height);
+    if (overlayCanvas.width !== w || overlayCanvas.height !== h) {
+        overlayCanvas.width = w; overlayCanvas.height = h;
+    }
+    octx.clearRect(0, 0, w, h);
+    if (!clientOverlay) return;
+
+    octx.font = '12px Courier New';
+    for (const [tid, t] of Object.entries(tracks)) {
+        if (!t.box) continue;
+        const x1 = t.box[0] * w, y1 = t.box[1] * h;
+        const x2 = t.box[2] * w, y2 = t.box[3] * h;
+        const color = t.color_hex || '#c8c800';
+
+        octx.strokeStyle = color;
+        octx.lineWidth = String(tid) === String(targetId) ? 4 : 1.5;
+        octx.strokeRect(x1, y1, x2 - x1, y2 - y1);
+
+        let txt = "";
+        if (overlayOptions['ID']) txt += `ID:${tid} `;
+        if (overlayOptions['Classe']) txt += `${t.name} `;
+        if (overlayOptions['Distance']) txt += `${Math.round(t.distance)}m `;
+        if (overlayOptions['Vitesse']) txt += `${t.speed.toFixed(1)}kt `;
+        if (overlayOptions['Cap']) txt += `${Math.round(t.heading)}° `;
+        if (overlayOptions['Conf'] && t.conf !== undefined) txt += `${t.conf.toFixed(2)}`;
+        txt = txt.trim();
+
+        if (txt) {
+            const tw = octx.measureText(txt).width;
+            octx.fillStyle = color;
+            octx.fillRect(x1, y1 - 16, tw + 6, 16);
+            octx.fillStyle = '#fff';
+            octx.fillText(txt, x1 + 3, y1 - 4);
+        }
+    }
+}
+
 // --- COMMANDES ---
+const srcName = document.getElementById('srcName');
+const srcSelect = document.getElementById('srcSelect');
+
+function showSource(name) {
+    // Change le flux vidéo affiché et la télémétrie reçue
+    socket.emit('select_source', { name: name });
+    currentSource = name;
+    videoImg.src = feedUrl(name);
+    trackMap.clear();
+}
+
+let pendingStart = null;
 document.getElementById('btnStart').onclick = () => {
-    socket.emit('start', { url: document.getElementById('url').value });
+    const name = srcName.value.trim() || 'main';
+    socket.emit('start', { url: document.getElementById('url').value, name: name });
     statusLine.textContent = "Démarrage...";
+    pendingStart = name;
 };
-document.getElementById('btnStop').onclick = () => socket.emit('stop', {});
+
+// Progression du démarrage (résolution du lien, ouverture, réouverture après expiration)
+const SOURCE_STATES = { resolving: "Résolution du lien...", opening: "Ouverture du flux...", running: "En cours",
+                        reopening: "Lien expiré, réouverture...", error: "Erreur" };
+socket.on('source_status', st => {
+    let txt = `[${st.name}] ${SOURCE_STATES[st.state] || st.state}`;
+    if (st.width) txt += ` (${st.width}x${st.height}${st.cached ? ', cache' : ''})`;
+    if (st.reused) txt += " (capture réutilisée)";
+    if (st.error) txt += ` : ${st.error}`;
+    statusLine.textContent = txt;
+    if (st.state === 'running' && st.name === pendingStart) {
+        pendingStart = null;
+        srcSelect.value = st.name; showSource(st.name);
+    }
+});
+document.getElementById('btnStop').onclick = () => socket.emit('stop', { name: srcSelect.value });
+
+srcSelect.onchange = () => showSource(srcSelect.value);
+
+socket.on('sources', m => {
+    const current = srcSelect.value;
+    srcSelect.innerHTML = '';
+    m.names.forEach(n => {
+        const opt = document.createElement('option');
+        opt.value = n; opt.textContent = n;
+        srcSelect.appendChild(opt);
+    });
+    if (m.names.includes(current)) srcSelect.value = current;
+    else if (m.names.length) showSource(srcSelect.value);
+});
 
 // --- RADAR LOGIC ---
 let radarZoom = 1.0;
@@ -153,9 +293,72 @@ function drawRadar(tracks, targetId) {
     }
 }
 
+// --- TELEMETRIE BINAIRE (voir telemetry.py pour le format) ---
+let classNames = [], classColors = [];
+const trackMap = new Map();
+const TELEMETRY_VERSION = 3, HEADER_SIZE = 28, REC_SIZE = 34;   // telemetry.py REC_DTYPE
+
+socket.on('telemetry_meta', m => { classNames = m.classes; classColors = m.colors; });
+
+function decodeUpdate(buf) {
+    const dv = new DataView(buf);
+    if (dv.getUint8(0) !== 0x54 || dv.getUint8(1) !== TELEMETRY_VERSION) return null;
+    const flags = dv.getUint8(2);
+    const target = dv.getInt32(8, true);
+    const nUpd = dv.getUint16(18, true), nRem = dv.getUint16(20, true);
+
+    // Keyframe : état complet, on repart de zéro
+    if (flags & 1) trackMap.clear();
+
+    let o = HEADER_SIZE;
+    for (let i = 0; i < nUpd; i++, o += REC_SIZE) {
+        const cls = dv.getInt16(o + 4, true);
+        trackMap.set(dv.getUint32(o, true), {
+            name: cls >= 0 ? (classNames[cls] || String(cls)) : 'Inconnu',
+            color_hex: cls >= 0 ? classColors[cls] : null,
+            heading: dv.getUint16(o + 6, true) / 100,
+            distance: dv.getUint32(o + 8, true) / 10,
+            speed: dv.getUint16(o + 12, true) / 100,
+            azimuth_factor: dv.getInt16(o + 14, true) / 10000,
+            conf: dv.getUint16(o + 16, true) / 10000,
+            box: [0, 2, 4, 6].map(k => dv.getUint16(o + 18 + k, true) / 65535),
+            distance_sd: dv.getUint32(o + 26, true) / 10,
+            speed_sd: dv.getUint16(o + 30, true) / 100,
+            heading_sd: dv.getUint16(o + 32, true) / 100,
+        });
+    }
+    for (let i = 0; i < nRem; i++, o += 4) trackMap.delete(dv.getUint32(o, true));
+
+    return {
+        tracks: Object.fromEntries(trackMap),
+        target_id: target >= 0 ? target : null,
+        overlay_mode: (flags & 2) ? 'client' : 'server',
+        fps: (dv.getUint16(12, true) / 10).toFixed(1),
+        latency_ms: dv.getUint16(14, true),
+        encode_ms: (dv.getUint16(16, true) / 10).toFixed(1),
+        dropped: dv.getUint32(24, true),
+    };
+}
+
+// --- ÉTAT DES MODÈLES (chargement / préchauffage en arrière-plan) ---
+const modelsState = document.getElementById('models-state');
+socket.on('readiness', st => {
+    if (st.ready) {
+        modelsState.textContent = `PRÊT (${st.ready_s}s)`;
+        modelsState.style.color = Object.keys(st.errors).length ? '#f80' : '#0f0';
+        modelsState.title = Object.entries(st.backends).map(([k, b]) => `${k}: ${b}`).join(' | ');
+    } else {
+        modelsState.textContent = Object.entries(st.models).map(([k, s]) => `${k}:${s}`).join(' ');
+        modelsState.style.color = '#ff0';
+    }
+});
+socket.on('source_ready', d => console.log(`[${d.name}] 1re image ${d.first_frame_s}s, 1re image annotée ${d.first_annotated_s}s`));
+
 // --- SOCKET UPDATE ---
-socket.on('update', d => {
-    statusLine.textContent = `FPS: ${d.fps}`;
+socket.on('update', buf => {
+    const d = decodeUpdate(buf);
+    if (!d) return;
+    statusLine.textContent = `FPS: ${d.fps} | LAT: ${d.latency_ms}ms | DROP: ${d.dropped} | JPEG: ${d.encode_ms}ms`;
 
     const tracks = d.tracks || {};
     let html = "";
@@ -178,7 +381,8 @@ socket.on('update', d => {
         const rowColor = isMilitary ? '#ff0000' : (isTgt ? '#ff3333' : '#0aff0a'); 
         const fontWeight = isTgt || isMilitary ? 'bold' : 'normal';
 
-        html += `<div class="track-row" style="color:${rowColor}; font-weight:${fontWeight};">
+        const sd = `±${Math.round(t.distance_sd)}m | ±${t.speed_sd.toFixed(1)}kt | cap ${Math.round(t.heading)}° ±${Math.round(t.heading_sd)}°`;
+        html += `<div class="track-row" title="${sd}" style="color:${rowColor}; font-weight:${fontWeight};">
             <span>${id}</span>
             <span>${t.name.slice(0,9)}</span>
             <span>${Math.round(t.distance)}m</span>
@@ -189,4 +393,7 @@ socket.on('update', d => {
     
     // Mise à jour du radar
     drawRadar(tracks, d.target_id);
+
+    // Overlays côté navigateur (mode choisi localement, pas repris de la télémétrie)
+    drawOverlay(tracks, d.target_id);
 });
\ No newline at end of file
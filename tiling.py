@@ -0,0 +1,125 @@
+"""
+tiling.py — Inférence par tuiles dans la bande d'horizon.
+
+Les navires lointains se trouvent près de l'horizon et ne font que quelques
+pixels une fois l'image réduite à PROC_MAX_WIDTH. Plutôt que d'agrandir toute
+l'image, on découpe une bande horizontale autour de l'horizon (détecté ou
+configuré) en tuiles qui se chevauchent, traitées à la résolution native, en
+plus de la passe habituelle sur l'image réduite. Les détections des tuiles
+sont ramenées en coordonnées globales puis fusionnées par NMS.
+"""
+
+import math
+
+import cv2
+import numpy as np
+
+from config import TILE_SIZE, TILE_OVERLAP, TILE_BAND_HEIGHT, TILE_BAND, TILE_NMS_IOU
+
+
+def find_horizon(frame, width=256):
+    """Ligne (fraction 0-1 de la hauteur) du plus fort contour horizontal de l'image."""
+    h, w = frame.shape[:2]
+    small = cv2.resize(frame, (width, max(8, int(h * width / w))), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    energy = np.abs(cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)).mean(axis=1)
+    energy = np.convolve(energy, np.ones(5) / 5, mode="same")
+    # Les bords haut/bas de l'image ne sont pas un horizon
+    m = max(2, len(energy) // 20)
+    energy[:m] = 0; energy[-m:] = 0
+    return (int(np.argmax(energy)) + 0.5) / len(energy)
+
+
+def make_tiles(frame_w, y0, y1, tile_w=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Tuiles (x0, y0, x1, y1) couvrant toute la largeur de la bande, avec chevauchement."""
+    if frame_w <= tile_w: return [(0, y0, frame_w, y1)]
+    step = max(1, int(tile_w * (1 - overlap)))
+    n = math.ceil((frame_w - tile_w) / step) + 1
+    xs = [min(i * step, frame_w - tile_w) for i in range(n)]
+    return [(x, y0, x + tile_w, y1) for x in sorted(set(xs))]
+
+
+def merge_detections(dets, iou_thr=TILE_NMS_IOU, ios_thr=0.8):
+    """
+    NMS par classe sur des détections (n, 6) x1 y1 x2 y2 conf cls.
+
+    Une boîte est aussi supprimée si elle est presque entièrement contenue
+    dans une boîte plus confiante (fragment coupé au bord d'une tuile).
+    """
+    if len(dets) < 2: return dets
+    dets = dets[np.argsort(-dets[:, 4], kind="stable")]
+    b = dets[:, :4]
+    x1 = np.maximum(b[:, None, 0], b[None, :, 0]); y1 = np.maximum(b[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(b[:, None, 2], b[None, :, 2]); y2 = np.minimum(b[:, None, 3], b[None, :, 3])
+    inter = np.maximum(0, x2 - x1) * np.maximum(0, y2 - y1)
+    area = np.maximum(1e-6, (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]))
+    iou = inter / (area[:, None] + area[None, :] - inter)
+    ios = inter / np.minimum(area[:, None], area[None, :])
+    same = dets[:, None, 5] == dets[None, :, 5]
+    overlap = same & ((iou > iou_thr) | (ios > ios_thr))
+
+    keep = np.ones(len(dets), dtype=bool)
+    for i in range(len(dets)):
+        if keep[i]: keep[i+1:] &= ~overlap[i, i+1:]
+    return dets[keep]
+
+
+class TilePlanner:
+    """
+    Plan de tuiles d'une source (horizon lissé d'une image à l'autre).
+
+    Paramètres
+    ----------
+    band : tuple(float, float) ou None
+        Bande fixe (haut, bas) en fraction de hauteur ; None = horizon détecté.
+    """
+
+    def __init__(self, band=TILE_BAND, band_h=TILE_BAND_HEIGHT, tile_w=TILE_SIZE, overlap=TILE_OVERLAP):
+        self.band      = band
+        self.band_h    = band_h
+        self.tile_w    = tile_w
+        self.overlap   = overlap
+        self.horizon   = None
+        self.proc_px   = 0      # pixels de l'image réduite
+        self.tile_px   = 0      # pixels traités en tuiles à la dernière image
+        self.full_px   = 0      # pixels d'une passe pleine résolution
+
+    def plan(self, frame, proc_frame):
+        """Retourne [(vue de la tuile, (x0, y0))] pour l'image pleine résolution."""
+        h, w = frame.shape[:2]
+        if self.band:
+            y0, y1 = int(self.band[0] * h), int(self.band[1] * h)
+        else:
+            y = find_horizon(proc_frame)
+            self.horizon = y if self.horizon is None else 0.8 * self.horizon + 0.2 * y
+            cy = int(self.horizon * h)
+            y0 = min(max(0, cy - self.band_h // 2), max(0, h - self.band_h))
+            y1 = min(h, y0 + self.band_h)
+        tiles = make_tiles(w, y0, y1, self.tile_w, self.overlap)
+        self.tile_px = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in tiles)
+        self.full_px = w * h
+        self.proc_px = proc_frame.shape[0] * proc_frame.shape[1]
+        return [(frame[ty0:ty1, tx0:tx1], (tx0, ty0)) for tx0, ty0, tx1, ty1 in tiles]
+
+    def merge(self, full, tiles, offsets, scale):
+        """
+        Fusionne la passe réduite et les tuiles.
+
+        `full` est en coordonnées de l'image réduite, les tuiles en coordonnées
+        locales ; le résultat (n, 6) est rendu dans le repère de l'image réduite.
+        """
+        parts = [full[:, :6].copy() / np.array([scale, scale, scale, scale, 1, 1], dtype=np.float32)]
+        for d, (x0, y0) in zip(tiles, offsets):
+            if not len(d): continue
+            g = d[:, :6].copy()
+            g[:, [0, 2]] += x0; g[:, [1, 3]] += y0
+            parts.append(g)
+        merged = merge_detections(np.concatenate(parts, axis=0))
+        merged[:, :4] *= scale
+        return merged
+
+    def stats(self) -> dict:
+        # Pixels traités (image réduite + tuiles) rapportés à une passe pleine résolution
+        ratio = (self.proc_px + self.tile_px) / self.full_px if self.full_px else None
+        return {"horizon": None if self.horizon is None else round(self.horizon, 3),
+                "tile_px": self.tile_px, "compute_ratio": None if ratio is None else round(ratio, 3)}
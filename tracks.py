@@ -0,0 +1,274 @@
+"""
+tracks.py — Stockage compact de l'état des pistes (struct-of-arrays).
+
+Toutes les données par piste (position, distance filtrée, âge, historique,
+votes de classification, classe confirmée) vivent dans des colonnes NumPy
+pré-allouées. Chaque tid occupe un slot réutilisable : insertion et éviction
+en O(1) via une pile de slots libres, vieillissement vectorisé, et aucune
+allocation par piste ou par image tant que la capacité n'est pas dépassée.
+"""
+
+import numpy as np
+
+
+def _box_iou(a, b):
+    iw = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    ih = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = iw * ih
+    union = (a[2]-a[0]) * (a[3]-a[1]) + (b[2]-b[0]) * (b[3]-b[1]) - inter
+    return float(inter / union) if union > 0 else 0.0
+
+
+class TrackStore:
+    """
+    Table des pistes indexée par slot.
+
+    Paramètres
+    ----------
+    class_names : list[str]
+        Noms des classes ; les colonnes stockent l'indice dans cette liste.
+    hist_len : int
+        Taille de l'historique circulaire (cx, cy, distance) par piste.
+    vote_window : int
+        Nombre de derniers votes de classification conservés par piste.
+    capacity : int
+        Nombre de slots initial (doublé si nécessaire, jamais réduit).
+    """
+
+    __slots__ = (
+        "class_names", "class_ids", "hist_len", "vote_window", "capacity",
+        "_slot_of", "_free",
+        "tid", "alive", "active", "age",
+        "box", "pos", "dist", "speed", "heading", "azimuth", "conf", "dist_sd", "speed_sd", "heading_sd",
+        "hist", "hist_head", "hist_count",
+        "votes", "vote_head", "vote_counts",
+        "class_id", "confirmed_id", "confirmed_conf", "last_cl", "cl_interval", "cl_hash", "cl_h",
+        "pbox", "vel", "det_t", "det_cls",
+    )
+
+    def __init__(self, class_names, hist_len: int = 30, vote_window: int = 5, capacity: int = 64):
+        self.class_names = list(class_names)
+        self.class_ids   = {n: i for i, n in enumerate(self.class_names)}
+        self.hist_len    = hist_len
+        self.vote_window = vote_window
+        self.capacity    = 0
+        self._slot_of    = {}
+        self._free       = []
+        self._allocate(capacity)
+
+    # ── Allocation ─────────────────────────────────────────────────────────────
+
+    def _allocate(self, capacity):
+        old, n = self.capacity, capacity
+        k = len(self.class_names)
+
+        def grow(name, shape, dtype, fill):
+            col = np.full((n,) + shape, fill, dtype=dtype)
+            if old: col[:old] = getattr(self, name)
+            setattr(self, name, col)
+
+        grow("tid",            (),                  np.int64,   -1)
+        grow("alive",          (),                  bool,       False)
+        grow("active",         (),                  bool,       False)
+        grow("age",            (),                  np.int32,   0)
+        grow("box",            (4,),                np.float32, 0)   # normalisée 0-1
+        grow("pos",            (2,),                np.float32, 0)   # centre en pixels
+        grow("dist",           (),                  np.float32, np.nan)
+        grow("speed",          (),                  np.float32, 0)
+        grow("heading",        (),                  np.float32, 0)
+        grow("azimuth",        (),                  np.float32, 0)
+        grow("conf",           (),                  np.float32, 0)
+        grow("dist_sd",        (),                  np.float32, np.nan)  # écarts-types du filtre de Kalman
+        grow("speed_sd",       (),                  np.float32, np.nan)
+        grow("heading_sd",     (),                  np.float32, np.nan)
+        grow("hist",           (self.hist_len, 3),  np.float32, 0)
+        grow("hist_head",      (),                  np.int32,   0)
+        grow("hist_count",     (),                  np.int32,   0)
+        grow("votes",          (self.vote_window,), np.int16,   -1)
+        grow("vote_head",      (),                  np.int32,   0)
+        grow("vote_counts",    (k,),                np.int16,   0)
+        grow("class_id",       (),                  np.int16,   -1)
+        grow("confirmed_id",   (),                  np.int16,   -1)
+        grow("confirmed_conf", (),                  np.float32, 0)
+        grow("last_cl",        (),                  np.int64,   -999)
+        grow("cl_interval",    (),                  np.int32,   0)   # intervalle de reclassification (images)
+        grow("cl_hash",        (),                  np.uint64,  0)   # dHash du crop à la dernière classification
+        grow("cl_h",           (),                  np.float32, 0)   # hauteur de boîte à la dernière classification
+        grow("pbox",           (4,),                np.float32, 0)   # dernière boîte détectée, pixels
+        grow("vel",            (4,),                np.float32, 0)   # vitesse de la boîte, pixels/s
+        grow("det_t",          (),                  np.float64, -np.inf)
+        grow("det_cls",        (),                  np.int16,   -1)  # classe modelA
+
+        # Slots libres dépilés par ordre croissant
+        self._free.extend(range(n - 1, old - 1, -1))
+        self.capacity = n
+
+    def _reset(self, s):
+        self.alive[s] = False; self.active[s] = False; self.age[s] = 0
+        self.box[s] = 0; self.pos[s] = 0; self.dist[s] = np.nan
+        self.speed[s] = 0; self.heading[s] = 0; self.azimuth[s] = 0; self.conf[s] = 0
+        self.dist_sd[s] = np.nan; self.speed_sd[s] = np.nan; self.heading_sd[s] = np.nan
+        self.hist_head[s] = 0; self.hist_count[s] = 0
+        self.votes[s] = -1; self.vote_head[s] = 0; self.vote_counts[s] = 0
+        self.class_id[s] = -1; self.confirmed_id[s] = -1; self.confirmed_conf[s] = 0
+        self.last_cl[s] = -999; self.cl_interval[s] = 0; self.cl_hash[s] = 0; self.cl_h[s] = 0
+        self.pbox[s] = 0; self.vel[s] = 0; self.det_t[s] = -np.inf; self.det_cls[s] = -1
+
+    # ── Insertion / éviction ───────────────────────────────────────────────────
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __contains__(self, tid):
+        return tid in self._slot_of
+
+    def slot(self, tid):
+        """Slot du tid, ou None s'il n'est pas suivi."""
+        return self._slot_of.get(tid)
+
+    def upsert(self, tid, class_name=None):
+        """Retourne (slot, nouveau) ; crée la piste si besoin."""
+        s = self._slot_of.get(tid)
+        if s is not None: return s, False
+        if not self._free: self._allocate(self.capacity * 2)
+        s = self._free.pop()
+        self._reset(s)
+        self.tid[s] = tid
+        self.alive[s] = True
+        self.class_id[s] = self.class_ids.get(class_name, -1)
+        self._slot_of[tid] = s
+        return s, True
+
+    def evict(self, tid):
+        s = self._slot_of.pop(tid, None)
+        if s is None: return
+        self.alive[s] = False; self.active[s] = False; self.tid[s] = -1
+        self._free.append(s)
+
+    def clear(self):
+        for tid in list(self._slot_of): self.evict(tid)
+
+    # ── Cycle par image ────────────────────────────────────────────────────────
+
+    def begin_frame(self):
+        self.active[:] = False
+
+    def mark_seen(self, s):
+        self.active[s] = True
+        self.age[s] = 0
+
+    def age_step(self, max_age):
+        """Vieillit les pistes non vues, évince celles au-delà de max_age. Retourne les tid évincés."""
+        unseen = self.alive & ~self.active
+        self.age[unseen] += 1
+        expired = self.tid[unseen & (self.age > max_age)].tolist()
+        for tid in expired: self.evict(tid)
+        return expired
+
+    def active_slots(self):
+        return np.flatnonzero(self.active)
+
+    # ── Historique ─────────────────────────────────────────────────────────────
+
+    def push_history(self, s, cx, cy, dist):
+        h = self.hist_head[s]
+        self.hist[s, h] = (cx, cy, dist)
+        self.hist_head[s] = (h + 1) % self.hist_len
+        if self.hist_count[s] < self.hist_len: self.hist_count[s] += 1
+
+    def history(self, s, k=2):
+        """k dernières entrées (cx, cy, dist), de la plus ancienne à la plus récente."""
+        k = min(k, int(self.hist_count[s]))
+        idx = (self.hist_head[s] - k + np.arange(k)) % self.hist_len
+        return self.hist[s, idx]
+
+    # ── Propagation entre deux détections ─────────────────────────────────────
+
+    def observe_box(self, s, box, cls, t, smooth=0.5):
+        """
+        Enregistre une boîte détectée et met à jour sa vitesse (lissage exponentiel).
+
+        Retourne l'IoU entre la boîte prédite à l'instant t et la boîte mesurée
+        (None à la première détection) pour mesurer la qualité de la propagation.
+        """
+        b = np.asarray(box, dtype=np.float32)
+        score = None
+        prev_t = self.det_t[s]
+        if np.isfinite(prev_t) and t > prev_t:
+            dt = t - prev_t
+            pred = self.pbox[s] + self.vel[s] * dt
+            score = _box_iou(pred, b)
+            self.vel[s] += smooth * ((b - self.pbox[s]) / dt - self.vel[s])
+        self.pbox[s] = b
+        self.det_t[s] = t
+        self.det_cls[s] = cls
+        return score
+
+    def predict_boxes(self, t, since):
+        """Boîtes extrapolées à l'instant t des pistes détectées depuis `since`. Retourne (slots, boîtes)."""
+        sl = np.flatnonzero(self.alive & (self.det_t >= since))
+        return sl, self.pbox[sl] + self.vel[sl] * (t - self.det_t[sl])[:, None].astype(np.float32)
+
+    # ── Classification ─────────────────────────────────────────────────────────
+
+    def add_vote(self, s, class_name, conf, min_confirm):
+        """Ajoute un vote B/C ; confirme la classe majoritaire à partir de min_confirm votes."""
+        cid = self.class_ids.get(class_name)
+        if cid is None: return
+        h = self.vote_head[s]
+        old = self.votes[s, h]
+        if old >= 0: self.vote_counts[s, old] -= 1
+        self.votes[s, h] = cid
+        self.vote_counts[s, cid] += 1
+        self.vote_head[s] = (h + 1) % self.vote_window
+        best = int(np.argmax(self.vote_counts[s]))
+        if self.vote_counts[s, best] >= min_confirm:
+            self.confirmed_id[s] = best
+            self.confirmed_conf[s] = conf
+
+    def name_id(self, s):
+        c = self.confirmed_id[s]
+        return int(c if c >= 0 else self.class_id[s])
+
+    def name(self, s, default="Inconnu"):
+        c = self.name_id(s)
+        return self.class_names[c] if c >= 0 else default
+
+    # ── Lecture groupée ────────────────────────────────────────────────────────
+
+    def snapshot(self, class_hex=None, with_boxes=False):
+        """
+        État des pistes actives pour l'émission socket ({str(tid): {...}}).
+
+        with_boxes ajoute la boîte normalisée et la confiance affichée, pour
+        le dessin des overlays côté navigateur.
+        """
+        sl = self.active_slots()
+        if not sl.size: return {}
+        names = np.where(self.confirmed_id[sl] >= 0, self.confirmed_id[sl], self.class_id[sl]).tolist()
+        out = {}
+        for tid, c, d, sp, hd, az, dsd, ssd, hsd in zip(
+                self.tid[sl].tolist(), names, self.dist[sl].tolist(), self.speed[sl].tolist(),
+                self.heading[sl].tolist(), self.azimuth[sl].tolist(), self.dist_sd[sl].tolist(),
+                self.speed_sd[sl].tolist(), self.heading_sd[sl].tolist()):
+            t = {'name': self.class_names[c] if c >= 0 else "Inconnu",
+                 'distance': d, 'speed': sp, 'heading': hd, 'azimuth_factor': az,
+                 'distance_sd': dsd, 'speed_sd': ssd, 'heading_sd': hsd}
+            if class_hex is not None: t['color_hex'] = class_hex[c] if c >= 0 else None
+            out[str(tid)] = t
+        if with_boxes:
+            boxes = np.round(self.box[sl], 4).tolist()
+            confs = np.where(self.confirmed_id[sl] >= 0, self.confirmed_conf[sl], self.conf[sl]).tolist()
+            for t, b, cf in zip(out.values(), boxes, confs):
+                t['box'] = b; t['conf'] = cf
+        return out
+
+    def find_at(self, x, y):
+        """tid dont la boîte (normalisée) contient le point, le plus proche du centre ; sinon None."""
+        sl = np.flatnonzero(self.alive)
+        if not sl.size: return None
+        b = self.box[sl]
+        inside = (b[:, 0] <= x) & (x <= b[:, 2]) & (b[:, 1] <= y) & (y <= b[:, 3])
+        if not inside.any(): return None
+        d2 = ((b[:, 0] + b[:, 2]) / 2 - x) ** 2 + ((b[:, 1] + b[:, 3]) / 2 - y) ** 2
+        return int(self.tid[sl][np.argmin(np.where(inside, d2, np.inf))])